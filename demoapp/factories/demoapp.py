@@ -108,6 +108,15 @@ class BookFactory(factory.django.DjangoModelFactory):
         model = 'demoapp.Book'
 
 
+class EBookFactory(BookFactory):
+    file_format = factory.fuzzy.FuzzyChoice(['EPUB', 'MOBI', 'PDF'])
+    size = factory.Faker('pyint')
+    publisher = factory.SubFactory(UserFactory)
+
+    class Meta:
+        model = 'demoapp.EBook'
+
+
 class BookInstanceFactory(factory.django.DjangoModelFactory):
     book = factory.SubFactory(BookFactory)
     borrower = factory.SubFactory(UserFactory)
@@ -120,3 +129,11 @@ class BookInstanceFactory(factory.django.DjangoModelFactory):
 
     class Meta:
         model = 'demoapp.BookInstance'
+
+
+class CommentFactory(factory.django.DjangoModelFactory):
+    content_object = factory.SubFactory(BookFactory)
+    text = factory.Faker('sentence')
+
+    class Meta:
+        model = 'demoapp.Comment'
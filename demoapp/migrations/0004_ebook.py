@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('demoapp', '0003_comment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EBook',
+            fields=[
+                ('book_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='demoapp.book')),
+                ('file_format', models.CharField(help_text='Enter the format of the file (e.g. EPUB, PDF etc.)', max_length=10)),
+                ('size', models.PositiveIntegerField(help_text='Size of the file in bytes')),
+                ('publisher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            bases=('demoapp.book',),
+        ),
+    ]
@@ -7,6 +7,11 @@ import uuid
 
 import django
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import (
+    GenericForeignKey,
+    GenericRelation,
+)
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -87,6 +92,7 @@ class Book(models.Model):
         on_delete=models.SET_NULL,
         null=True
     )
+    comments = GenericRelation('Comment')
 
     class Meta:
         ordering = ['title', 'author']
@@ -109,6 +115,26 @@ class Book(models.Model):
         return self.title
 
 
+class EBook(Book):
+    """
+    Model representing a book that's also available in a digital format.
+    Book data is kept in the book table, using multi-table inheritance.
+    """
+    file_format = models.CharField(
+        max_length=10,
+        help_text="Enter the format of the file (e.g. EPUB, PDF etc.)"
+    )
+    size = models.PositiveIntegerField(
+        help_text="Size of the file in bytes"
+    )
+    publisher = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+
+
 class BookInstance(models.Model):
     """
     Model representing a specific copy of a book (i.e. that can be borrowed
@@ -214,6 +240,18 @@ class Profile(models.Model):
         return self.user.username
 
 
+class Comment(models.Model):
+    """Model representing a comment on any object (a book, a copy...)."""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    # Text, so comments can point at objects with UUID primary keys
+    object_id = models.CharField(max_length=36)
+    content_object = GenericForeignKey('content_type', 'object_id')
+    text = models.TextField()
+
+    def __str__(self):
+        return self.text
+
+
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     if created:
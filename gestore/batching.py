@@ -0,0 +1,158 @@
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MIN_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 10000
+
+# Growing a batch size needs this much headroom below the targets
+HEADROOM = 0.5
+
+
+class BatchSizeController(object):
+    """
+    Adapts the batch size of each model while exporting, starting from
+    `batch_size`:
+
+        - `target_query_ms`: Batches whose slowest query took longer are
+          shrunk proportionally, so long running statements don't hold back
+          the database.
+        - `max_memory`: Resident memory of the process, in bytes. Batches
+          are halved while the process is using more.
+
+    Full batches grow twice as large while they stay well within both
+    targets, so objects are fetched with fewer round trips. Sizes are kept
+    between `min_size` and `max_size`.
+
+    Queries are timed by `time_query`, a database execute wrapper:
+
+        with connection.execute_wrapper(controller.time_query):
+            ...
+            controller.observe(model, len(batch))
+
+    Queries can be timed from several threads, each wrapping its own
+    connection.
+
+    Every change is recorded in `decisions`, along with its reason.
+    """
+
+    def __init__(
+            self,
+            batch_size: int,
+            target_query_ms: float = None,
+            max_memory: int = None,
+            min_size: int = MIN_BATCH_SIZE,
+            max_size: int = MAX_BATCH_SIZE
+    ):
+        self.batch_size = batch_size
+        self.target_query_ms = target_query_ms
+        self.max_memory = max_memory
+        self.min_size = min(min_size, batch_size)
+        self.max_size = max(max_size, batch_size)
+
+        self.sizes = {}
+        self.decisions = []
+        self.slowest_query_ms = 0.0
+        self._lock = threading.Lock()
+
+    def get_size(self, model) -> int:
+        return self.sizes.get(model, self.batch_size)
+
+    def time_query(
+            self,
+            execute: Callable,
+            sql: str,
+            params: Any,
+            many: bool,
+            context: dict
+    ) -> Any:
+        started_at = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            query_ms = (time.monotonic() - started_at) * 1000
+            with self._lock:
+                self.slowest_query_ms = max(self.slowest_query_ms, query_ms)
+
+    def observe(self, model, rows: int) -> int:
+        """
+        Adapts the batch size of a model once one of its batches of `rows`
+        objects is processed, using the queries timed since the previous
+        batch. Returns the size of the next batch.
+        """
+        size = self.get_size(model)
+        query_ms = self.slowest_query_ms
+        self.slowest_query_ms = 0.0
+
+        memory = None
+        if self.max_memory is not None:
+            memory = self.get_memory()
+
+        new_size, reason = size, None
+        if memory is not None and memory > self.max_memory:
+            new_size = size // 2
+            reason = 'using %d MB of memory, over %d MB' % (
+                memory // 2 ** 20,
+                self.max_memory // 2 ** 20,
+            )
+        elif self.target_query_ms is not None \
+                and query_ms > self.target_query_ms:
+            new_size = int(size * self.target_query_ms / query_ms)
+            reason = 'slowest query took %.1f ms, over %.1f ms' % (
+                query_ms,
+                self.target_query_ms,
+            )
+        elif rows >= size and self.has_headroom(query_ms, memory):
+            new_size = size * 2
+            reason = 'slowest query took %.1f ms' % query_ms
+
+        new_size = max(self.min_size, min(new_size, self.max_size))
+        if new_size != size:
+            self.sizes[model] = new_size
+            self.decisions.append('%s: batch size %d -> %d, %s' % (
+                model._meta.label,
+                size,
+                new_size,
+                reason,
+            ))
+
+        return new_size
+
+    def has_headroom(self, query_ms: float, memory: Optional[int]) -> bool:
+        if self.target_query_ms is not None \
+                and query_ms > self.target_query_ms * HEADROOM:
+            return False
+
+        if memory is not None and memory > self.max_memory * HEADROOM:
+            return False
+
+        return True
+
+    @staticmethod
+    def get_memory() -> Optional[int]:
+        """
+        Returns the resident memory of the process in bytes, or its peak
+        resident memory on systems without `/proc`. None if neither is
+        available.
+        """
+        try:
+            with open('/proc/self/statm') as statm:
+                pages = int(statm.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            pass
+        else:
+            if resource is not None:
+                return pages * resource.getpagesize()
+
+        if resource is None:
+            return None
+
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes, except on macOS
+        return usage if sys.platform == 'darwin' else usage * 1024
@@ -0,0 +1,172 @@
+import time
+from typing import Dict, List
+
+from django.conf import settings
+
+BUDGET_ABORT = 'abort'
+BUDGET_PRUNE = 'prune'
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a traversal goes over one of its budgets in `abort` mode.
+    """
+
+    def __init__(self, message: str, report: List[str]):
+        super(BudgetExceeded, self).__init__(message)
+        self.report = report
+
+
+class TraversalBudget(object):
+    """
+    Limits how far an export traversal can go.
+
+        - `max_objects`: Total number of discovered objects.
+        - `max_depth`: Number of levels of the Breadth First Search, or
+          length of the discovery paths of the Depth First Search.
+        - `max_fanout`: Number of objects a single reverse relation can add
+          for a batch of objects, or for a single object in the Depth First
+          Search. It's checked with a COUNT query before
+          fetching any of them. `fanout` overrides it per relation, using
+          `app_label.Model.accessor_name` keys.
+        - `time_limit`: Wall-clock time in seconds.
+
+    Once a budget is exceeded, the traversal either aborts with a report
+    (`abort`), or skips whatever goes over the budget and carries on
+    (`prune`). Pruned exports are smaller than the full object graph, and
+    the report lists everything that was left out.
+    """
+
+    def __init__(
+            self,
+            max_objects: int = None,
+            max_depth: int = None,
+            max_fanout: int = None,
+            fanout: Dict[str, int] = None,
+            time_limit: float = None,
+            on_exceeded: str = BUDGET_ABORT,
+    ):
+        if on_exceeded not in (BUDGET_ABORT, BUDGET_PRUNE):
+            raise ValueError('Unknown budget mode "%s"' % on_exceeded)
+
+        self.max_objects = max_objects
+        self.max_depth = max_depth
+        self.max_fanout = max_fanout
+        self.fanout = fanout or {}
+        self.time_limit = time_limit
+        self.on_exceeded = on_exceeded
+
+        self.report = []
+        self.started_at = None
+        self.timed_out = False
+        self.depth_exceeded = False
+        self.pruned_objects = 0
+
+    @classmethod
+    def from_settings(cls, **overrides) -> 'TraversalBudget':
+        """
+        Builds a budget out of the `GESTORE_BUDGETS` setting. Overrides that
+        are not None take precedence over the settings values.
+        """
+        options = dict(getattr(settings, 'GESTORE_BUDGETS', None) or {})
+        options.update(
+            (key, value)
+            for key, value in overrides.items()
+            if value is not None
+        )
+
+        return cls(**options)
+
+    @property
+    def prune(self) -> bool:
+        return self.on_exceeded == BUDGET_PRUNE
+
+    @property
+    def limits_discovery(self) -> bool:
+        """
+        Whether the budget limits which objects are discovered, rather than
+        only how long it takes.
+        """
+        return any(limit is not None for limit in (
+            self.max_objects,
+            self.max_depth,
+            self.max_fanout,
+        )) or bool(self.fanout)
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+
+    def exceeded(self, message: str) -> bool:
+        """
+        Records a budget violation. Raises in `abort` mode, otherwise returns
+        False so the caller can skip the offending part.
+        """
+        self.report.append(message)
+
+        if not self.prune:
+            raise BudgetExceeded(message, self.report)
+
+        return False
+
+    def check_objects(self, count: int) -> bool:
+        """
+        Checks whether `count` discovered objects fit in the budget.
+        """
+        if self.max_objects is None or count <= self.max_objects:
+            return True
+
+        self.pruned_objects += 1
+        if self.pruned_objects > 1:
+            # Already reported
+            return False
+
+        return self.exceeded(
+            'Reached the limit of %d objects' % self.max_objects
+        )
+
+    def check_depth(self, depth: int) -> bool:
+        if self.max_depth is None or depth <= self.max_depth:
+            return True
+
+        if self.depth_exceeded:
+            # Already reported
+            return False
+
+        self.depth_exceeded = True
+        return self.exceeded(
+            'Reached the depth limit of %d levels' % self.max_depth
+        )
+
+    def get_fanout_limit(self, relation: str) -> int:
+        return self.fanout.get(relation, self.max_fanout)
+
+    def check_fanout(self, relation: str, count: int) -> bool:
+        """
+        Checks whether `count` objects discovered through the given relation
+        fit in the budget.
+        """
+        limit = self.get_fanout_limit(relation)
+        if limit is None or count <= limit:
+            return True
+
+        return self.exceeded(
+            'Relation %s points at %d objects (limit is %d)' % (
+                relation, count, limit
+            )
+        )
+
+    def check_time(self) -> bool:
+        if self.time_limit is None or self.started_at is None:
+            return True
+
+        if self.timed_out:
+            return False
+
+        elapsed = time.monotonic() - self.started_at
+        if elapsed <= self.time_limit:
+            return True
+
+        self.timed_out = True
+        return self.exceeded(
+            'Reached the time limit of %s seconds' % self.time_limit
+        )
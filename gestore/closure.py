@@ -0,0 +1,426 @@
+from typing import Dict, List, Set, Tuple
+
+from django.contrib.contenttypes.fields import (
+    GenericForeignKey,
+    GenericRelation,
+)
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import (
+    ForeignKey,
+    ManyToManyField,
+    ManyToManyRel,
+    ManyToOneRel,
+    Model,
+    UUIDField,
+)
+from django.db.models.fields import Field
+
+from gestore.graph import RelationGraph
+from gestore.plans import FieldPlan
+from gestore.traversal import BatchTraversal
+from gestore.typing import PK
+from gestore.utils import get_model_name
+
+SUPPORTED_VENDORS = ('sqlite', 'postgresql')
+
+# `(table, source_pk_sql, target_pk_sql, source_model, target_model,
+# where_sql)`, the SQL expressions refer to the table as `t`
+EDGE = Tuple[str, str, str, type, type, str]
+
+
+class UnsupportedClosure(Exception):
+    """
+    Raised when the closure of an export can't be computed by the database,
+    the caller is expected to fall back to a Python traversal.
+    """
+
+
+class ClosureQuery(object):
+    """
+    Computes all the objects reachable from a set of objects using a single
+    `WITH RECURSIVE` query.
+
+    Every relation of the relation graph becomes an edge table; a subquery
+    selecting `(source_model, source_pk, target_model, target_pk)` rows out
+    of the table holding the relation's columns. The recursive part of the
+    query joins the discovered objects to all edge tables at once, so the
+    recursive reference appears only once, as PostgreSQL requires.
+    `UNION` drops objects that were discovered before, which also stops the
+    recursion on cycles.
+
+    Models are identified by an integer, and primary keys are cast to text so
+    models with different primary key types share the same columns.
+
+    Only relations stored as plain columns pointing at primary keys, without
+    traversal limits or range scans, are supported. GenericForeignKeys and
+    GenericRelations are edges filtered on their content type, one per model
+    a GenericForeignKey points at.
+    """
+
+    def __init__(
+            self,
+            graph: RelationGraph,
+            root_models: Set[str],
+            using: str = DEFAULT_DB_ALIAS
+    ):
+        self.connection = connections[using]
+        if self.connection.vendor not in SUPPORTED_VENDORS:
+            raise UnsupportedClosure(
+                'Recursive queries are not supported on %s'
+                % self.connection.vendor
+            )
+
+        self.graph = graph
+        self.root_models = root_models
+        self.models = sorted(
+            graph.reachable,
+            key=lambda model: model._meta.label
+        )
+        self.model_ids = {model: i for i, model in enumerate(self.models)}
+        self.edges = [
+            edge
+            for model in self.models
+            for edge in self.get_edges(model)
+        ]
+
+    def quote(self, name: str) -> str:
+        return self.connection.ops.quote_name(name)
+
+    def get_edges(self, model) -> List[EDGE]:
+        """
+        Returns the edges of the relations of a model.
+        """
+        edges = []
+        plan = self.graph.get_plan(model)
+
+        for field in plan.limits:
+            raise UnsupportedClosure('Relation %s is limited' % field)
+
+        for field in plan.scans:
+            raise UnsupportedClosure('Relation %s is a range scan' % field)
+
+        for _, field in plan.custom:
+            raise UnsupportedClosure(
+                'Relation %s uses a custom processor' % field
+            )
+
+        for _, field in plan.relations:
+            if field in plan.references:
+                continue
+
+            if isinstance(field, GenericForeignKey):
+                edges.extend(self.get_generic_edges(model, field))
+                continue
+
+            target = field.related_model
+            if target not in self.model_ids:
+                continue
+
+            if target.__name__ in self.root_models:
+                continue
+
+            edges.append(self.get_edge(model, field))
+
+        return edges
+
+    @staticmethod
+    def check_target(field: Field) -> None:
+        if not field.target_field.primary_key:
+            raise UnsupportedClosure(
+                'Relation %s does not point at a primary key' % field
+            )
+
+    def column(self, column: str) -> str:
+        return 't.%s' % self.quote(column)
+
+    def get_object_id_sql(self, column: str, model) -> str:
+        """
+        Returns the SQL of an object ID column of a GenericForeignKey, as
+        the text primary keys of the given model are cast to. SQLite stores
+        UUIDs without dashes.
+        """
+        pk = model._meta.pk
+        if self.connection.vendor == 'sqlite' \
+                and isinstance(getattr(pk, 'target_field', pk), UUIDField):
+            return "REPLACE(%s, '-', '')" % self.column(column)
+
+        return self.column(column)
+
+    def get_content_type_id(self, model, for_concrete_model: bool) -> int:
+        return ContentType.objects.db_manager(
+            self.connection.alias
+        ).get_for_model(model, for_concrete_model=for_concrete_model).pk
+
+    def get_generic_edges(
+            self,
+            model,
+            field: GenericForeignKey
+    ) -> List[EDGE]:
+        """
+        Returns an edge per model the GenericForeignKey points at, its
+        objects being selected by their content type.
+        """
+        opts = model._meta
+        ct_column = opts.get_field(field.ct_field).column
+        fk_column = opts.get_field(field.fk_field).column
+
+        edges = []
+        for target in self.graph.get_generic_targets(model, field):
+            if target not in self.model_ids:
+                continue
+
+            if target.__name__ in self.root_models:
+                continue
+
+            edges.append((
+                opts.db_table,
+                self.column(opts.pk.column),
+                self.get_object_id_sql(fk_column, target),
+                model,
+                target,
+                '%s = %d AND %s IS NOT NULL' % (
+                    self.column(ct_column),
+                    self.get_content_type_id(
+                        target,
+                        field.for_concrete_model
+                    ),
+                    self.column(fk_column),
+                ),
+            ))
+
+        return edges
+
+    def get_edge(self, model, field: Field) -> EDGE:
+        target = field.related_model
+
+        if isinstance(field, ForeignKey):
+            self.check_target(field)
+            return self.get_column_edge(
+                model._meta.db_table,
+                model._meta.pk.column,
+                field.column,
+                model,
+                target,
+            )
+
+        if isinstance(field, ManyToOneRel):
+            # Also covers reverse OneToOne relations
+            self.check_target(field.field)
+            return self.get_column_edge(
+                target._meta.db_table,
+                field.field.column,
+                target._meta.pk.column,
+                model,
+                target,
+            )
+
+        if isinstance(field, (ManyToManyField, ManyToManyRel)):
+            m2m_field = field if isinstance(field, ManyToManyField) \
+                else field.field
+            through = m2m_field.remote_field.through
+            source_name = m2m_field.m2m_field_name()
+            target_name = m2m_field.m2m_reverse_field_name()
+            if isinstance(field, ManyToManyRel):
+                source_name, target_name = target_name, source_name
+
+            source_field = through._meta.get_field(source_name)
+            target_field = through._meta.get_field(target_name)
+            self.check_target(source_field)
+            self.check_target(target_field)
+
+            return self.get_column_edge(
+                through._meta.db_table,
+                source_field.column,
+                target_field.column,
+                model,
+                target,
+            )
+
+        if isinstance(field, GenericRelation):
+            related_opts = target._meta
+            ct_column = related_opts.get_field(
+                field.content_type_field_name
+            ).column
+            fk_column = related_opts.get_field(
+                field.object_id_field_name
+            ).column
+
+            return (
+                related_opts.db_table,
+                self.get_object_id_sql(fk_column, model),
+                self.column(related_opts.pk.column),
+                model,
+                target,
+                '%s = %d' % (
+                    self.column(ct_column),
+                    self.get_content_type_id(
+                        model,
+                        field.for_concrete_model
+                    ),
+                ),
+            )
+
+        raise UnsupportedClosure('Unsupported relation %s' % field)
+
+    def get_column_edge(
+            self,
+            table: str,
+            source_column: str,
+            target_column: str,
+            source_model,
+            target_model
+    ) -> EDGE:
+        return (
+            table,
+            self.column(source_column),
+            self.column(target_column),
+            source_model,
+            target_model,
+            '%s IS NOT NULL' % self.column(target_column),
+        )
+
+    def as_sql(self, instances: List[Model]) -> Tuple[str, list]:
+        seeds = []
+        params = []
+        for instance in instances:
+            model = type(instance)
+            seeds.append('SELECT %s AS model, CAST(%s AS TEXT) AS pk')
+            params.extend([
+                self.model_ids[model],
+                model._meta.pk.get_db_prep_value(
+                    instance.pk, self.connection
+                ),
+            ])
+
+        edges = [
+            'SELECT %d AS source_model, CAST(%s AS TEXT) AS source_pk, '
+            '%d AS target_model, CAST(%s AS TEXT) AS target_pk '
+            'FROM %s t WHERE %s' % (
+                self.model_ids[source_model],
+                source_sql,
+                self.model_ids[target_model],
+                target_sql,
+                self.quote(table),
+                where_sql,
+            )
+            for table, source_sql, target_sql, source_model, target_model,
+            where_sql in self.edges
+        ]
+
+        sql = (
+            'WITH RECURSIVE closure(model, pk) AS ('
+            'SELECT model, pk FROM (%s) seeds' % ' UNION ALL '.join(seeds)
+        )
+        if edges:
+            sql += (
+                ' UNION SELECT e.target_model, e.target_pk FROM closure c '
+                'INNER JOIN (%s) e ON e.source_model = c.model '
+                'AND e.source_pk = c.pk' % ' UNION ALL '.join(edges)
+            )
+        sql += ') SELECT model, pk FROM closure'
+
+        return sql, params
+
+    def execute(self, instances: List[Model]) -> Dict[type, List[PK]]:
+        """
+        Returns the primary keys of all objects reachable from the given
+        ones, grouped by model. The given objects are included.
+        """
+        sql, params = self.as_sql(instances)
+
+        keys = {}
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for model_id, pk in cursor.fetchall():
+                model = self.models[model_id]
+                keys.setdefault(model, []).append(
+                    model._meta.pk.to_python(pk)
+                )
+
+        return keys
+
+
+class ClosureTraversal(BatchTraversal):
+    """
+    Discovers the objects to export with a `ClosureQuery`, computed by the
+    database in one statement, then fetches and processes the objects of each
+    model in batches.
+
+    Since all objects are known upfront, reverse relations are not processed
+    at all, and discovered relations are ignored. Objects are exported the
+    same way `BatchTraversal` exports them.
+
+    Budgets limiting the discovered objects can't be enforced by the
+    database, the traversal refuses them with `UnsupportedClosure`. Only the
+    time limit is honored, between batches.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ClosureTraversal, self).__init__(*args, **kwargs)
+        self._plans = {}
+
+    def run(self, *args: Model) -> list:
+        if self.budget.limits_discovery:
+            raise UnsupportedClosure(
+                'Budgets limiting the discovered objects are not supported'
+            )
+
+        objects = []
+
+        self.root_models = set(
+            get_model_name(instance) for instance in args
+        ).union(self.root_models)
+        self.build_graph(*args)
+
+        keys = ClosureQuery(
+            self.graph,
+            self.root_models,
+            using=self.using
+        ).execute(list(args))
+
+        frontier = {}
+        for model, pks in keys.items():
+            pending = frontier[model] = {}
+            for pk in pks:
+                self.visited.add((model, pk))
+                pending[pk] = None
+
+        if not self.use_values:
+            for instance in args:
+                frontier[type(instance)][instance.pk] = instance
+
+        if self.debug:
+            self.writer(
+                'Closure computed, %d objects of %d models' % (
+                    len(self.visited), len(frontier)
+                )
+            )
+
+        self.budget.start()
+        for model, pending in frontier.items():
+            for batch, keys in self.iter_batches(model, pending):
+                if not self.budget.check_time():
+                    return objects
+
+                # Discovered relations are already part of the closure
+                for item, _ in self.process_batch(model, batch, keys=keys):
+                    if item:
+                        objects.append(item)
+
+        return objects
+
+    def get_plan(self, model) -> FieldPlan:
+        """
+        Only forward relations are needed, they hold the exported IDs.
+        """
+        plan = self._plans.get(model)
+        if plan is None:
+            plan = super(ClosureTraversal, self).get_plan(model)
+            plan = self._plans[model] = plan.exclude(
+                field
+                for _, field in plan.relations
+                if RelationGraph.is_reverse(field)
+            )
+
+        return plan
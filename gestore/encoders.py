@@ -1,16 +1,22 @@
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models.fields.files import ImageFieldFile
 
+from gestore.records import ExportRecord
+
 
 class GestoreEncoder(DjangoJSONEncoder):
     """
     A custom encoder that allows us to serialize unserializable fields
-    like `ImageFieldFile` and `Country` objects.
+    like `ImageFieldFile` and `Country` objects, and the export records of
+    objects.
 
     For each field you are trying to encode, make sure the return value is
     appropriate to be imported back again.
     """
     def default(self, o, *args, **kwargs):
+        if isinstance(o, ExportRecord):
+            return o.to_dict()
+
         if isinstance(o, ImageFieldFile):
             return o.name
 
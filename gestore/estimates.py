@@ -0,0 +1,434 @@
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+from django.db.models import (
+    Avg,
+    ForeignKey,
+    ManyToManyField,
+    ManyToManyRel,
+    ManyToOneRel,
+    TextField,
+)
+from django.db.models.fields import Field
+from django.db.models.functions import Cast, Length
+
+from gestore.budgets import BUDGET_PRUNE, TraversalBudget
+from gestore.graph import RelationGraph
+from gestore.plans import FieldPlan
+from gestore.traversal import DEFAULT_BATCH_SIZE
+
+# Levels propagated at most, estimates of cyclic relations converge to the
+# tables sizes long before that.
+MAX_LEVELS = 100
+
+# Bytes of an exported object besides its fields, and of each field besides
+# its name and value, following the `exportobjects` JSON layout.
+OBJECT_OVERHEAD = 60
+FIELD_OVERHEAD = 8
+
+# Estimated length of values whose average length can't be computed
+DEFAULT_VALUE_LENGTH = 8
+
+
+class ExportEstimate(object):
+    """
+    Estimates the size of an export without fetching any object.
+
+    Starting from the number of given objects per model, the estimate walks
+    the relation graph model by model, the way the traversals walk objects,
+    following the same rules: root models, pruned relations and traversal
+    policies. Each relation discovers, for each object, the average number
+    of related objects per object of its model, computed with COUNT queries:
+
+        Author -> book_set: COUNT(books with an author) / COUNT(authors)
+
+    Estimates of a model never exceed its table size, and objects are
+    assumed to be new unless they were reached back through the relation
+    that discovered them. Estimates are upper bounds for most exports.
+
+    Traversal budgets are applied the way the export applies them: levels
+    past the depth limit are left out, reverse relations discovering more
+    objects than their fan-out limit per batch, or per object using
+    `fanout_batch_size=1` as the `dfs` strategy does, are pruned, and no
+    more objects are discovered once the objects budget is reached. Each of
+    them is recorded in the report of `self.budget`, which never aborts.
+
+    Output bytes are estimated from the average length of the exported
+    columns of each model, using a single aggregate query per model.
+    """
+
+    def __init__(
+            self,
+            graph: RelationGraph,
+            root_models: Iterable[str] = (),
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            using: str = DEFAULT_DB_ALIAS,
+            budget: TraversalBudget = None,
+            fanout_batch_size: int = None
+    ):
+        self.graph = graph
+        self.root_models = set(root_models)
+        self.batch_size = batch_size
+        self.using = using
+        self.fanout_batch_size = fanout_batch_size or batch_size
+
+        # Pruning rather than aborting, to report every budget the export
+        # would go over.
+        budget = budget or TraversalBudget()
+        self.budget = TraversalBudget(
+            max_objects=budget.max_objects,
+            max_depth=budget.max_depth,
+            max_fanout=budget.max_fanout,
+            fanout=budget.fanout,
+            on_exceeded=BUDGET_PRUNE,
+        )
+        self.pruned_relations = set()
+
+        # Estimated objects per model, and discovered through each relation
+        self.counts = defaultdict(float)
+        self.relations = defaultdict(float)
+
+        # Estimated queries issued by the `dfs` and `bfs` strategies
+        self.dfs_queries = 0.0
+        self.bfs_queries = 0
+
+        self._totals = {}
+        self._ratios = {}
+        self._not_null = {}
+        self._object_bytes = {}
+
+    def run(self, counts: Dict[type, int]) -> 'ExportEstimate':
+        """
+        Estimates the export of the given number of objects per model.
+        """
+        # Objects of a model reached at the last level, grouped by the field
+        # they were discovered through.
+        frontier = {}
+        for model, count in counts.items():
+            self.counts[model] += count
+            frontier.setdefault(model, {})[None] = float(count)
+
+        for depth in range(1, MAX_LEVELS + 1):
+            if not frontier:
+                break
+
+            discovered = defaultdict(lambda: defaultdict(float))
+            relations = defaultdict(float)
+            for model, sources in frontier.items():
+                plan = self.graph.get_plan(model)
+                count = sum(sources.values())
+                self.count_queries(plan, count)
+
+                for accessor, field in plan.relations:
+                    target = field.related_model
+                    if (
+                            target is None
+                            or field in plan.references
+                            or target.__name__ in self.root_models
+                    ):
+                        continue
+
+                    if not self.check_fanout(model, accessor, field, count):
+                        continue
+
+                    estimated = sum(
+                        count * self.get_discovered(plan, field, source)
+                        for source, count in sources.items()
+                    )
+                    if estimated > 0:
+                        relations[(model, accessor)] += estimated
+                        discovered[target][field] += estimated
+
+            if any(
+                    sum(sources.values()) >= 1
+                    for sources in discovered.values()
+            ) and not self.budget.check_depth(depth):
+                break
+
+            for relation, estimated in relations.items():
+                self.relations[relation] += estimated
+
+            frontier = {}
+            for target, sources in discovered.items():
+                available = self.get_total(target) - self.counts[target]
+                estimated = sum(sources.values())
+                if available < 1 or estimated < 1:
+                    continue
+
+                found = min(available, estimated)
+                if not self.budget.check_objects(
+                        round(self.total_objects + found)
+                ):
+                    # Only what's left of the objects budget is discovered
+                    found = self.budget.max_objects - self.total_objects
+                    if found < 1:
+                        continue
+
+                # Scales down what each relation found to what's left
+                scale = found / estimated
+                self.counts[target] += found
+                frontier[target] = {
+                    source: count * scale
+                    for source, count in sources.items()
+                }
+
+        return self
+
+    def check_fanout(
+            self,
+            model,
+            accessor: str,
+            field: Field,
+            count: float
+    ) -> bool:
+        """
+        Checks whether a reverse relation of `count` objects of the given
+        model fits in its fan-out budget, for a batch of them. Batches of a
+        level are alike on average, so a relation over the budget is pruned
+        for all of them, and for the following levels.
+        """
+        if not isinstance(field, (ManyToOneRel, GenericRelation)):
+            return True
+
+        relation = '%s.%s' % (model._meta.label, accessor)
+        if relation in self.pruned_relations:
+            return False
+
+        if self.budget.get_fanout_limit(relation) is None:
+            return True
+
+        batch = max(1.0, min(count, self.fanout_batch_size))
+        fanout = round(self.get_ratio(model, field) * batch)
+        if self.budget.check_fanout(relation, fanout):
+            return True
+
+        self.pruned_relations.add(relation)
+        return False
+
+    def count_queries(self, plan: FieldPlan, count: float) -> None:
+        # Parents of inheritance children are built from the child rows
+        parent_links = set(field for _, field in plan.parent_links)
+        relations = len([
+            field for _, field in plan.relations
+            if field not in parent_links
+            and (
+                not isinstance(field, ForeignKey)
+                or field not in plan.references
+            )
+        ])
+
+        # One query per relation and object, plus one per batch and relation
+        # along with the batch itself.
+        self.dfs_queries += count * relations
+        self.bfs_queries += math.ceil(count / self.batch_size) * (
+            relations + 1
+        )
+
+    def get_discovered(
+            self,
+            plan: FieldPlan,
+            field: Field,
+            source: Optional[Field]
+    ) -> float:
+        """
+        Returns the estimated number of objects discovered through `field`
+        per object of the plan's model, reached through `source`.
+        """
+        ratio = self.get_ratio(plan.model, field)
+
+        if source is not None and (
+                field.remote_field is source or source.remote_field is field
+        ):
+            if isinstance(field, ForeignKey):
+                # Points back at the object that discovered this one
+                return 0.0
+
+            # The object that discovered this one is one of them
+            ratio = max(ratio - 1, 0.0)
+
+        limit = plan.limits.get(field)
+        if limit is not None:
+            ratio = min(ratio, limit)
+
+        return ratio
+
+    def get_ratio(self, model, field: Field) -> float:
+        """
+        Average number of objects related to an object of the given model
+        through the given field.
+        """
+        key = (model, field)
+        if key not in self._ratios:
+            total = self.get_total(model)
+            related = 0
+
+            if total:
+                related = self.count_related(model, field)
+
+            self._ratios[key] = related / total if total else 0.0
+
+        return self._ratios[key]
+
+    def count_related(self, model, field: Field) -> int:
+        if isinstance(field, ForeignKey):
+            return self.count_not_null(model, field.attname)
+
+        if isinstance(field, ManyToOneRel):
+            # Reverse ForeignKeys and OneToOneFields
+            return self.count_not_null(
+                field.related_model,
+                field.field.attname
+            )
+
+        if isinstance(field, GenericRelation):
+            content_type = ContentType.objects.db_manager(
+                self.using
+            ).get_for_model(model, for_concrete_model=field.for_concrete_model)
+            return field.related_model._default_manager.using(
+                self.using
+            ).filter(**{field.content_type_field_name: content_type}).count()
+
+        if isinstance(field, ManyToManyField):
+            return self.get_total(field.remote_field.through)
+
+        if isinstance(field, ManyToManyRel):
+            return self.get_total(field.through)
+
+        # Relations we can't count precisely
+        return self.get_total(field.related_model)
+
+    def count_not_null(self, model, attname: str) -> int:
+        """
+        Counts the objects of a model with a ForeignKey set, once for both
+        sides of the relation.
+        """
+        key = (model, attname)
+        if key not in self._not_null:
+            self._not_null[key] = model._default_manager.using(
+                self.using
+            ).filter(**{'%s__isnull' % attname: False}).count()
+
+        return self._not_null[key]
+
+    def get_total(self, model) -> int:
+        total = self._totals.get(model)
+        if total is None:
+            total = self._totals[model] = model._default_manager.using(
+                self.using
+            ).count()
+
+        return total
+
+    def get_object_bytes(self, model) -> float:
+        """
+        Estimated bytes of an exported object of the given model.
+        """
+        if model in self._object_bytes:
+            return self._object_bytes[model]
+
+        plan = self.graph.get_plan(model)
+        fields = [
+            (name, field) for name, field in plan.values + plan.foreign_keys
+            if field.concrete
+        ]
+        if plan.pk_field:
+            fields.append(('pk', plan.pk_field))
+
+        lengths = {}
+        try:
+            with transaction.atomic(using=self.using):
+                lengths = model._default_manager.using(
+                    self.using
+                ).aggregate(**{
+                    'length_%d' % index: Avg(Length(Cast(
+                        field.attname,
+                        output_field=TextField()
+                    )))
+                    for index, (_, field) in enumerate(fields)
+                })
+        except DatabaseError:
+            # Columns that can't be cast to text
+            pass
+
+        size = OBJECT_OVERHEAD + len(plan.label)
+        for index, (name, _) in enumerate(fields):
+            length = lengths.get('length_%d' % index)
+            size += FIELD_OVERHEAD + len(name) + (
+                DEFAULT_VALUE_LENGTH if length is None else length
+            )
+
+        self._object_bytes[model] = size
+        return size
+
+    @property
+    def total_objects(self) -> float:
+        return sum(self.counts.values())
+
+    @property
+    def total_bytes(self) -> float:
+        return sum(
+            count * self.get_object_bytes(model)
+            for model, count in self.counts.items()
+            if count
+        )
+
+    def get_hottest_relations(
+            self,
+            limit: int = 10
+    ) -> List[Tuple[str, float]]:
+        relations = sorted(
+            self.relations.items(),
+            key=lambda item: item[1],
+            reverse=True
+        )
+
+        return [
+            ('%s.%s' % (model._meta.label, accessor), count)
+            for (model, accessor), count in relations[:limit]
+        ]
+
+    def describe(self, strategy: str = 'dfs') -> List[str]:
+        """
+        Returns the lines of a human readable report of the estimate.
+        """
+        lines = ['Estimated objects per model:']
+        for model, count in sorted(
+                self.counts.items(),
+                key=lambda item: item[1],
+                reverse=True
+        ):
+            if count >= 1:
+                lines.append('  %s: ~%d objects, ~%s' % (
+                    model._meta.label,
+                    round(count),
+                    format_bytes(count * self.get_object_bytes(model)),
+                ))
+
+        lines.append('Hottest relations:')
+        for label, count in self.get_hottest_relations():
+            lines.append('  %s: ~%d objects' % (label, round(count)))
+
+        queries = self.dfs_queries if strategy == 'dfs' else self.bfs_queries
+        lines.append(
+            'Total: ~%d objects, ~%s, ~%d queries using the %s strategy' % (
+                round(self.total_objects),
+                format_bytes(self.total_bytes),
+                round(queries),
+                strategy,
+            )
+        )
+
+        return lines
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '%.1f %s' % (size, unit)
+        size /= 1024
+
+    return '%.1f TB' % size
@@ -0,0 +1,91 @@
+import itertools
+from typing import List, Optional
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.expressions import RawSQL
+
+from gestore.typing import PK
+
+# Backends supporting session temporary tables
+KEY_TABLE_VENDORS = ('sqlite', 'postgresql', 'mysql')
+
+# Frontiers of a model larger than this are loaded into a key table
+KEY_TABLE_THRESHOLD = 5000
+
+# Maximum number of keys in a key table, bounding the objects held at once
+KEY_TABLE_SIZE = 50000
+
+# Rows inserted per statement
+INSERT_BATCH_SIZE = 1000
+
+
+class KeyTable(object):
+    """
+    A session temporary table holding primary keys of a model.
+
+    Used as a context manager, the table is created and filled on enter, and
+    dropped on exit. `subquery` selects its keys, it can be used instead of a
+    list of primary keys in any `__in` lookup:
+
+        with KeyTable(Book, pks) as table:
+            Book.objects.filter(pk__in=table.subquery())
+
+    Queries filtering on a large number of keys this way don't hit the
+    backend's limit of query parameters, and the database can join the
+    table instead of parsing and matching a long list of values.
+    """
+    _ids = itertools.count()
+
+    def __init__(self, model, pks: List[PK], using: str = DEFAULT_DB_ALIAS):
+        self.model = model
+        self.pks = pks
+        self.connection = connections[using]
+        self.name = 'gestore_keys_%d' % next(self._ids)
+
+    @property
+    def quoted_name(self) -> str:
+        return self.connection.ops.quote_name(self.name)
+
+    def __enter__(self) -> 'KeyTable':
+        pk_field = self.model._meta.pk
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE %s (pk %s PRIMARY KEY)' % (
+                    self.quoted_name,
+                    pk_field.rel_db_type(self.connection),
+                )
+            )
+
+            sql = 'INSERT INTO %s (pk) VALUES (%%s)' % self.quoted_name
+            for start in range(0, len(self.pks), INSERT_BATCH_SIZE):
+                cursor.executemany(sql, [
+                    (pk_field.get_db_prep_value(pk, self.connection), )
+                    for pk in self.pks[start:start + INSERT_BATCH_SIZE]
+                ])
+
+        return self
+
+    def __exit__(self, *args) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE %s' % self.quoted_name)
+
+    def subquery(self) -> RawSQL:
+        return RawSQL('SELECT pk FROM %s' % self.quoted_name, ())
+
+
+def use_key_table(
+        count: int,
+        threshold: Optional[int] = KEY_TABLE_THRESHOLD,
+        using: str = DEFAULT_DB_ALIAS
+) -> bool:
+    """
+    Whether a frontier of `count` keys should be loaded into a key table
+    rather than queried using lists of keys. A `threshold` of `None` never
+    uses key tables, on read-only databases for example.
+    """
+    return (
+        threshold is not None
+        and count > threshold
+        and connections[using].vendor in KEY_TABLE_VENDORS
+    )
@@ -0,0 +1,238 @@
+from collections import deque
+from typing import Iterable, List, Tuple
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import ForeignObjectRel
+from django.db.models.fields import Field
+
+from gestore.plans import FieldPlan, get_field_plan
+from gestore.policies import TraversalPolicy
+from gestore.processors import get_content_type_model
+
+PRUNED_ROOT = 'root model'
+PRUNED_EMPTY = 'empty table'
+PRUNED_UNREACHABLE = 'unreachable model'
+
+
+class RelationGraph(object):
+    """
+    Model level graph of the relations between all installed models, built
+    from the app registry using the models' field plans.
+
+    Knowing the root models of an export, the graph tells which relations can
+    actually discover new objects. Relations pointing at root models never do,
+    since objects of root models are not exported. Neither do relations
+    pointing at empty tables, or at models only reachable through one of
+    these. Relations pruned for the latter are reported as pointing at
+    unreachable models.
+
+    GenericForeignKeys can point at any model, they lead to the models of the
+    content types stored in their table.
+
+    Only relations that don't carry any data can be pruned; reverse
+    relations. Forward ForeignKeys and ManyToMany fields are still needed to
+    export the IDs they hold.
+
+    Tables are checked for emptiness, and for the content types of their
+    GenericForeignKeys, once on the `using` database, when pruning the graph.
+    An export running while these tables are being filled may miss the new
+    objects.
+
+    Relations skipped or only referenced by the traversal `policy` are not
+    part of the graph, check `gestore.policies.TraversalPolicy`.
+    """
+
+    def __init__(
+            self,
+            models: Iterable[type] = None,
+            policy: TraversalPolicy = None,
+            using: str = DEFAULT_DB_ALIAS
+    ):
+        if models is None:
+            models = apps.get_models()
+
+        if policy is None:
+            policy = TraversalPolicy.from_settings()
+
+        self.policy = policy
+        self.using = using
+        self.models = list(models)
+        self.edges = {model: self.build_edges(model) for model in self.models}
+
+        self.reachable = set()
+        self.pruned = {}
+        self._empty = {}
+        self._generic_targets = {}
+        self._plans = {}
+
+    def __len__(self) -> int:
+        return sum(len(edges) for edges in self.edges.values())
+
+    def build_edges(self, model) -> List[Tuple[str, Field, type]]:
+        plan = self.policy.apply(get_field_plan(model))
+
+        return [
+            (accessor, field, field.related_model)
+            for accessor, field in plan.relations
+            if field.related_model is not None
+            and field not in plan.references
+        ]
+
+    def get_edges(self, model) -> List[Tuple[str, Field, type]]:
+        edges = self.edges.get(model)
+        if edges is None:
+            # Not an installed model, or an auto created one
+            edges = self.edges[model] = self.build_edges(model)
+
+        return edges
+
+    def get_generic_edges(self, model) -> List[Tuple[str, Field, type]]:
+        """
+        Returns an edge per model the GenericForeignKeys of a model point at.
+        """
+        plan = self.policy.apply(get_field_plan(model))
+
+        return [
+            (accessor, field, target)
+            for accessor, field in plan.generic_foreign_keys
+            if field not in plan.references
+            for target in self.get_generic_targets(model, field)
+        ]
+
+    def get_generic_targets(self, model, field: Field) -> List[type]:
+        """
+        Returns the models of the content types stored by a
+        GenericForeignKey.
+        """
+        key = (model, field.name)
+        targets = self._generic_targets.get(key)
+        if targets is None:
+            content_type_ids = model._default_manager.using(
+                self.using
+            ).order_by().values_list(field.ct_field, flat=True).distinct()
+            targets = self._generic_targets[key] = [
+                target
+                for target in (
+                    get_content_type_model(content_type_id, self.using)
+                    for content_type_id in content_type_ids
+                    if content_type_id is not None
+                )
+                if target is not None
+            ]
+
+        return targets
+
+    def is_empty(self, model) -> bool:
+        empty = self._empty.get(model)
+        if empty is None:
+            empty = self._empty[model] = \
+                not model._default_manager.using(self.using).exists()
+
+        return empty
+
+    @staticmethod
+    def is_reverse(field: Field) -> bool:
+        """
+        Reverse relations only discover objects, they carry no data.
+        """
+        return isinstance(field, ForeignObjectRel) or field.one_to_many
+
+    def prune(
+            self,
+            start_models: Iterable[type],
+            root_models: Iterable[str] = ()
+    ) -> None:
+        """
+        Finds the models reachable from the exported objects' models, then
+        marks every reverse relation of these models that can't lead to new
+        objects as pruned.
+
+        Root models are given by name, the same way the traversals check
+        them.
+        """
+        start_models = set(start_models)
+        root_models = set(root_models).union(
+            model.__name__ for model in start_models
+        )
+
+        self.reachable = set(start_models)
+        self.pruned = {}
+        self._plans = {}
+
+        queue = deque(start_models)
+        while queue:
+            model = queue.popleft()
+
+            edges = self.get_edges(model) + self.get_generic_edges(model)
+            for _, _, target in edges:
+                if target in self.reachable:
+                    continue
+
+                if target.__name__ in root_models or self.is_empty(target):
+                    continue
+
+                self.reachable.add(target)
+                queue.append(target)
+
+        for model in self.reachable:
+            for accessor, field, target in self.get_edges(model):
+                if not self.is_reverse(field):
+                    continue
+
+                if target.__name__ in root_models:
+                    reason = PRUNED_ROOT
+                elif target in self.reachable:
+                    continue
+                elif self.is_empty(target):
+                    reason = PRUNED_EMPTY
+                else:
+                    reason = PRUNED_UNREACHABLE
+
+                self.pruned.setdefault(model, []).append(
+                    (accessor, field, reason)
+                )
+
+    def get_plan(self, model) -> FieldPlan:
+        """
+        Returns the field plan of the given model following the policy,
+        without its pruned relations.
+        """
+        plan = self._plans.get(model)
+        if plan is None:
+            plan = self.policy.apply(get_field_plan(model))
+
+            pruned = self.pruned.get(model)
+            if pruned:
+                plan = plan.exclude(field for _, field, _ in pruned)
+
+            self._plans[model] = plan
+
+        return plan
+
+    def describe(self) -> List[str]:
+        """
+        Lines describing the graph, and what was pruned out of it.
+        """
+        lines = [
+            'Relation graph: %d models, %d relations, %d reachable models' % (
+                len(self.models),
+                len(self),
+                len(self.reachable),
+            )
+        ]
+
+        pruned = sorted(
+            (model._meta.label, accessor, field.related_model._meta.label,
+             reason)
+            for model, relations in self.pruned.items()
+            for accessor, field, reason in relations
+        )
+        for label, accessor, target, reason in pruned:
+            lines.append(
+                'Pruned relation %s.%s to %s (%s)' % (
+                    label, accessor, target, reason
+                )
+            )
+
+        return lines
@@ -0,0 +1,332 @@
+import heapq
+import sys
+import uuid
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterator
+
+from django.db.models import (
+    AutoField,
+    BigIntegerField,
+    IntegerField,
+    UUIDField,
+)
+
+from gestore.typing import OBJECT_KEY, PK
+
+
+class PlainKeySet(object):
+    """
+    A set of primary keys of a single model, kept in a regular set. Used for
+    primary keys we don't know how to store in a compact way.
+    """
+    storage = 'set'
+
+    def __init__(self):
+        self._keys = set()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, pk: PK) -> bool:
+        return pk in self._keys
+
+    def __iter__(self) -> Iterator[PK]:
+        return iter(self._keys)
+
+    def add(self, pk: PK) -> bool:
+        """
+        Adds a key to the set, returns False if it was already there.
+        """
+        if pk in self._keys:
+            return False
+
+        self._keys.add(pk)
+        return True
+
+    def nbytes(self) -> int:
+        """
+        Approximate memory used by the set, in bytes.
+        """
+        return sys.getsizeof(self._keys) + sum(
+            sys.getsizeof(key) for key in self._keys
+        )
+
+
+class KeySet(PlainKeySet):
+    """
+    A compact set of primary keys of a single model.
+
+    New keys land in a small buffer (a regular set), which is merged into a
+    compact sorted storage once it grows large enough. The buffer size grows
+    with the storage, so the cost of merging stays linear overall.
+
+    Subclasses decide how keys are encoded and stored.
+    """
+    MIN_BUFFER_SIZE = 1024
+
+    def __init__(self):
+        super(KeySet, self).__init__()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size + len(self._keys)
+
+    def __contains__(self, pk: PK) -> bool:
+        key = self.encode(pk)
+        return key in self._keys or self.stored(key)
+
+    def __iter__(self) -> Iterator[PK]:
+        for key in heapq.merge(self.iter_stored(), sorted(self._keys)):
+            yield self.decode(key)
+
+    def add(self, pk: PK) -> bool:
+        key = self.encode(pk)
+        if key in self._keys or self.stored(key):
+            return False
+
+        self._keys.add(key)
+        if len(self._keys) >= max(self.MIN_BUFFER_SIZE, self._size // 4):
+            self.compact()
+
+        return True
+
+    def compact(self) -> None:
+        """
+        Merges the buffered keys into the compact storage.
+        """
+        if not self._keys:
+            return
+
+        keys = list(heapq.merge(self.iter_stored(), sorted(self._keys)))
+        self.store(keys)
+        self._size = len(keys)
+        self._keys = set()
+
+    def nbytes(self) -> int:
+        return super(KeySet, self).nbytes() + self.stored_nbytes()
+
+    def encode(self, pk: PK) -> Any:
+        raise NotImplementedError
+
+    def decode(self, key: Any) -> PK:
+        return key
+
+    def stored(self, key: Any) -> bool:
+        raise NotImplementedError
+
+    def iter_stored(self) -> Iterator[Any]:
+        raise NotImplementedError
+
+    def store(self, keys: list) -> None:
+        raise NotImplementedError
+
+    def stored_nbytes(self) -> int:
+        raise NotImplementedError
+
+
+class IntKeySet(KeySet):
+    """
+    Stores integer primary keys either in a sorted array of 64-bit integers
+    or in a bitmap, whichever is smaller for the stored keys. Dense ranges of
+    auto incremented keys end up in a bitmap, costing one bit per key in
+    the range.
+    """
+    storage = 'array'
+
+    def __init__(self):
+        super(IntKeySet, self).__init__()
+        self._array = array('q')
+        self._bitmap = None
+        self._offset = 0
+
+    def encode(self, pk: PK) -> int:
+        return int(pk)
+
+    def stored(self, key: int) -> bool:
+        if self._bitmap is not None:
+            index = key - self._offset
+            return (
+                0 <= index < len(self._bitmap) * 8
+                and bool(self._bitmap[index >> 3] & (1 << (index & 7)))
+            )
+
+        index = bisect_left(self._array, key)
+        return index < len(self._array) and self._array[index] == key
+
+    def iter_stored(self) -> Iterator[int]:
+        if self._bitmap is None:
+            return iter(self._array)
+
+        return (
+            self._offset + (index << 3) + bit
+            for index, byte in enumerate(self._bitmap) if byte
+            for bit in range(8) if byte & (1 << bit)
+        )
+
+    def store(self, keys: list) -> None:
+        span = keys[-1] - keys[0] + 1
+
+        if (span + 7) // 8 < len(keys) * self._array.itemsize:
+            self.storage = 'bitmap'
+            self._offset = keys[0]
+            self._bitmap = bytearray((span + 7) // 8)
+            self._array = array('q')
+
+            for key in keys:
+                index = key - self._offset
+                self._bitmap[index >> 3] |= 1 << (index & 7)
+        else:
+            self.storage = 'array'
+            self._bitmap = None
+            self._array = array('q', keys)
+
+    def stored_nbytes(self) -> int:
+        if self._bitmap is not None:
+            return sys.getsizeof(self._bitmap)
+
+        return sys.getsizeof(self._array)
+
+
+class UUIDKeySet(KeySet):
+    """
+    Stores UUID primary keys as sorted 16-byte records in a single buffer,
+    instead of one `UUID` object per key.
+    """
+    storage = 'uuid16'
+    WIDTH = 16
+
+    def __init__(self):
+        super(UUIDKeySet, self).__init__()
+        self._records = bytearray()
+
+    def encode(self, pk: PK) -> bytes:
+        if not isinstance(pk, uuid.UUID):
+            pk = uuid.UUID(str(pk))
+
+        return pk.bytes
+
+    def decode(self, key: bytes) -> uuid.UUID:
+        return uuid.UUID(bytes=bytes(key))
+
+    def record(self, index: int) -> bytes:
+        start = index * self.WIDTH
+        return bytes(self._records[start:start + self.WIDTH])
+
+    def stored(self, key: bytes) -> bool:
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            record = self.record(middle)
+
+            if record == key:
+                return True
+            elif record < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        return False
+
+    def iter_stored(self) -> Iterator[bytes]:
+        return (self.record(index) for index in range(self._size))
+
+    def store(self, keys: list) -> None:
+        self._records = bytearray(b''.join(keys))
+
+    def stored_nbytes(self) -> int:
+        return sys.getsizeof(self._records)
+
+
+def get_key_set(model) -> PlainKeySet:
+    """
+    Picks the most compact key set for the primary key type of a model.
+    """
+    pk_field = getattr(getattr(model, '_meta', None), 'pk', None)
+
+    # Inherited models use a pointer to their parent as a primary key
+    while pk_field is not None and pk_field.is_relation:
+        pk_field = pk_field.target_field
+
+    if isinstance(pk_field, UUIDField):
+        return UUIDKeySet()
+
+    if isinstance(pk_field, (AutoField, IntegerField, BigIntegerField)):
+        return IntKeySet()
+
+    return PlainKeySet()
+
+
+class VisitedIndex(object):
+    """
+    Tracks discovered objects using one key set per model, keyed by the
+    objects' native primary keys.
+
+    Also counts how often objects were discovered more than once. Objects
+    traversals drop because they were `seen` before count as hits, and so
+    do objects added twice. Membership checks aren't counted.
+    """
+
+    def __init__(self):
+        self._key_sets = {}
+        self.hits = {}
+        self.misses = {}
+
+    def __len__(self) -> int:
+        return sum(len(key_set) for key_set in self._key_sets.values())
+
+    def __contains__(self, key: OBJECT_KEY) -> bool:
+        model, pk = key
+        key_set = self._key_sets.get(model)
+
+        return key_set is not None and pk in key_set
+
+    def seen(self, key: OBJECT_KEY) -> bool:
+        """
+        Returns whether a newly discovered object was discovered before,
+        counting it as a hit if so.
+        """
+        if key not in self:
+            return False
+
+        model, _ = key
+        self.hits[model] = self.hits.get(model, 0) + 1
+        return True
+
+    def add(self, key: OBJECT_KEY) -> bool:
+        """
+        Marks an object as discovered. Returns False if it was discovered
+        before.
+        """
+        model, pk = key
+        key_set = self._key_sets.get(model)
+        if key_set is None:
+            key_set = self._key_sets[model] = get_key_set(model)
+
+        added = key_set.add(pk)
+
+        counter = self.misses if added else self.hits
+        counter[model] = counter.get(model, 0) + 1
+
+        return added
+
+    def keys(self, model) -> PlainKeySet:
+        return self._key_sets.get(model, PlainKeySet())
+
+    def models(self) -> list:
+        return list(self._key_sets)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the membership statistics and storage of every model.
+        """
+        return {
+            str(getattr(getattr(model, '_meta', None), 'label', model)): {
+                'count': len(key_set),
+                'storage': key_set.storage,
+                'bytes': key_set.nbytes(),
+                'hits': self.hits.get(model, 0),
+                'misses': self.misses.get(model, 0),
+            }
+            for model, key_set in self._key_sets.items()
+        }
@@ -1,21 +1,90 @@
+from argparse import ArgumentTypeError
+from contextlib import ExitStack
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Union
 
 import json
 
-from django.contrib.contenttypes.models import ContentType
-from django.db.models import ForeignKey, Model
+from django.core.exceptions import (
+    FieldDoesNotExist,
+    FieldError,
+    ValidationError,
+)
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import ManyToManyRel, Model, QuerySet
 
 from gestore import processors
+from gestore.batching import BatchSizeController
+from gestore.budgets import (
+    BUDGET_ABORT,
+    BUDGET_PRUNE,
+    BudgetExceeded,
+    TraversalBudget,
+)
+from gestore.closure import ClosureTraversal, UnsupportedClosure
 from gestore.encoders import GestoreEncoder
+from gestore.estimates import ExportEstimate
+from gestore.frontier import KEY_TABLE_THRESHOLD
 from gestore.gestore_command import GestoreCommand
-from gestore.utils import get_model_name, get_obj_from_str, get_pip_packages, \
-    instance_representation
+from gestore.graph import RelationGraph
+from gestore.index import VisitedIndex
+from gestore.parallel import ParallelTraversal
+from gestore.plans import FieldPlan, get_field_plan
+from gestore.policies import TraversalPolicy
+from gestore.processors import DEFAULT_CHUNK_SIZE
+from gestore.records import ExportRecord
+from gestore.sampling import SAMPLE_METHODS, SAMPLE_RANDOM, Sample
+from gestore.scans import RangeScan
+from gestore.snapshots import UnsupportedSnapshot, snapshot
+from gestore.traversal import (
+    DEFAULT_BATCH_SIZE,
+    EXTRACT_INSTANCES,
+    EXTRACT_VALUES,
+    BatchTraversal,
+    chunks,
+)
+from gestore.typing import OBJECT_KEY, PK
+from gestore.utils import get_model_name, get_object_key, \
+    get_objs_from_str, get_pip_packages, get_queryset_from_str, \
+    get_querysets_from_str
+
+
+STRATEGY_DFS = 'dfs'
+STRATEGY_BFS = 'bfs'
+STRATEGY_CTE = 'cte'
+
+
+def positive_int(value: str) -> int:
+    """
+    Argument type of sizes and counts, which must be at least 1.
+    """
+    number = int(value)
+    if number < 1:
+        raise ArgumentTypeError('%s is not a positive integer' % value)
+
+    return number
 
 
 class Command(GestoreCommand):
     """
     Export objects in a format that can be imported later.
     """
+    def __init__(self, *args, **kwargs):
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        self.extract = EXTRACT_INSTANCES
+        self.budget = TraversalBudget()
+        self.graph = None
+        self.policy = None
+        self.max_children = None
+        self.strategy = STRATEGY_DFS
+        self.workers = 1
+        self.threads = 1
+        self.batch_sizes = None
+        self.using = DEFAULT_DB_ALIAS
+
+        super(Command, self).__init__(*args, **kwargs)
+
     def add_arguments(self, parser) -> None:
         # Add common args
         super(Command, self).add_arguments(parser)
@@ -23,7 +92,15 @@ class Command(GestoreCommand):
         parser.add_argument(
             'objects',
             help='List of all objects to export',
-            nargs='+',
+            nargs='*',
+        )
+        parser.add_argument(
+            '-f', '--filter',
+            help='Export all objects of a model matching the given lookups, '
+                 'e.g. `demoapp.Book:author_id=1,title__startswith=A`. Can '
+                 'be used multiple times',
+            action='append',
+            default=[],
         )
 
         parser.add_argument(
@@ -37,6 +114,153 @@ class Command(GestoreCommand):
             default=self.exports_dir,
             type=str,
         )
+        parser.add_argument(
+            '-s', '--strategy',
+            help='The traversal used to discover related objects. `dfs` '
+                 'processes objects one by one, while `bfs` processes them '
+                 'level by level in batches grouped by model. `cte` lets '
+                 'the database discover all objects using a recursive '
+                 'query, falling back to `bfs` if that is not possible',
+            choices=[STRATEGY_DFS, STRATEGY_BFS, STRATEGY_CTE],
+            default=STRATEGY_DFS,
+        )
+        parser.add_argument(
+            '--batch-size',
+            help='Maximum number of objects of the same model to process in '
+                 'one batch when using the `bfs` strategy',
+            default=DEFAULT_BATCH_SIZE,
+            type=positive_int,
+        )
+        parser.add_argument(
+            '--extract',
+            help='How the `bfs` strategy extracts objects data. `instances` '
+                 'builds model instances, while `values` reads the columns '
+                 'of each batch using `values_list` without instantiating '
+                 'any model',
+            choices=[EXTRACT_INSTANCES, EXTRACT_VALUES],
+            default=EXTRACT_INSTANCES,
+        )
+        parser.add_argument(
+            '--chunk-size',
+            help='Number of objects fetched per query when streaming the '
+                 'objects pointing at an exported object',
+            default=DEFAULT_CHUNK_SIZE,
+            type=positive_int,
+        )
+        parser.add_argument(
+            '--workers',
+            help='Number of processes discovering objects in parallel, each '
+                 'with its own database connection. Only used by the `bfs` '
+                 'strategy',
+            default=1,
+            type=positive_int,
+        )
+        parser.add_argument(
+            '--threads',
+            help='Number of threads fetching the relations of each batch '
+                 'concurrently, each with its own database connection. '
+                 'Only used by the `bfs` strategy',
+            default=1,
+            type=positive_int,
+        )
+        parser.add_argument(
+            '--target-query-ms',
+            help='Adapt the batch size of each model so the slowest query '
+                 'of its batches takes about this many milliseconds. Only '
+                 'used by the `bfs` strategy',
+            type=float,
+        )
+        parser.add_argument(
+            '--max-memory',
+            help='Adapt the batch size of each model so the process uses '
+                 'at most this many megabytes of memory. Only used by the '
+                 '`bfs` strategy',
+            type=int,
+        )
+        parser.add_argument(
+            '--database',
+            help='The database to read the objects from, a read replica for '
+                 'example',
+            default=DEFAULT_DB_ALIAS,
+        )
+        parser.add_argument(
+            '--snapshot',
+            help='Read all objects inside a single repeatable read '
+                 'transaction, so the export is consistent even while the '
+                 'database is being written to',
+            action='store_true',
+        )
+        parser.add_argument(
+            '--plan',
+            help='Estimate the size of the export using COUNT queries only, '
+                 'without exporting anything',
+            action='store_true',
+        )
+        parser.add_argument(
+            '--sample',
+            help='Export a sample of the objects of a model, given as '
+                 'app_label.model_name:size where size is a number of '
+                 'objects or a percentage, e.g. demoapp.Book:5%%. Can be '
+                 'used multiple times',
+            action='append',
+            default=[],
+        )
+        parser.add_argument(
+            '--sample-method',
+            help='How sampled objects are picked. `random` picks them at '
+                 'random, `stratified` picks them at random within groups '
+                 'sharing the same `--stratify-by` value, and `stride` '
+                 'spreads them evenly along their primary keys',
+            choices=SAMPLE_METHODS,
+            default=SAMPLE_RANDOM,
+        )
+        parser.add_argument(
+            '--stratify-by',
+            help='The field grouping objects of `stratified` samples',
+        )
+        parser.add_argument(
+            '--seed',
+            help='Seed of the random sampling methods, for reproducible '
+                 'samples',
+            type=int,
+        )
+        parser.add_argument(
+            '--max-children',
+            help='Maximum number of objects each object discovers through '
+                 'a reverse ForeignKey relation, the first ones by primary '
+                 'key',
+            type=int,
+        )
+        parser.add_argument(
+            '--max-objects',
+            help='Maximum number of objects to discover',
+            type=int,
+        )
+        parser.add_argument(
+            '--max-depth',
+            help='Maximum number of levels to discover, the given objects '
+                 'being level 0',
+            type=int,
+        )
+        parser.add_argument(
+            '--max-fanout',
+            help='Maximum number of objects a reverse relation can add for a '
+                 'single batch, or a single object when using the `dfs` '
+                 'strategy',
+            type=int,
+        )
+        parser.add_argument(
+            '--time-limit',
+            help='Maximum number of seconds to spend discovering objects',
+            type=float,
+        )
+        parser.add_argument(
+            '--on-budget',
+            help='What to do once a budget is exceeded. `abort` stops the '
+                 'export, while `prune` leaves out whatever goes over the '
+                 'budget and reports it',
+            choices=[BUDGET_ABORT, BUDGET_PRUNE],
+        )
 
     def handle(self, *args, **options) -> None:
         """
@@ -44,31 +268,142 @@ class Command(GestoreCommand):
         """
         self.debug = options['debug']
         self.use_bucket = options['bucket']
+        self.batch_size = options['batch_size']
+        self.chunk_size = options['chunk_size']
+        self.extract = options['extract']
+        self.strategy = options['strategy']
+        self.workers = options['workers']
+        self.threads = options['threads']
+        self.using = options['database']
+        self.max_children = options['max_children']
+        if self.workers > 1 and self.strategy == STRATEGY_DFS:
+            self.raise_error('Using workers requires the bfs strategy')
+
+        if self.workers > 1 and options['snapshot']:
+            self.raise_error(
+                'Workers use their own connections, they can\'t share a '
+                'snapshot'
+            )
+
+        if self.threads > 1 and self.strategy == STRATEGY_DFS:
+            self.raise_error('Using threads requires the bfs strategy')
+
+        if self.threads > 1 and self.workers > 1:
+            self.raise_error('Use either workers or threads')
+
+        if options['target_query_ms'] is not None \
+                or options['max_memory'] is not None:
+            if self.workers > 1:
+                self.raise_error('Workers use fixed batch sizes')
+
+            self.batch_sizes = BatchSizeController(
+                self.batch_size,
+                target_query_ms=options['target_query_ms'],
+                max_memory=(
+                    options['max_memory'] * 2 ** 20
+                    if options['max_memory'] is not None else None
+                ),
+            )
+
+        if self.threads > 1 and options['snapshot']:
+            self.raise_error(
+                'Threads use their own connections, they can\'t share a '
+                'snapshot'
+            )
+
+        self.budget = TraversalBudget.from_settings(
+            max_objects=options['max_objects'],
+            max_depth=options['max_depth'],
+            max_fanout=options['max_fanout'],
+            time_limit=options['time_limit'],
+            on_exceeded=options['on_budget'],
+        )
+        provided_objects = options['objects'] + options['filter'] \
+            + options['sample']
+        if not provided_objects:
+            self.raise_error('Provide objects, filters or samples to export')
+
+        sample_options = {
+            'method': options['sample_method'],
+            'stratify_by': options['stratify_by'],
+            'seed': options['seed'],
+        }
+
         self.write('Inspecting project for potential problems...')
-        self.check(objects=options['objects'], display_num_errors=True)
+        self.check(
+            objects=options['objects'],
+            filters=options['filter'],
+            samples=options['sample'],
+            sample_options=sample_options,
+            display_num_errors=True
+        )
 
-        objects = [
-            get_obj_from_str(obj) for obj in options['objects']
+        samples = [
+            Sample.from_str(sample_rep, using=self.using, **sample_options)
+            for sample_rep in options['sample']
         ]
-        self.write_migrate_heading(
-            'Exporting %s in progress...' % options['objects']
-        )
+
+        if options['plan']:
+            self.write_estimate(
+                *get_querysets_from_str(options['objects'], using=self.using),
+                *(
+                    get_queryset_from_str(obj, using=self.using)
+                    for obj in options['filter']
+                ),
+                *self.get_sampled_querysets(samples),
+                root_models=options['root']
+            )
+            return
 
         # Processes the necessary data all exported objects share.
         # This data will be helpful if you are debugging or returning to an
         # earlier state later if any changes occur when packages gets updated,
         # or our code changes.
         # Also some instance tracking information has been added.
+        generate_objects = self.generate_objects \
+            if self.strategy == STRATEGY_DFS \
+            else self.generate_objects_batched
+
+        try:
+            with ExitStack() as stack:
+                if options['snapshot']:
+                    stack.enter_context(snapshot(self.using))
+
+                objects = get_objs_from_str(
+                    options['objects'],
+                    using=self.using
+                )
+                objects.extend(
+                    get_queryset_from_str(obj, using=self.using)
+                    for obj in options['filter']
+                )
+                objects.extend(self.get_sampled_querysets(samples))
+                self.write_migrate_heading(
+                    'Exporting %s in progress...' % provided_objects
+                )
+
+                exported_objects = generate_objects(
+                    *objects, root_models=options['root']
+                )
+        except UnsupportedSnapshot as e:
+            self.raise_error(str(e))
+        except BudgetExceeded as e:
+            for message in e.report:
+                self.write_error(message)
+
+            self.raise_error(
+                'Export aborted, use `--on-budget prune` to export the '
+                'objects within the budget'
+            )
+
         export_data = {
             'version': str(self.get_version()),
             'date': datetime.now(),
             'host_name': self.hostname,
             'ip_address': self.ip_address,
             'libraries': get_pip_packages(),
-            'provided_objects': options['objects'],
-            'objects': self.generate_objects(
-                *objects, root_models=options['root']
-            ),
+            'provided_objects': provided_objects,
+            'objects': exported_objects,
         }
 
         output = json.dumps(
@@ -83,6 +418,44 @@ class Command(GestoreCommand):
 
         self.write_success('Objects successfully exported!')
 
+    def get_sampled_querysets(self, samples: List[Sample]) -> List[QuerySet]:
+        """
+        Picks the objects of the given samples, and returns querysets
+        selecting them in batches.
+
+        All samples are exported in a single pass, so objects shared by
+        sampled objects are discovered and exported only once.
+        """
+        querysets = []
+        for sample in samples:
+            keys = sample.get_keys()
+            self.write_info('Sampled %d %s objects' % (
+                len(keys), sample.queryset.model._meta.label
+            ))
+            querysets.extend(
+                sample.queryset.filter(pk__in=batch)
+                for batch in chunks(keys, self.batch_size)
+            )
+
+        return querysets
+
+    def get_root_objects(
+            self,
+            args: List[Union[Model, QuerySet]]
+    ) -> List[Model]:
+        """
+        Returns the objects to export out of the given objects and querysets.
+        Each queryset is loaded using a single query.
+        """
+        objects = []
+        for obj in args:
+            if isinstance(obj, QuerySet):
+                objects.extend(obj.iterator(chunk_size=self.chunk_size))
+            else:
+                objects.append(obj)
+
+        return objects
+
     def generate_objects(self, *args: [Model], root_models=None) -> list:
         """
         A Depth First Search implementation to extract the given objects and
@@ -105,82 +478,352 @@ class Command(GestoreCommand):
 
         To avoid infinite loops caused by processing the same element multiple
         times, we check the discovered space (processing and processed objects)
-        before adding new elements.
+        before adding new elements. It is tracked per model using the objects'
+        primary keys, check `gestore.index.VisitedIndex` for more info.
+
+        Some discovered objects are only known by their keys. These are
+        fetched once they are popped from the stack, along with all other
+        keys of the same model waiting in the stack, using a single query.
+
+        Budgets apply the same way they do to the batched traversal. The
+        depth of an object is the length of the path it was discovered
+        through, which can be longer than its level in the batched
+        traversal, so a depth limit may leave out more objects. Fan-out
+        limits apply to the reverse relations of each object.
+
+        Relations that can't discover new objects are skipped, check
+        `gestore.graph.RelationGraph` for more info.
+
+        Querysets can be given instead of objects, all their objects are
+        exported:
+
+            command.generate_objects(Book.objects.filter(author=author))
 
         :return: Simply all discovered objects' data.
         """
+        args = self.get_root_objects(args)
         objects = []
-        visited = {}
+        loaded = {}
+        # Keys in the processing stack that were not loaded yet, by model
+        pending_keys = {}
 
-        processing_stack = list(args)
-        in_processing_stack = {
-            instance_representation(instance): True
-            for instance in args
-        }
+        # Objects in the processing stack and processed ones. An object is
+        # always processed once it's pushed to the stack, so we don't need to
+        # tell them apart.
+        discovered = VisitedIndex()
+        for instance in args:
+            discovered.add(get_object_key(instance))
+
+        # Objects along with their depth
+        processing_stack = [(instance, 0) for instance in args]
+        self.budget.start()
 
         if not root_models:
             root_models = set()
 
         root_models = set(get_model_name(i) for i in args).union(root_models)
+        self.graph = self.build_relation_graph(args, root_models)
+
+        while processing_stack and self.budget.check_time():
+            instance, depth = processing_stack.pop()
+
+            if isinstance(instance, tuple):
+                model, pk = instance
+                pending_keys.get(model, set()).discard(pk)
+                instance = self.load_key(
+                    instance,
+                    pending_keys,
+                    loaded,
+                    using=self.using
+                )
 
-        while processing_stack:
-            instance = processing_stack.pop()
-            instance_key = instance_representation(instance)
-
-            in_processing_stack[instance_key] = False
             item, pending_items = self.process_instance(instance)
 
             if item:
                 objects.append(item)
 
             for pending_item in pending_items:
-                pending_item_key = instance_representation(pending_item)
+                if pending_item is None:
+                    continue
 
-                is_root_object = get_model_name(pending_item) in root_models
-                is_processed = visited.get(pending_item_key, False)
-                is_processing = in_processing_stack.get(
-                    pending_item_key, False
-                )
+                if get_model_name(pending_item) in root_models:
+                    continue
 
-                # Equivalent to not is_processed and not is_...
-                should_process = not (
-                        is_processed or is_processing or is_root_object
-                )
-                if should_process:
-                    processing_stack.append(pending_item)
-                    in_processing_stack[pending_item_key] = True
+                key = get_object_key(pending_item)
+                if discovered.seen(key):
+                    continue
+
+                # Left undiscovered, a shorter path may still reach it
+                if not self.budget.check_depth(depth + 1):
+                    continue
 
-            visited[instance_key] = True
+                if self.budget.check_objects(len(discovered) + 1):
+                    discovered.add(key)
+                    processing_stack.append((pending_item, depth + 1))
+                    if isinstance(pending_item, tuple):
+                        pending_keys.setdefault(
+                            pending_item[0], set()
+                        ).add(pending_item[1])
+
+        self.write_summary(objects, discovered)
+
+        return objects
+
+    def build_relation_graph(
+            self,
+            instances: tuple,
+            root_models: set
+    ) -> RelationGraph:
+        """
+        Builds the relation graph of all installed models, pruned for an
+        export of the given objects or querysets.
+        """
+        graph = RelationGraph(
+            policy=TraversalPolicy.from_settings(
+                max_children=self.max_children
+            ),
+            using=self.using
+        )
+        graph.prune(
+            [
+                obj.model if isinstance(obj, QuerySet) else type(obj)
+                for obj in instances
+                if isinstance(obj, (Model, QuerySet))
+            ],
+            root_models
+        )
 
+        if self.debug:
+            for line in graph.describe():
+                self.write(line)
+
+        return graph
+
+    @staticmethod
+    def load_key(
+            key: OBJECT_KEY,
+            pending_keys: Dict[type, Set[PK]],
+            loaded: Dict[OBJECT_KEY, Model],
+            using: str = DEFAULT_DB_ALIAS
+    ) -> Optional[Model]:
+        """
+        Returns the object of the given key. If it wasn't loaded already, we
+        load it along with all the keys of the same model waiting in the
+        processing stack, given in `pending_keys` by model, using `in_bulk`.
+        They're kept in `loaded` until they're popped.
+        """
+        model, pk = key
+
+        if key not in loaded:
+            pks = pending_keys.pop(model, set())
+            pks.add(pk)
+            manager = model._default_manager.db_manager(using)
+            for batch in chunks(list(pks), DEFAULT_BATCH_SIZE):
+                for obj_pk, obj in manager.in_bulk(batch).items():
+                    loaded[(model, obj_pk)] = obj
+
+        return loaded.pop(key, None)
+
+    def generate_objects_batched(self, *args: [Model], root_models=None):
+        """
+        Same as `generate_objects`, but the objects are discovered level by
+        level, and processed in batches of objects of the same model. Check
+        `gestore.traversal.BatchTraversal` for more info.
+
+        Using the `cte` strategy, objects are discovered by the database
+        instead, check `gestore.closure.ClosureTraversal`. Using more than one
+        worker, levels are processed by a pool of processes, check
+        `gestore.parallel.ParallelTraversal`.
+
+        :return: Simply all discovered objects' data.
+        """
+        args = self.get_root_objects(args)
+        root_models = set(get_model_name(i) for i in args).union(
+            root_models or ()
+        )
+        self.graph = self.build_relation_graph(args, root_models)
+
+        # Key tables are temporary tables, which can't be created on read
+        # replicas
+        key_table_threshold = KEY_TABLE_THRESHOLD \
+            if self.using == DEFAULT_DB_ALIAS \
+            else None
+
+        options = {
+            'root_models': root_models,
+            'batch_size': self.batch_size,
+            'chunk_size': self.chunk_size,
+            'extract': self.extract,
+            'budget': self.budget,
+            'graph': self.graph,
+            'key_table_threshold': key_table_threshold,
+            'using': self.using,
+            'writer': self.write,
+            'debug': self.debug,
+            'threads': self.threads,
+            'batch_sizes': self.batch_sizes,
+        }
+
+        traversal = None
+        if self.strategy == STRATEGY_CTE:
+            try:
+                traversal = ClosureTraversal(self.process_instance, **options)
+                objects = traversal.run(*args)
+            except UnsupportedClosure as e:
+                self.write_warning('Falling back to bfs: %s' % e)
+                traversal = None
+
+        if traversal is None and self.workers > 1:
+            traversal = ParallelTraversal(
+                self.process_instance,
+                workers=self.workers,
+                **options
+            )
+            objects = traversal.run(*args)
+            self.errors.extend(traversal.errors)
+
+        if traversal is None:
+            traversal = BatchTraversal(self.process_instance, **options)
+            objects = traversal.run(*args)
+
+        self.write_summary(objects, traversal.visited)
+
+        return objects
+
+    def estimate_objects(
+            self,
+            *args: Union[Model, QuerySet],
+            root_models=None
+    ) -> ExportEstimate:
+        """
+        Estimates the export of the given objects or querysets, following the
+        same rules as `generate_objects`, without fetching any object. Check
+        `gestore.estimates.ExportEstimate` for more info.
+        """
+        counts = {}
+        for obj in args:
+            if isinstance(obj, QuerySet):
+                counts[obj.model] = counts.get(obj.model, 0) + obj.count()
+            else:
+                counts[type(obj)] = counts.get(type(obj), 0) + 1
+
+        root_models = set(model.__name__ for model in counts).union(
+            root_models or ()
+        )
+        self.graph = self.build_relation_graph(args, root_models)
+
+        return ExportEstimate(
+            self.graph,
+            root_models,
+            batch_size=self.batch_size,
+            using=self.using,
+            budget=self.budget,
+            fanout_batch_size=(
+                1 if self.strategy == STRATEGY_DFS else self.batch_size
+            ),
+        ).run(counts)
+
+    def write_estimate(self, *args: QuerySet, root_models=None) -> None:
+        estimate = self.estimate_objects(*args, root_models=root_models)
+
+        for line in estimate.describe(self.strategy):
+            self.write(line)
+
+        if self.budget.prune:
+            for message in estimate.budget.report:
+                self.write_warning('The export would prune: %s' % message)
+        elif estimate.budget.report:
+            # The first budget exceeded stops the export
+            self.write_warning(
+                'The export would abort: %s' % estimate.budget.report[0]
+            )
+
+    def write_summary(self, objects: list, visited: VisitedIndex) -> None:
         self.write('\n')
         for error in self.errors:
             self.write_warning('Error processing field %s from %s: %s' % error)
 
+        for message in self.budget.report:
+            self.write_warning('Pruned: %s' % message)
+
+        if self.budget.pruned_objects:
+            self.write_warning(
+                'Skipped %d discovered objects over the objects budget'
+                % self.budget.pruned_objects
+            )
+
+        if self.batch_sizes is not None:
+            for decision in self.batch_sizes.decisions:
+                self.write('Adapted %s' % decision)
+
+        if self.debug:
+            for label, stats in sorted(visited.stats().items()):
+                self.write(
+                    '%s: %d objects in %s storage (%d bytes), discovered '
+                    '%d more times' % (
+                        label,
+                        stats['count'],
+                        stats['storage'],
+                        stats['bytes'],
+                        stats['hits'],
+                    )
+                )
+
         self.write(
             'Total exported objects is %d (%d processed, %d errors)'
             % (len(objects), len(visited), len(self.errors))
         )
 
-        return objects
+    def get_plan(self, instance: Model) -> FieldPlan:
+        if self.graph is not None:
+            return self.graph.get_plan(type(instance))
+
+        if self.policy is None:
+            self.policy = TraversalPolicy.from_settings(
+                max_children=self.max_children
+            )
+
+        return self.policy.apply(get_field_plan(instance))
+
+    def check_fanout(
+            self,
+            instance: Model,
+            accessor: str,
+            field: Any,
+            scan: RangeScan = None
+    ) -> bool:
+        """
+        Checks whether the objects a reverse relation of an instance points
+        at fit in the fan-out budget. They're only counted if the relation is
+        limited.
+        """
+        relation = '%s.%s' % (instance._meta.label, accessor)
+        if self.budget.get_fanout_limit(relation) is None:
+            return True
+
+        queryset = getattr(instance, accessor).using(self.using).all()
+        if scan is not None:
+            queryset = scan.filter(queryset, field)
+
+        return self.budget.check_fanout(relation, queryset.count())
 
-    def process_instance(self, instance: Model):
+    def process_instance(self, instance: Model, plan: FieldPlan = None):
         """
         Inspired from: django.forms.models.model_to_dict
         Return a dict containing the data in ``instance`` suitable for passing
         as a Model's ``create`` keyword argument with all its discovered
         relations.
+
+        Fields are processed according to the given plan, defaults to the
+        plan of the instance's model in the current relation graph.
         """
         if not instance:
             return instance, []
 
         to_process = set()
-        content_type = ContentType.objects.get_for_model(instance)
-        opts = instance._meta  # pylint: disable=W0212
+        plan = plan or self.get_plan(instance)
 
-        data = {
-            'model': '%s.%s' % (content_type.app_label, content_type.model),
-            'fields': {},
-        }
+        data = ExportRecord(plan.layout)
 
         if self.debug:
             self.write_migrate_label(
@@ -188,52 +831,128 @@ class Command(GestoreCommand):
                 (data['model'], instance.id)
             )
 
-        # We are going to iterate over the fields one by one, and depending
-        # on the type, we determine how to process them.
-        for field in opts.get_fields():
+        # Fields were classified once per model in the plan, we only need to
+        # process each group the way its type requires.
+        if plan.pk_field:
+            data['pk'] = plan.pk_field.value_from_object(instance)
+
+        for name, field in plan.values:
             try:
-                if isinstance(field, ForeignKey):
-                    value, item = processors.process_foreign_key(
-                        instance, field
-                    )
-                    data['fields'][field.name] = value
-                    to_process.add(item)
-                elif field.one_to_many:
-                    items = processors.process_one_to_many_relation(
-                        instance,
-                        field
-                    )
-                    to_process.update(items)
-                elif field.one_to_one:
-                    items = processors.process_one_to_one_relation(
-                        instance,
-                        field
+                data['fields'][name] = field.value_from_object(instance)
+            except Exception as e:
+                self.errors.append((instance, field, e))
+
+        for name, field in plan.foreign_keys:
+            try:
+                if field in plan.references:
+                    # Only the value is exported
+                    data['fields'][name] = field.value_from_object(instance)
+                    continue
+
+                value, item = processors.process_foreign_key(instance, field)
+                data['fields'][name] = value
+                to_process.add(item)
+            except Exception as e:
+                self.errors.append((instance, field, e))
+
+        for _, field in plan.parent_links:
+            try:
+                if field not in plan.references:
+                    to_process.add(
+                        processors.process_parent_link(instance, field)
                     )
-                    to_process.update(items)
-                elif field.many_to_many:
-                    value, items = processors.process_many_to_many_relation(
-                        instance,
-                        field
+            except Exception as e:
+                self.errors.append((instance, field, e))
+
+        for accessor, field in plan.one_to_many:
+            scan = plan.scans.get(field)
+            if not self.check_fanout(instance, accessor, field, scan=scan):
+                continue
+
+            try:
+                items = processors.process_one_to_many_relation(
+                    instance,
+                    field,
+                    chunk_size=self.chunk_size,
+                    limit=plan.limits.get(field),
+                    scan=plan.scans.get(field)
+                )
+                to_process.update(items)
+            except Exception as e:
+                self.errors.append((instance, field, e))
+
+        for _, field in plan.one_to_one + plan.child_links:
+            try:
+                items = processors.process_one_to_one_relation(
+                    instance,
+                    field
+                )
+                to_process.update(items)
+            except Exception as e:
+                self.errors.append((instance, field, e))
+
+        for _, field in plan.many_to_many:
+            try:
+                # Only the through table is read, related objects are pushed
+                # as keys and loaded in bulk when they're popped.
+                values, keys = processors.process_many_to_many_batch(
+                    [instance],
+                    field,
+                    using=self.using
+                )
+
+                if not isinstance(field, ManyToManyRel):
+                    data['fields'][field.name] = values[instance.pk]
+
+                if field not in plan.references:
+                    to_process.update(keys)
+            except Exception as e:
+                self.errors.append((instance, field, e))
+
+        for _, field in plan.generic_foreign_keys:
+            try:
+                if field not in plan.references:
+                    to_process.add(
+                        processors.process_generic_foreign_key(instance, field)
                     )
+            except Exception as e:
+                self.errors.append((instance, field, e))
+
+        for accessor, field in plan.generic_relations:
+            if not self.check_fanout(instance, accessor, field):
+                continue
+
+            try:
+                items = processors.process_generic_relation(
+                    instance,
+                    field,
+                    chunk_size=self.chunk_size
+                )
+                to_process.update(items)
+            except Exception as e:
+                self.errors.append((instance, field, e))
+
+        for name, field in plan.custom:
+            try:
+                values, keys = processors.get_processor(field).process_batch(
+                    type(instance),
+                    [instance.pk],
+                    field,
+                    objects=[instance],
+                    using=self.using
+                )
+
+                if values is not None:
+                    data['fields'][name] = values[instance.pk]
 
-                    if value is not None:
-                        data['fields'][field.name] = value
-
-                    to_process.update(items)
-                elif field in opts.concrete_fields \
-                        or field in opts.private_fields:
-                    # Django stores the primary key under `id`
-                    if field.name == 'id':
-                        data['pk'] = field.value_from_object(instance)
-                    else:
-                        data['fields'][field.name] = field.value_from_object(
-                            instance
-                        )
-                else:
-                    self.write_migrate_label('SKIPPED %s' % str(field))
+                if field not in plan.references:
+                    to_process.update(keys)
             except Exception as e:
                 self.errors.append((instance, field, e))
 
+        for field in plan.skipped:
+            self.write_migrate_label('SKIPPED %s' % str(field))
+
         if self.debug:
             self.write('Finished processing %s object' % data['model'])
             self.write('%d new items to process' % len(to_process))
@@ -244,9 +963,14 @@ class Command(GestoreCommand):
 
     def check(self, *args, **kwargs) -> None:
         objects = kwargs.pop('objects', [])
+        filters = kwargs.pop('filters', [])
+        samples = kwargs.pop('samples', [])
+        sample_options = kwargs.pop('sample_options', {})
 
         self.check_migrations()
         self.check_objects(objects)
+        self.check_filters(filters)
+        self.check_samples(samples, sample_options)
 
         super(Command, self).check(*args, **kwargs)
 
@@ -260,3 +984,37 @@ class Command(GestoreCommand):
                     'Bad object "%s" representation. Should '
                     'be app_label.model_name.obj_id' % obj
                 )
+
+    def check_filters(self, filters: List[str]) -> None:
+        for filter_rep in filters:
+            try:
+                get_queryset_from_str(filter_rep)
+            except (
+                    FieldError,
+                    LookupError,
+                    TypeError,
+                    ValidationError,
+                    ValueError,
+            ) as e:
+                self.print_help('manage.py', 'export')
+                self.raise_error(
+                    'Bad filter "%s" representation (%s). Should be '
+                    'app_label.model_name:lookup=value[,lookup=value...]'
+                    % (filter_rep, e)
+                )
+
+    def check_samples(
+            self,
+            samples: List[str],
+            sample_options: Dict[str, Any]
+    ) -> None:
+        for sample_rep in samples:
+            try:
+                Sample.from_str(sample_rep, **sample_options)
+            except (FieldDoesNotExist, LookupError, ValueError) as e:
+                self.print_help('manage.py', 'export')
+                self.raise_error(
+                    'Bad sample "%s" representation (%s). Should be '
+                    'app_label.model_name:size, the size being a number of '
+                    'objects or a percentage' % (sample_rep, e)
+                )
@@ -0,0 +1,318 @@
+import multiprocessing
+from io import StringIO
+from operator import attrgetter, itemgetter
+from typing import Any, Dict, Iterable, List, Tuple
+
+import django
+from django.apps import apps
+from django.db import connections
+from django.db.models import Model
+
+from gestore.budgets import BUDGET_PRUNE, TraversalBudget
+from gestore.plans import FieldPlan, get_field_plan
+from gestore.policies import TraversalPolicy
+from gestore.traversal import BatchTraversal, RowChunk, chunks
+from gestore.typing import PK
+from gestore.utils import get_model_name
+
+# Label of a model and a primary key, a picklable `OBJECT_KEY`
+LABEL_KEY = Tuple[str, PK]
+
+# The traversal of the current worker process
+_worker = None
+
+
+class WorkerTraversal(BatchTraversal):
+    """
+    The part of a `ParallelTraversal` running in a worker process. Processes
+    batches of objects given by their keys, and hands the discovered objects
+    back as keys. Deciding which of these should be processed is up to the
+    coordinator.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.pruned = kwargs.pop('pruned', {})
+        max_children = kwargs.pop('max_children', None)
+        super(WorkerTraversal, self).__init__(*args, **kwargs)
+        self.policy = TraversalPolicy.from_settings(max_children=max_children)
+        self._plans = {}
+        self.leaf_keys = set()
+
+    def get_plan(self, model) -> FieldPlan:
+        plan = self._plans.get(model)
+        if plan is None:
+            plan = self.policy.apply(get_field_plan(model))
+
+            pruned = self.pruned.get(model._meta.label)
+            if pruned:
+                plan = plan.exclude(
+                    field for accessor, field in plan.relations
+                    if accessor in pruned
+                )
+
+            self._plans[model] = plan
+
+        return plan
+
+    def process_task(
+            self,
+            label: str,
+            pks: List[PK]
+    ) -> Tuple[list, List[LABEL_KEY]]:
+        """
+        Processes the objects of the given model and primary keys. Returns
+        their data, and the keys of all the objects they point at.
+
+        Keys of objects of scanned models are kept in `leaf_keys` instead.
+        """
+        model = apps.get_model(label)
+        objects = []
+        keys = set()
+        self.leaf_keys = set()
+
+        instances = self.load(model, dict.fromkeys(pks))
+        for batch in chunks(instances, self.batch_size):
+            for item, pending_items in self.process_batch(model, batch):
+                if item:
+                    objects.append(item)
+
+                keys.update(self.get_keys(pending_items))
+
+        return objects, sorted(keys, key=repr)
+
+    def process_leaves(
+            self,
+            model,
+            chunk: list
+    ) -> Iterable[Tuple[dict, Iterable[Any]]]:
+        """
+        Objects of scanned models are reported to the coordinator, which
+        deduplicates them against all the objects discovered by any worker
+        before they are processed.
+        """
+        label = model._meta.label
+        get_pk = itemgetter(0) if self.use_values else attrgetter('pk')
+        self.leaf_keys.update((label, get_pk(obj)) for obj in chunk)
+
+        return ()
+
+    @staticmethod
+    def get_keys(
+            pending_items: Iterable[Any]
+    ) -> Iterable[LABEL_KEY]:
+        if isinstance(pending_items, RowChunk):
+            label = pending_items.model._meta.label
+            return ((label, row[0]) for row in pending_items)
+
+        keys = []
+        for pending_item in pending_items:
+            if pending_item is None:
+                continue
+
+            if isinstance(pending_item, Model):
+                model, pk = type(pending_item), pending_item.pk
+            else:
+                model, pk = pending_item
+
+            keys.append((model._meta.label, pk))
+
+        return keys
+
+
+def init_worker(options: Dict[str, Any]) -> None:
+    """
+    Sets up a worker process. Each worker uses its own database connections,
+    opened on first use.
+    """
+    global _worker
+
+    if not apps.ready:
+        django.setup()
+
+    # Avoid circular imports, the command depends on this module
+    from gestore.management.commands.exportobjects import Command
+
+    command = Command(stdout=StringIO())
+    command.chunk_size = options['chunk_size']
+
+    _worker = WorkerTraversal(
+        command.process_instance,
+        root_models=options['root_models'],
+        batch_size=options['batch_size'],
+        chunk_size=options['chunk_size'],
+        extract=options['extract'],
+        pruned=options['pruned'],
+        max_children=options['max_children'],
+        using=options['using'],
+        # Exceeded fan-out limits are reported to the coordinator, which
+        # decides whether the export is aborted
+        budget=TraversalBudget(on_exceeded=BUDGET_PRUNE, **options['fanout']),
+    )
+    _worker.errors = command.errors
+
+
+def run_task(
+        task: Tuple[str, List[PK]]
+) -> Tuple[list, list, list, list, list]:
+    """
+    Processes a task in a worker process. Processing errors are returned
+    as strings, since fields and exceptions are not always picklable, along
+    with the messages of the exceeded fan-out limits.
+    """
+    label, pks = task
+    objects, keys = _worker.process_task(label, pks)
+    leaf_keys = sorted(_worker.leaf_keys, key=repr)
+
+    errors = [
+        tuple(str(value) for value in error) for error in _worker.errors
+    ]
+    del _worker.errors[:]
+
+    report = list(_worker.budget.report)
+    del _worker.budget.report[:]
+
+    return objects, keys, leaf_keys, errors, report
+
+
+class ParallelTraversal(BatchTraversal):
+    """
+    A `BatchTraversal` spreading the work of each level over a pool of worker
+    processes.
+
+    The frontier of each level is partitioned by model, then by ranges of
+    primary keys of `batch_size` objects; each partition is a task processed
+    by a worker using its own database connection. Workers only report the
+    keys of the objects they discovered. The coordinator owns the visited
+    index, deduplicates these keys and builds the next frontier, so every
+    object is processed exactly once.
+
+    Tasks are merged in the order they were created, the export doesn't
+    depend on which worker finished first.
+
+    Workers check the fan-out limits of the budget, leaving out the objects
+    of relations over their limit. The coordinator then applies its own
+    budget mode to the reported violations, aborting the export in `abort`
+    mode.
+
+    Objects of scanned models, which serial traversals process as soon as
+    they are read, are reported as keys too. Once all the tasks of a level
+    are done, the new ones are processed by a second round of tasks of the
+    same level.
+
+    `pool_class` builds the pool, given the number of workers, an
+    initializer and its arguments, the same way `multiprocessing.Pool` does.
+    Defaults to `multiprocessing.Pool`, in which case the connections of the
+    coordinator are closed before forking the workers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.workers = kwargs.pop('workers', multiprocessing.cpu_count())
+        self.pool_class = kwargs.pop('pool_class', None)
+        super(ParallelTraversal, self).__init__(*args, **kwargs)
+
+        self.errors = []
+        self.pool = None
+
+    def run(self, *args: Model) -> list:
+        pool_class = self.pool_class
+        if pool_class is None:
+            # Forked processes must not share the connections of this one
+            connections.close_all()
+            pool_class = multiprocessing.Pool
+
+        self.pool = pool_class(
+            self.workers,
+            init_worker,
+            (self.get_worker_options(*args), )
+        )
+        try:
+            return super(ParallelTraversal, self).run(*args)
+        finally:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def get_worker_options(self, *args: Model) -> Dict[str, Any]:
+        self.root_models = set(
+            get_model_name(instance) for instance in args
+        ).union(self.root_models)
+        self.build_graph(*args)
+
+        return {
+            'root_models': self.root_models,
+            'batch_size': self.batch_size,
+            'chunk_size': self.chunk_size,
+            'extract': self.extract,
+            'using': self.using,
+            'max_children': self.graph.policy.max_children,
+            'fanout': {
+                'max_fanout': self.budget.max_fanout,
+                'fanout': self.budget.fanout,
+            },
+            'pruned': {
+                model._meta.label: [accessor for accessor, _, _ in pruned]
+                for model, pruned in self.graph.pruned.items()
+            },
+        }
+
+    def get_tasks(
+            self,
+            frontier: Dict[type, Dict[PK, Any]]
+    ) -> List[Tuple[str, List[PK]]]:
+        tasks = []
+
+        for model in sorted(frontier, key=lambda m: m._meta.label):
+            pks = sorted(frontier[model])
+            for batch in chunks(pks, self.batch_size):
+                tasks.append((model._meta.label, batch))
+
+        return tasks
+
+    def process_level(
+            self,
+            frontier: Dict[type, Dict[PK, Any]],
+            objects: list
+    ) -> Dict[type, Dict[PK, Any]]:
+        next_frontier = {}
+        leaves = {}
+
+        if not self.run_tasks(frontier, objects, next_frontier, leaves):
+            return {}
+
+        # Leaves don't discover objects of scanned models
+        if leaves and not self.run_tasks(leaves, objects, next_frontier, {}):
+            return {}
+
+        return next_frontier
+
+    def run_tasks(
+            self,
+            frontier: Dict[type, Dict[PK, Any]],
+            objects: list,
+            next_frontier: Dict[type, Dict[PK, Any]],
+            leaves: Dict[type, Dict[PK, Any]]
+    ) -> bool:
+        """
+        Processes the objects of the given frontier using the pool, adding
+        the discovered objects to `next_frontier`, or to `leaves` for
+        objects of scanned models. Returns False once out of time.
+        """
+        results = self.pool.imap(run_task, self.get_tasks(frontier))
+        for items, keys, leaf_keys, errors, report in results:
+            for message in report:
+                # Raises in abort mode, like serial traversals do
+                self.budget.exceeded(message)
+
+            objects.extend(items)
+            self.errors.extend(errors)
+            self.enqueue(next_frontier, self.get_object_keys(keys))
+            self.enqueue(leaves, self.get_object_keys(leaf_keys))
+
+            if not self.budget.check_time():
+                return False
+
+        return True
+
+    @staticmethod
+    def get_object_keys(keys: List[LABEL_KEY]) -> Iterable[tuple]:
+        return ((apps.get_model(label), pk) for label, pk in keys)
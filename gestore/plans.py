@@ -0,0 +1,265 @@
+import copy
+from typing import Any, List, Tuple
+
+from django.contrib.contenttypes.fields import (
+    GenericForeignKey,
+    GenericRelation,
+)
+from django.db.models import ForeignKey, ManyToManyField, Model
+from django.db.models.fields import Field
+
+from gestore.processors import has_custom_processor
+from gestore.records import get_layout
+
+
+class FieldPlan(object):
+    """
+    Pre-classified fields of a model.
+
+    Deciding how a field should be exported means going through all the model
+    fields, and checking their types one by one. The result of this
+    classification only depends on the model, so we do it once per model and
+    reuse it for all of its objects instead of repeating it for each object.
+
+    Fields are classified in the same order `process_instance` used to check
+    them in:
+        - `foreign_keys`: Forward ForeignKeys and OneToOneFields.
+        - `parent_links`: OneToOneFields pointing at the parent model of a
+          multi-table inheritance child.
+        - `one_to_many`: Reverse relations of ForeignKeys in other models.
+        - `one_to_one`: Reverse relations of OneToOneFields in other models.
+        - `child_links`: Reverse relations of the `parent_links` of child
+          models.
+        - `many_to_many`: ManyToMany fields of this model, or pointing at it.
+        - `generic_foreign_keys`: GenericForeignKeys, their content type and
+          object ID columns are exported as values.
+        - `generic_relations`: GenericRelations, the objects pointing at this
+          one through a GenericForeignKey.
+        - `custom`: Relations handled by a processor registered on top of
+          the built-in ones, check `gestore.processors.BatchProcessor`.
+        - `values`: Concrete and private fields exported as they are.
+        - `skipped`: Fields we don't know how to export.
+        - `inherited`: Fields and relations of parent models. They are
+          exported with the parent objects, the way Django serializes
+          multi-table inheritance.
+
+    Relations are stored along with their accessor names; the attribute name
+    used to reach the related objects from an instance.
+
+    `label` is the `app_label.model_name` the objects are exported under,
+    the one of the concrete model for proxy models.
+
+    `columns` lists the database columns (attribute names) of the exported
+    fields, so objects can be exported from `values_list` rows directly.
+    Child models also list the columns of their parents; Django joins the
+    parent tables when fetching children, so parent objects are built from
+    the same rows, see `get_parent_row`.
+
+    Traversal policies can mark relations as `references`; their values are
+    exported but the objects they point at are not, and can cap the number
+    of objects discovered through a relation per object in `limits`.
+    Reverse ForeignKeys discovering objects of scanned models are listed in
+    `scans`, along with their `gestore.scans.RangeScan`.
+
+    `layout` is the `gestore.records.RecordLayout` shared by the exported
+    records of the model, naming the fields they can hold.
+
+    The content type ForeignKeys of GenericForeignKeys are always
+    references; content types exist in every database, and the
+    GenericForeignKey discovers the object the content type is only a part
+    of.
+    """
+
+    def __init__(self, model):
+        opts = model._meta  # pylint: disable=W0212
+        concrete_opts = opts.concrete_model._meta  # pylint: disable=W0212
+
+        self.model = model
+        self.label = '%s.%s' % (
+            concrete_opts.app_label,
+            concrete_opts.model_name,
+        )
+        self.pk_field = None
+        self.values = []
+        self.foreign_keys = []
+        self.parent_links = []
+        self.one_to_many = []
+        self.one_to_one = []
+        self.child_links = []
+        self.many_to_many = []
+        self.generic_foreign_keys = []
+        self.generic_relations = []
+        self.custom = []
+        self.skipped = []
+        self.inherited = []
+        self.references = set()
+        self.limits = {}
+        self.scans = {}
+
+        concrete_fields = set(opts.concrete_fields)
+        private_fields = set(opts.private_fields)
+        parents = set(opts.get_parent_list())
+
+        for field in opts.get_fields():
+            # Forward fields belong to the model defining them, and reverse
+            # relations to the model they point at.
+            if getattr(field, 'model', None) in parents:
+                self.inherited.append(field)
+            elif field.one_to_one and field.concrete \
+                    and field.remote_field.parent_link:
+                self.parent_links.append((field.name, field))
+                if field.primary_key:
+                    self.pk_field = field
+            elif field.one_to_one and not field.concrete \
+                    and getattr(field, 'parent_link', False):
+                self.child_links.append((self.get_accessor(field), field))
+            elif has_custom_processor(field):
+                self.custom.append((self.get_accessor(field), field))
+            elif isinstance(field, GenericForeignKey):
+                self.generic_foreign_keys.append((field.name, field))
+                self.references.add(opts.get_field(field.ct_field))
+            elif isinstance(field, GenericRelation):
+                self.generic_relations.append((field.name, field))
+            elif isinstance(field, ForeignKey):
+                self.foreign_keys.append((field.name, field))
+            elif field.one_to_many:
+                self.one_to_many.append((self.get_accessor(field), field))
+            elif field.one_to_one:
+                self.one_to_one.append((self.get_accessor(field), field))
+            elif field.many_to_many:
+                self.many_to_many.append((self.get_accessor(field), field))
+            elif field in concrete_fields or field in private_fields:
+                # Django stores the primary key under `id`
+                if field.name == 'id':
+                    self.pk_field = field
+                else:
+                    self.values.append((field.name, field))
+            else:
+                self.skipped.append(field)
+
+        # Database columns needed to export an object without instantiating
+        # it, starting with the primary key.
+        self.columns = [opts.pk.attname]
+        for _, field in self.values + self.foreign_keys + self.custom:
+            if field.concrete and field.attname not in self.columns:
+                self.columns.append(field.attname)
+
+        for _, field in self.parent_links:
+            for attname in get_field_plan(field.related_model).columns:
+                if attname not in self.columns:
+                    self.columns.append(attname)
+
+        self.column_index = {
+            attname: index for index, attname in enumerate(self.columns)
+        }
+        self.column_index['pk'] = 0
+
+        self.layout = get_layout(self.label, [
+            name
+            for name, field in (
+                self.values
+                + self.foreign_keys
+                + self.many_to_many
+                + self.custom
+            )
+            if not field.many_to_many or isinstance(field, ManyToManyField)
+        ])
+
+    def exclude(self, fields) -> 'FieldPlan':
+        """
+        Returns a copy of this plan without the given fields. Used when some
+        fields are processed in a different way by the caller.
+        """
+        fields = set(fields)
+        plan = copy.copy(self)
+
+        for group in (
+                'values',
+                'foreign_keys',
+                'parent_links',
+                'one_to_many',
+                'one_to_one',
+                'child_links',
+                'many_to_many',
+                'generic_foreign_keys',
+                'generic_relations',
+                'custom',
+        ):
+            setattr(plan, group, [
+                (name, field)
+                for name, field in getattr(self, group)
+                if field not in fields
+            ])
+
+        return plan
+
+    @staticmethod
+    def get_accessor(field) -> str:
+        """
+        Reverse relations are reachable through their accessor name, while
+        fields defined in the model use their own name.
+        """
+        if hasattr(field, 'get_accessor_name'):
+            return field.get_accessor_name()
+
+        return field.name
+
+    def get_row_value(self, row: tuple, attname: str) -> Any:
+        """
+        The `getattr` of rows fetched using the plan `columns`.
+        """
+        return row[self.column_index[attname]]
+
+    def get_parent_row(self, row: tuple, field: Field) -> tuple:
+        """
+        Returns the row of the parent object pointed at by the given parent
+        link, out of the row of a child object.
+        """
+        return tuple(
+            row[self.column_index[attname]]
+            for attname in get_field_plan(field.related_model).columns
+        )
+
+    @property
+    def relations(self) -> List[Tuple[str, Field]]:
+        return (
+            self.foreign_keys
+            + self.parent_links
+            + self.one_to_many
+            + self.one_to_one
+            + self.child_links
+            + self.many_to_many
+            + self.generic_foreign_keys
+            + self.generic_relations
+            + self.custom
+        )
+
+    @property
+    def accessors(self) -> List[str]:
+        return [accessor for accessor, _ in self.relations]
+
+
+_field_plans = {}
+
+
+def get_field_plan(model) -> FieldPlan:
+    """
+    Returns the field plan of the given model or instance, building it on
+    first use.
+    """
+    if isinstance(model, Model):
+        model = type(model)
+
+    plan = _field_plans.get(model)
+    if plan is None:
+        plan = _field_plans[model] = FieldPlan(model)
+
+    return plan
+
+
+def clear_field_plans() -> None:
+    """
+    Drops all cached plans. Only needed when models change at runtime, which
+    mostly happens in tests.
+    """
+    _field_plans.clear()
@@ -0,0 +1,170 @@
+import copy
+from typing import Any, Dict, Optional, Tuple, Union
+
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import (
+    ForeignKey,
+    ForeignObjectRel,
+    ManyToManyField,
+    ManyToOneRel,
+)
+from django.db.models.fields import Field
+
+from gestore.plans import FieldPlan
+from gestore.scans import RangeScan
+
+FOLLOW = 'follow'
+REFERENCE = 'reference'
+SKIP = 'skip'
+SCAN = 'scan'
+
+POLICIES = (FOLLOW, REFERENCE, SKIP, SCAN)
+
+RULE = Union[str, Dict[str, Any]]
+
+
+class TraversalPolicy(object):
+    """
+    Decides how each relation is traversed, out of the `GESTORE_TRAVERSAL`
+    setting:
+
+        GESTORE_TRAVERSAL = {
+            # Never inspected
+            'auth.User.logentry_set': 'skip',
+            # The ID is exported, the user is not
+            'demoapp.BookInstance.borrower': 'reference',
+            # At most 100 books per author, the first ones by primary key
+            'demoapp.Author.book_set': {'policy': 'follow', 'limit': 100},
+            # Any relation pointing at a model
+            'admin.LogEntry': 'skip',
+            # Append-only history, the last 90 days only
+            'demoapp.BookInstance': {
+                'policy': 'scan',
+                'order_by': 'due_back',
+                'since': timedelta(days=90),
+            },
+        }
+
+    Relations are named `app_label.Model.accessor_name`, the accessor name
+    being the field name of forward relations. Rules given for a model apply
+    to all relations pointing at that model, unless the relation has its own
+    rule.
+
+        - `follow`: The default, related objects are exported.
+        - `reference`: Values of ForeignKeys, GenericForeignKeys and
+          ManyToMany fields are exported, but the objects they point at are
+          never fetched. Reverse relations hold no values, so they are
+          skipped.
+        - `skip`: The relation is neither inspected nor exported.
+        - `scan`: Only given for models. Reverse ForeignKeys pointing at
+          other models discover the objects of this model using range
+          scans, within an optional time window, check
+          `gestore.scans.RangeScan`. The objects are leaves of the export;
+          the values of their relations are exported, but the related
+          objects are not followed.
+
+    `limit` caps the number of objects each object discovers through a
+    reverse ForeignKey relation. `max_children` is the limit of all reverse
+    ForeignKey relations without one.
+    """
+
+    def __init__(
+            self,
+            rules: Dict[str, RULE] = None,
+            max_children: int = None
+    ):
+        self.rules = {}
+        self.scans = {}
+        self.max_children = max_children
+
+        for label, rule in (rules or {}).items():
+            if not isinstance(rule, dict):
+                rule = {'policy': rule}
+
+            policy = rule.get('policy', FOLLOW)
+            if policy not in POLICIES:
+                raise ImproperlyConfigured(
+                    'Unknown traversal policy "%s" for %s' % (policy, label)
+                )
+
+            if policy == SCAN:
+                self.scans[label] = RangeScan.from_rule(label, rule)
+
+            self.rules[label] = (policy, rule.get('limit'))
+
+    @classmethod
+    def from_settings(cls, max_children: int = None) -> 'TraversalPolicy':
+        return cls(
+            getattr(settings, 'GESTORE_TRAVERSAL', None),
+            max_children=max_children
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.rules) or self.max_children is not None
+
+    def get_rule(
+            self,
+            model,
+            accessor: str,
+            field: Field
+    ) -> Tuple[str, Optional[int]]:
+        """
+        Returns the policy and the limit of a relation of the given model.
+        """
+        rule = self.rules.get('%s.%s' % (model._meta.label, accessor))
+        if rule is None and field.related_model is not None:
+            rule = self.rules.get(field.related_model._meta.label)
+
+        return rule or (FOLLOW, None)
+
+    def apply(self, plan: FieldPlan) -> FieldPlan:
+        """
+        Returns a copy of the given plan following the policy.
+        """
+        if not self:
+            return plan
+
+        skipped = []
+        references = set(plan.references)
+        limits = dict(plan.limits)
+        scans = dict(plan.scans)
+        leaf = plan.model._meta.label in self.scans
+
+        for accessor, field in plan.relations:
+            policy, limit = self.get_rule(plan.model, accessor, field)
+            if limit is None and field.one_to_many \
+                    and isinstance(field, ManyToOneRel):
+                limit = self.max_children
+
+            if leaf:
+                # Reverse relations, generic ones included
+                if isinstance(field, ForeignObjectRel) or field.one_to_many:
+                    skipped.append(field)
+                else:
+                    references.add(field)
+            elif policy == SKIP:
+                skipped.append(field)
+            elif policy == REFERENCE:
+                if isinstance(
+                        field,
+                        (ForeignKey, GenericForeignKey, ManyToManyField)
+                ):
+                    references.add(field)
+                else:
+                    skipped.append(field)
+            elif policy == SCAN and isinstance(field, ManyToOneRel) \
+                    and field.related_model._meta.label in self.scans:
+                scans[field] = self.scans[field.related_model._meta.label]
+                if limit is not None:
+                    limits[field] = limit
+            elif limit is not None and isinstance(field, ManyToOneRel):
+                limits[field] = limit
+
+        plan = plan.exclude(skipped) if skipped else copy.copy(plan)
+        plan.references = references
+        plan.limits = limits
+        plan.scans = scans
+
+        return plan
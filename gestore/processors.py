@@ -1,6 +1,23 @@
-from typing import Any, List, Optional, Tuple, Union
+from operator import attrgetter, itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+from django.contrib.contenttypes.fields import (
+    GenericForeignKey,
+    GenericRelation,
+)
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import DEFAULT_DB_ALIAS
 from django.db.models import (
     ForeignKey,
     ManyToManyField,
@@ -8,29 +25,86 @@ from django.db.models import (
     ManyToOneRel,
     Model,
     OneToOneField,
+    QuerySet,
 )
 
+from gestore.scans import RangeScan
+from gestore.typing import OBJECT_KEY, PK
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def iter_keyset(
+        queryset: QuerySet,
+        chunk_size: int,
+        get_pk: Callable = attrgetter('pk')
+) -> Iterator[list]:
+    """
+    Yields the objects of a queryset in chunks of `chunk_size` objects.
+
+    Chunks are fetched using keyset pagination on the primary key; every
+    chunk starts right after the last primary key of the previous one. Any
+    default ordering of the model is replaced by the primary key, so the
+    database never has to sort (or join for sorting) the whole set, and we
+    never hold more than one chunk of objects at a time.
+
+    Works on `values_list` querysets as well, given a `get_pk` function that
+    returns the primary key of a row.
+    """
+    if chunk_size < 1:
+        raise ValueError('Chunks hold at least one object')
+
+    queryset = queryset.order_by('pk')
+    chunk = list(queryset[:chunk_size])
+
+    while chunk:
+        yield chunk
+
+        if len(chunk) < chunk_size:
+            break
+
+        chunk = list(
+            queryset.filter(pk__gt=get_pk(chunk[-1]))[:chunk_size]
+        )
+
 
 def process_foreign_key(
         instance: Model,
         field: ForeignKey
-) -> Tuple[Any, Model]:
+) -> Tuple[Any, Optional[OBJECT_KEY]]:
     """
     What we are looking to achieve here is to get the ID of the object this
-    instance is pointing at, and to return that instance for later processing.
+    instance is pointing at, and to return that object's key for later
+    processing.
+
+    The key is built from the raw column value, so the object pointed at is
+    not fetched here. It will be fetched later only if it wasn't processed
+    before, which saves a query for every object pointing at an already
+    processed one.
 
     Note: This will process both; ForeignKeys and OneToOneKey. As in
     Django a OneToOneKey is sub class of ForeignKey.
     """
     # Gets the ID of the instance pointed at
     value = field.value_from_object(instance)
-    return value, getattr(instance, field.name)
+    if value is None:
+        return value, None
+
+    if field.target_field.primary_key:
+        return value, (field.related_model, value)
+
+    # The field points at a non primary key column, we have to fetch the
+    # object to know its primary key.
+    return value, (field.related_model, getattr(instance, field.name).pk)
 
 
 def process_one_to_many_relation(
         instance: Model,
-        field: ManyToOneRel
-) -> List[Model]:
+        field: ManyToOneRel,
+        chunk_size: int = None,
+        limit: int = None,
+        scan: RangeScan = None
+) -> Iterable[Model]:
     """
     In OneToManyRelations, it is this model that other objects are
     pointing at.
@@ -40,11 +114,183 @@ def process_one_to_many_relation(
 
     Unlike ForeignKey, we just need to return the instances pointing at
     this object so we can process it later.
+
+    If `chunk_size` is provided, the instances are streamed in chunks
+    ordered by primary key instead of being loaded all at once. This bounds
+    the size of each query result, not the memory of the caller collecting
+    the instances. If `limit` is provided, only the first `limit` instances
+    by primary key are returned.
+
+    Instances of scanned models are read with the `gestore.scans.RangeScan`
+    given as `scan` instead, in the order of the scan.
     """
     manager = getattr(instance, field.get_accessor_name())
-    to_process = [obj for obj in manager.all()] if manager else []
+    if not manager:
+        return []
+
+    if scan is not None:
+        queryset = scan.filter(manager.all(), field)
+        if limit is not None:
+            return list(queryset[:limit])
+
+        return (
+            obj
+            for chunk in scan.stream(
+                queryset,
+                chunk_size or DEFAULT_CHUNK_SIZE
+            )
+            for obj in chunk
+        )
+
+    if limit is not None:
+        return list(manager.order_by('pk')[:limit])
+
+    if chunk_size:
+        return (
+            obj
+            for chunk in iter_keyset(manager.all(), chunk_size)
+            for obj in chunk
+        )
+
+    return [obj for obj in manager.all()]
+
+
+def get_one_to_many_queryset(
+        instances: list,
+        field: ManyToOneRel,
+        get_value: Callable = getattr,
+        keys: Any = None,
+        using: str = DEFAULT_DB_ALIAS
+) -> QuerySet:
+    """
+    Returns a queryset of all objects pointing at any of the given instances
+    of the same model through a reverse relation.
+
+    `keys` can replace the primary keys of the instances in the query, with
+    a subquery selecting them for example. Like all batch processors, the
+    query runs on the `using` database.
+    """
+    target_field = field.field.target_field
+    if keys is not None and target_field.primary_key:
+        values = keys
+    else:
+        values = [get_value(obj, target_field.attname) for obj in instances]
+
+    return field.related_model._default_manager.using(using).filter(**{
+        '%s__in' % field.field.name: values,
+    })
+
+
+def stream_one_to_many_relation(
+        instances: list,
+        field: ManyToOneRel,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        get_value: Callable = getattr,
+        columns: List[str] = None,
+        keys: Any = None,
+        using: str = DEFAULT_DB_ALIAS
+) -> Iterator[list]:
+    """
+    The batch version of `process_one_to_many_relation`. Streams the objects
+    pointing at any of the given instances of the same model, in chunks
+    ordered by primary key.
+
+    Works for reverse OneToOne relations as well. If `columns` are provided,
+    rows of these columns are streamed instead of instances; the first
+    column must be the primary key.
+    """
+    queryset = get_one_to_many_queryset(
+        instances, field, get_value, keys=keys, using=using
+    )
+
+    if columns:
+        return iter_keyset(
+            queryset.values_list(*columns),
+            chunk_size,
+            get_pk=itemgetter(0)
+        )
+
+    return iter_keyset(queryset, chunk_size)
+
+
+def scan_one_to_many_relation(
+        instances: list,
+        field: ManyToOneRel,
+        scan: RangeScan,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        get_value: Callable = getattr,
+        columns: List[str] = None,
+        keys: Any = None,
+        using: str = DEFAULT_DB_ALIAS
+) -> Iterator[list]:
+    """
+    The range scan version of `stream_one_to_many_relation`. Streams the
+    objects of a scanned model pointing at any of the given instances, in
+    chunks read from a single query ordered along the scanned index.
+    """
+    queryset = scan.filter(
+        get_one_to_many_queryset(
+            instances, field, get_value, keys=keys, using=using
+        ),
+        field
+    )
+
+    if columns:
+        queryset = queryset.values_list(*columns)
 
-    return to_process
+    return scan.stream(queryset, chunk_size)
+
+
+def process_foreign_key_batch(
+        instances: list,
+        field: ForeignKey,
+        get_value: Callable = getattr,
+        using: str = DEFAULT_DB_ALIAS
+) -> List[OBJECT_KEY]:
+    """
+    The batch version of `process_foreign_key`. Returns the keys of the
+    objects the given instances are pointing at.
+    """
+    values = {get_value(obj, field.attname) for obj in instances}
+    values.discard(None)
+    related_model = field.related_model
+
+    if field.target_field.primary_key:
+        return [(related_model, value) for value in values]
+
+    # Pointing at a non primary key column, a single query gets all the
+    # primary keys we need.
+    return [
+        (related_model, pk)
+        for pk in related_model._default_manager.using(using).filter(**{
+            '%s__in' % field.target_field.name: values,
+        }).values_list('pk', flat=True)
+    ]
+
+
+def process_parent_link(instance: Model, field: OneToOneField) -> Model:
+    """
+    Returns the parent object of a multi-table inheritance child.
+
+    Django joins the parent tables when fetching a child, so the parent is
+    built from the columns the child was loaded with instead of being
+    fetched again. The parent's link back to the child is cached as well, so
+    processing the parent doesn't query the child either.
+    """
+    parent_model = field.related_model
+    attnames = [
+        parent_field.attname
+        for parent_field in parent_model._meta.concrete_fields
+    ]
+
+    parent = parent_model.from_db(
+        instance._state.db,
+        attnames,
+        [getattr(instance, attname) for attname in attnames]
+    )
+    field.remote_field.set_cached_value(parent, instance)
+
+    return parent
 
 
 def process_one_to_one_relation(
@@ -65,25 +311,513 @@ def process_one_to_one_relation(
     return [obj, ]
 
 
-def process_many_to_many_relation(
+def process_many_to_many_batch(
+        instances: list,
+        field: Union[ManyToManyRel, ManyToManyField],
+        get_value: Callable = getattr,
+        keys: Any = None,
+        using: str = DEFAULT_DB_ALIAS
+) -> Tuple[Dict[PK, List[PK]], List[OBJECT_KEY]]:
+    """
+    Processes a ManyToMany relation of instances of the same model, from
+    either end.
+
+    Instead of loading the related objects, we only read the
+    `(source_id, target_id)` pairs from the through table of the relation,
+    using a single query for all the given instances of the same model.
+
+    Returns a dictionary of the related IDs of each instance (keyed by the
+    instance's primary key), and the keys of the related objects so they can
+    be loaded later only if needed.
+
+    `keys` can replace the primary keys of the instances in the query, the
+    same way it does in `get_one_to_many_queryset`.
+    """
+    if isinstance(field, ManyToManyRel):
+        # This is a ManyToMany Field in another model, so we are reading the
+        # through table from its other end.
+        m2m_field = field.field
+        source_name = m2m_field.m2m_reverse_field_name()
+        target_name = m2m_field.m2m_field_name()
+    else:
+        m2m_field = field
+        source_name = m2m_field.m2m_field_name()
+        target_name = m2m_field.m2m_reverse_field_name()
+
+    through = m2m_field.remote_field.through
+    source_field = through._meta.get_field(source_name)
+    target_field = through._meta.get_field(target_name)
+
+    # Maps the value the through table points at to the instance's pk
+    sources = {
+        get_value(obj, source_field.target_field.attname): get_value(obj, 'pk')
+        for obj in instances
+    }
+    if keys is None or not source_field.target_field.primary_key:
+        keys = list(sources)
+
+    pairs = through._default_manager.using(using).filter(**{
+        '%s__in' % source_field.attname: keys,
+    }).order_by('pk').values_list(
+        source_field.attname,
+        target_field.attname
+    )
+
+    data = {pk: [] for pk in sources.values()}
+    targets = set()
+    for source_id, target_id in pairs:
+        data[sources[source_id]].append(target_id)
+        targets.add(target_id)
+
+    related_model = target_field.related_model
+    if target_field.target_field.primary_key:
+        related_keys = [(related_model, target_id) for target_id in targets]
+    else:
+        # The through table doesn't point at the primary key, no way around
+        # loading these objects to find their keys.
+        related_keys = [
+            (related_model, obj.pk)
+            for obj in related_model._default_manager.using(using).filter(**{
+                '%s__in' % target_field.target_field.name: targets,
+            })
+        ]
+
+    return data, related_keys
+
+
+def get_content_type_model(
+        content_type_id: int,
+        using: str = DEFAULT_DB_ALIAS
+) -> Optional[type]:
+    """
+    Returns the model of a content type. Content types are cached by Django,
+    so each of them is fetched at most once.
+    """
+    try:
+        content_type = ContentType.objects.db_manager(using).get_for_id(
+            content_type_id
+        )
+    except ContentType.DoesNotExist:
+        return None
+
+    return content_type.model_class()
+
+
+def process_generic_foreign_key(
         instance: Model,
-        field: Union[ManyToManyRel, ManyToManyField]
-) -> Tuple[Any, List[Model]]:
+        field: GenericForeignKey
+) -> Optional[OBJECT_KEY]:
     """
-    Extracts all objects this instance is pointing at for later processing.
-    Also returns a list of these objects IDs to be used as a value under
-    the field name.
+    The GenericForeignKey version of `process_foreign_key`. The content type
+    and object ID columns are exported as values already, we only need the
+    key of the object they point at. The object itself is not fetched here.
     """
-    data = []
-    to_process = []
+    keys = process_generic_foreign_key_batch(
+        [instance],
+        field,
+        using=instance._state.db or DEFAULT_DB_ALIAS
+    )
 
-    if isinstance(field, ManyToManyRel):
-        # This is a ManyToMany Field in another model
-        manager = getattr(instance, field.get_accessor_name())
-        return None, [x for x in manager.all()]
+    return keys[0] if keys else None
+
+
+def process_generic_foreign_key_batch(
+        instances: list,
+        field: GenericForeignKey,
+        get_value: Callable = getattr,
+        using: str = DEFAULT_DB_ALIAS
+) -> List[OBJECT_KEY]:
+    """
+    The batch version of `process_generic_foreign_key`.
+
+    The `(content_type_id, object_id)` pairs of the given instances are
+    grouped by content type, so each group is made of keys of the same
+    model. They are loaded later with the other keys of that model, using a
+    single `in_bulk` query.
+    """
+    opts = field.model._meta
+    ct_attname = opts.get_field(field.ct_field).attname
+    fk_attname = opts.get_field(field.fk_field).attname
+
+    object_ids = {}
+    for obj in instances:
+        content_type_id = get_value(obj, ct_attname)
+        object_id = get_value(obj, fk_attname)
+        if content_type_id is not None and object_id is not None:
+            object_ids.setdefault(content_type_id, set()).add(object_id)
+
+    keys = []
+    for content_type_id, ids in object_ids.items():
+        related_model = get_content_type_model(content_type_id, using)
+        if related_model is None:
+            # A stale content type, its model was removed
+            continue
+
+        # Object IDs are often stored in a text column, keys must use the
+        # type of the primary key to match the keys discovered elsewhere.
+        pk_field = related_model._meta.pk
+        keys.extend(
+            (related_model, pk_field.to_python(object_id))
+            for object_id in ids
+        )
+
+    return keys
+
+
+def process_generic_relation(
+        instance: Model,
+        field: GenericRelation,
+        chunk_size: int = None
+) -> Iterable[Model]:
+    """
+    The GenericRelation version of `process_one_to_many_relation`, returns
+    the objects pointing at this instance through a GenericForeignKey.
+    """
+    queryset = getattr(instance, field.name).all()
+
+    if chunk_size:
+        return (
+            obj
+            for chunk in iter_keyset(queryset, chunk_size)
+            for obj in chunk
+        )
+
+    return list(queryset)
+
+
+def get_generic_relation_queryset(
+        instances: list,
+        field: GenericRelation,
+        get_value: Callable = getattr,
+        using: str = DEFAULT_DB_ALIAS
+) -> QuerySet:
+    """
+    Returns a queryset of all objects pointing at any of the given instances
+    of the same model through a GenericRelation.
+    """
+    content_type = ContentType.objects.db_manager(using).get_for_model(
+        field.model,
+        for_concrete_model=field.for_concrete_model
+    )
+
+    return field.related_model._default_manager.using(using).filter(**{
+        field.content_type_field_name: content_type,
+        '%s__in' % field.object_id_field_name: [
+            get_value(obj, 'pk') for obj in instances
+        ],
+    })
+
+
+def stream_generic_relation(
+        instances: list,
+        field: GenericRelation,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        get_value: Callable = getattr,
+        columns: List[str] = None,
+        using: str = DEFAULT_DB_ALIAS
+) -> Iterator[list]:
+    """
+    The batch version of `process_generic_relation`, streams the objects
+    the same way `stream_one_to_many_relation` does.
+
+    Object IDs don't always share the type of the primary keys, so they are
+    matched against lists of keys, `chunk_size` instances at a time.
+    """
+    for start in range(0, len(instances), chunk_size):
+        queryset = get_generic_relation_queryset(
+            instances[start:start + chunk_size],
+            field,
+            get_value=get_value,
+            using=using
+        )
+
+        if columns:
+            yield from iter_keyset(
+                queryset.values_list(*columns),
+                chunk_size,
+                get_pk=itemgetter(0)
+            )
+        else:
+            yield from iter_keyset(queryset, chunk_size)
+
+
+class BatchProcessor(object):
+    """
+    Processes a relation for a batch of objects of the same model.
+
+    Processors declare the field classes they handle in `field_classes`,
+    and are registered with `register_processor`. Fields handled by a
+    processor registered on top of the built-in ones are processed by it,
+    a batch at a time, by all traversals:
+
+        class TagsProcessor(BatchProcessor):
+            field_classes = (TaggableManager,)
+
+            def process_batch(self, model, pks, field, **kwargs):
+                ...
+                return tags, keys
+
+        register_processor(TagsProcessor())
+
+    Processors are registered before exporting, in `AppConfig.ready` for
+    example, since field plans are built once per model.
+    """
+    field_classes = ()
+
+    def process_batch(
+            self,
+            model,
+            pks: List[PK],
+            field: Any,
+            objects: list = None,
+            get_value: Callable = getattr,
+            keys: Any = None,
+            using: str = DEFAULT_DB_ALIAS
+    ) -> Tuple[Optional[Dict[PK, Any]], List[OBJECT_KEY]]:
+        """
+        Returns the exported value of the field for each of the given
+        primary keys, or None if the field holds no value, along with the
+        keys of the objects discovered through the field.
+
+        Callers holding the instances (or rows read using `get_value`) of
+        the primary keys hand them over as `objects`, and `keys` may be a
+        subquery selecting the primary keys, both save queries.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def get_objects(
+            model,
+            pks: List[PK],
+            objects: list = None,
+            get_value: Callable = getattr,
+            using: str = DEFAULT_DB_ALIAS
+    ) -> Tuple[list, Callable]:
+        """
+        Returns the given objects, or the rows of the concrete columns of
+        the given primary keys read using a single query, along with the
+        function reading their values.
+        """
+        if objects is not None:
+            return objects, get_value
+
+        columns = ['pk'] + [
+            field.attname for field in model._meta.concrete_fields
+        ]
+        index = {attname: i for i, attname in enumerate(columns)}
+        rows = list(
+            model._default_manager.using(using).filter(
+                pk__in=pks
+            ).order_by().values_list(*columns)
+        )
+
+        return rows, lambda row, attname: row[index[attname]]
+
+
+class ForeignKeyProcessor(BatchProcessor):
+    field_classes = (ForeignKey,)
+
+    def process_batch(
+            self,
+            model,
+            pks: List[PK],
+            field: Any,
+            objects: list = None,
+            get_value: Callable = getattr,
+            keys: Any = None,
+            using: str = DEFAULT_DB_ALIAS
+    ) -> Tuple[Optional[Dict[PK, Any]], List[OBJECT_KEY]]:
+        objects, get_value = self.get_objects(
+            model, pks, objects, get_value, using
+        )
+
+        values = {
+            get_value(obj, 'pk'): get_value(obj, field.attname)
+            for obj in objects
+        }
+        return values, process_foreign_key_batch(
+            objects, field, get_value=get_value, using=using
+        )
+
+
+class ManyToManyProcessor(BatchProcessor):
+    field_classes = (ManyToManyField, ManyToManyRel)
+
+    def process_batch(
+            self,
+            model,
+            pks: List[PK],
+            field: Any,
+            objects: list = None,
+            get_value: Callable = getattr,
+            keys: Any = None,
+            using: str = DEFAULT_DB_ALIAS
+    ) -> Tuple[Optional[Dict[PK, Any]], List[OBJECT_KEY]]:
+        objects, get_value = self.get_objects(
+            model, pks, objects, get_value, using
+        )
+
+        values, related_keys = process_many_to_many_batch(
+            objects, field, get_value=get_value, keys=keys, using=using
+        )
+        if isinstance(field, ManyToManyRel):
+            # Held by the other end of the relation
+            values = None
+
+        return values, related_keys
+
+
+class OneToManyProcessor(BatchProcessor):
+    """
+    Reverse ForeignKey and OneToOne relations. Traversals stream these in
+    chunks instead, bounding the size of each query result.
+    """
+    field_classes = (ManyToOneRel,)
+
+    def process_batch(
+            self,
+            model,
+            pks: List[PK],
+            field: Any,
+            objects: list = None,
+            get_value: Callable = getattr,
+            keys: Any = None,
+            using: str = DEFAULT_DB_ALIAS
+    ) -> Tuple[Optional[Dict[PK, Any]], List[OBJECT_KEY]]:
+        objects, get_value = self.get_objects(
+            model, pks, objects, get_value, using
+        )
+
+        queryset = get_one_to_many_queryset(
+            objects, field, get_value=get_value, keys=keys, using=using
+        )
+        return None, [
+            (field.related_model, pk)
+            for pk in queryset.values_list('pk', flat=True)
+        ]
+
+
+class GenericForeignKeyProcessor(BatchProcessor):
+    """
+    Content type and object ID columns are exported as values already.
+    """
+    field_classes = (GenericForeignKey,)
+
+    def process_batch(
+            self,
+            model,
+            pks: List[PK],
+            field: Any,
+            objects: list = None,
+            get_value: Callable = getattr,
+            keys: Any = None,
+            using: str = DEFAULT_DB_ALIAS
+    ) -> Tuple[Optional[Dict[PK, Any]], List[OBJECT_KEY]]:
+        objects, get_value = self.get_objects(
+            model, pks, objects, get_value, using
+        )
+
+        return None, process_generic_foreign_key_batch(
+            objects, field, get_value=get_value, using=using
+        )
+
+
+class GenericRelationProcessor(BatchProcessor):
+    """
+    Like `stream_generic_relation`, objects are matched against lists of
+    keys, `DEFAULT_CHUNK_SIZE` objects at a time.
+    """
+    field_classes = (GenericRelation,)
+
+    def process_batch(
+            self,
+            model,
+            pks: List[PK],
+            field: Any,
+            objects: list = None,
+            get_value: Callable = getattr,
+            keys: Any = None,
+            using: str = DEFAULT_DB_ALIAS
+    ) -> Tuple[Optional[Dict[PK, Any]], List[OBJECT_KEY]]:
+        objects, get_value = self.get_objects(
+            model, pks, objects, get_value, using
+        )
+
+        related_keys = []
+        for start in range(0, len(objects), DEFAULT_CHUNK_SIZE):
+            queryset = get_generic_relation_queryset(
+                objects[start:start + DEFAULT_CHUNK_SIZE],
+                field,
+                get_value=get_value,
+                using=using
+            )
+            related_keys.extend(
+                (field.related_model, pk)
+                for pk in queryset.values_list('pk', flat=True)
+            )
+
+        return None, related_keys
+
+
+BUILTIN_PROCESSORS = (
+    ForeignKeyProcessor(),
+    ManyToManyProcessor(),
+    OneToManyProcessor(),
+    GenericForeignKeyProcessor(),
+    GenericRelationProcessor(),
+)
+
+_processors = {}
+
+
+def register_processor(processor: BatchProcessor) -> BatchProcessor:
+    """
+    Registers a processor for its field classes, replacing any processor
+    registered for the same classes before.
+    """
+    for field_class in processor.field_classes:
+        _processors[field_class] = processor
+
+    return processor
+
+
+def unregister_processor(processor: BatchProcessor) -> None:
+    """
+    Removes a processor, the built-in processors of its field classes are
+    used again.
+    """
+    for field_class in processor.field_classes:
+        if _processors.get(field_class) is processor:
+            del _processors[field_class]
+
+    for builtin in BUILTIN_PROCESSORS:
+        for field_class in builtin.field_classes:
+            _processors.setdefault(field_class, builtin)
+
+
+def get_processor(field: Any) -> Optional[BatchProcessor]:
+    """
+    Returns the processor of a field, the one registered for the closest
+    class of the field.
+    """
+    for field_class in type(field).__mro__:
+        processor = _processors.get(field_class)
+        if processor is not None:
+            return processor
+
+    return None
+
+
+def has_custom_processor(field: Any) -> bool:
+    """
+    Whether the field is processed by a processor registered on top of the
+    built-in ones.
+    """
+    processor = get_processor(field)
+    return processor is not None and not any(
+        processor is builtin for builtin in BUILTIN_PROCESSORS
+    )
 
-    for relation in field.value_from_object(instance):
-        data.append(relation.id)
-        to_process.append(relation)
 
-    return data, to_process
+for _builtin in BUILTIN_PROCESSORS:
+    register_processor(_builtin)
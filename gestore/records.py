@@ -0,0 +1,196 @@
+import sys
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Tuple
+
+
+class Missing(object):
+    """
+    The value of fields that were not exported. Unpickled as the same
+    object, so records coming back from worker processes keep their unset
+    fields unset.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        return 'MISSING'
+
+    def __repr__(self) -> str:
+        return 'MISSING'
+
+
+MISSING = Missing()
+
+
+class RecordLayout(object):
+    """
+    The model label and the field names shared by all the records of a
+    model. Labels and names are interned, so they are stored once however
+    many records there are.
+    """
+    __slots__ = ('label', 'names', 'index')
+
+    def __init__(self, label: str, names: Tuple[str, ...]):
+        self.label = sys.intern(label)
+        self.names = tuple(sys.intern(name) for name in names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def __reduce__(self):
+        # Unpickled records share the layouts of this process
+        return get_layout, (self.label, self.names)
+
+
+class ExportRecord(object):
+    """
+    The export data of an object, holding only its primary key and the
+    values of its fields, in the order of the field names of its layout.
+
+    Records read like the dictionaries Django serializes objects to, which
+    is what they turn into once written:
+
+        record = ExportRecord(get_layout('demoapp.book', ('title',)))
+        record['pk'] = 1
+        record['fields']['title'] = 'Dune'
+        record.to_dict()
+        # {'model': 'demoapp.book', 'pk': 1, 'fields': {'title': 'Dune'}}
+
+    A dictionary per record repeats the keys of every field and costs a hash
+    table per object, most of the memory of large exports.
+    """
+    __slots__ = ('layout', 'pk', 'values')
+
+    def __init__(self, layout: RecordLayout, pk: Any = MISSING):
+        self.layout = layout
+        self.pk = pk
+        self.values = [MISSING] * len(layout.names)
+
+    @classmethod
+    def from_values(
+            cls,
+            layout: RecordLayout,
+            values: list,
+            pk: Any = MISSING
+    ) -> 'ExportRecord':
+        """
+        Returns a record of values given for all the fields of the layout.
+        """
+        record = cls.__new__(cls)
+        record.layout = layout
+        record.pk = pk
+        record.values = values
+        return record
+
+    @property
+    def model(self) -> str:
+        return self.layout.label
+
+    @property
+    def fields(self) -> 'RecordFields':
+        return RecordFields(self)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'model':
+            return self.model
+
+        if key == 'fields':
+            return self.fields
+
+        if key == 'pk' and self.pk is not MISSING:
+            return self.pk
+
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key != 'pk':
+            raise KeyError(key)
+
+        self.pk = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in ('model', 'fields') \
+            or (key == 'pk' and self.pk is not MISSING)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def set_field(self, name: str, value: Any) -> None:
+        index = self.layout.index.get(name)
+        if index is None:
+            # Not a field of the model, the record gets a layout of its own
+            self.layout = get_layout(
+                self.layout.label,
+                self.layout.names + (name,)
+            )
+            self.values.append(value)
+        else:
+            self.values[index] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {'model': self.model, 'fields': dict(self.fields)}
+        if self.pk is not MISSING:
+            data['pk'] = self.pk
+
+        return data
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ExportRecord):
+            other = other.to_dict()
+
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return '<ExportRecord %r>' % self.to_dict()
+
+
+class RecordFields(MutableMapping):
+    """
+    The fields of a record, as a dictionary. Fields that were never set are
+    not part of it.
+    """
+    __slots__ = ('record',)
+
+    def __init__(self, record: ExportRecord):
+        self.record = record
+
+    def __getitem__(self, name: str) -> Any:
+        index = self.record.layout.index.get(name)
+        if index is None or self.record.values[index] is MISSING:
+            raise KeyError(name)
+
+        return self.record.values[index]
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self.record.set_field(name, value)
+
+    def __delitem__(self, name: str) -> None:
+        # Raises KeyError if missing
+        self[name]
+        self.record.values[self.record.layout.index[name]] = MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        for name, value in zip(self.record.layout.names, self.record.values):
+            if value is not MISSING:
+                yield name
+
+    def __len__(self) -> int:
+        return sum(1 for value in self.record.values if value is not MISSING)
+
+
+_layouts = {}
+
+
+def get_layout(label: str, names: Tuple[str, ...]) -> RecordLayout:
+    """
+    Returns the layout of the given model label and field names, the same
+    one for all callers.
+    """
+    key = (label, tuple(names))
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = _layouts[key] = RecordLayout(label, names)
+
+    return layout
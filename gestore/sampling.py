@@ -0,0 +1,224 @@
+import math
+import random
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, QuerySet
+
+from gestore.typing import PK
+
+SAMPLE_RANDOM = 'random'
+SAMPLE_STRATIFIED = 'stratified'
+SAMPLE_STRIDE = 'stride'
+
+SAMPLE_METHODS = (SAMPLE_RANDOM, SAMPLE_STRATIFIED, SAMPLE_STRIDE)
+
+# Sampled objects closer than this in primary key order are read with a
+# single query, along with the objects between them.
+KEYSET_WINDOW = 1000
+
+
+class Sample(object):
+    """
+    Picks a subset of the objects of a queryset, to be exported as root
+    objects of a single export:
+
+        sample = Sample(Book.objects.all(), percent=5)
+        command.generate_objects(sample.get_queryset())
+
+    The sample holds either `size` objects, or `percent` percent of the
+    objects, picked by one of these methods:
+        - `random`: Objects picked at random, using `seed` if given.
+        - `stratified`: Objects picked at random within each group of
+          objects sharing the same `stratify_by` value, the size of each
+          group in the sample being proportional to its size in the
+          queryset.
+        - `stride`: Objects evenly spread along their primary keys.
+
+    The sample is picked by position in primary key order, out of COUNT
+    queries, and only the sampled primary keys are read, walking the
+    primary key index from one sampled object to the next. Check
+    `get_keys_at` for more info.
+    """
+
+    def __init__(
+            self,
+            queryset: QuerySet,
+            size: int = None,
+            percent: float = None,
+            method: str = SAMPLE_RANDOM,
+            stratify_by: str = None,
+            seed: Any = None
+    ):
+        if (size is None) == (percent is None):
+            raise ValueError('Samples have either a size or a percentage')
+
+        if method not in SAMPLE_METHODS:
+            raise ValueError('Unknown sampling method "%s"' % method)
+
+        if method == SAMPLE_STRATIFIED:
+            if stratify_by is None:
+                raise ValueError('Stratified samples need a field')
+
+            # Raises FieldDoesNotExist early
+            queryset.model._meta.get_field(stratify_by)
+
+        self.queryset = queryset
+        self.size = size
+        self.percent = percent
+        self.method = method
+        self.stratify_by = stratify_by
+        self.random = random.Random(seed)
+
+    @classmethod
+    def from_str(
+            cls,
+            sample_rep: str,
+            using: str = DEFAULT_DB_ALIAS,
+            **kwargs
+    ) -> 'Sample':
+        """
+        Returns the sample of a representation formatted as
+        `app_label.model_name:size`, the size being a number of objects or a
+        percentage, e.g. `demoapp.Book:100` or `demoapp.Book:5%`.
+        """
+        model_rep, separator, size_rep = sample_rep.partition(':')
+        if not separator:
+            raise ValueError('The sample size is missing')
+
+        app_label, model_name = model_rep.split('.')
+        Model = apps.get_model(app_label, model_name)
+        queryset = Model._default_manager.using(using).all()
+
+        if size_rep.endswith('%'):
+            percent = float(size_rep[:-1])
+            if not 0 < percent <= 100:
+                raise ValueError('Bad percentage "%s"' % size_rep)
+
+            return cls(queryset, percent=percent, **kwargs)
+
+        size = int(size_rep)
+        if size < 1:
+            raise ValueError('Bad size "%s"' % size_rep)
+
+        return cls(queryset, size=size, **kwargs)
+
+    def get_size(self, total: int) -> int:
+        if self.size is not None:
+            return min(self.size, total)
+
+        return min(int(math.ceil(total * self.percent / 100)), total)
+
+    def get_keys(self) -> List[PK]:
+        """
+        Returns the primary keys of the sampled objects, in primary key
+        order.
+        """
+        queryset = self.queryset.order_by('pk')
+
+        if self.method == SAMPLE_STRATIFIED:
+            strata = OrderedDict(
+                (group[self.stratify_by], group['count'])
+                for group in queryset.order_by(self.stratify_by).values(
+                    self.stratify_by
+                ).annotate(count=Count('pk'))
+            )
+
+            keys = []
+            sizes = self.allocate(
+                strata,
+                self.get_size(sum(strata.values()))
+            )
+            for value, count in strata.items():
+                keys.extend(self.get_keys_at(
+                    queryset.filter(**{self.stratify_by: value}),
+                    sorted(self.random.sample(range(count), sizes[value]))
+                ))
+
+            return sorted(keys)
+
+        total = queryset.count()
+        size = self.get_size(total)
+
+        if self.method == SAMPLE_STRIDE:
+            step = total / size if size else 0
+            positions = [int(index * step) for index in range(size)]
+        else:
+            positions = sorted(self.random.sample(range(total), size))
+
+        return self.get_keys_at(queryset, positions)
+
+    @staticmethod
+    def get_keys_at(queryset: QuerySet, positions: List[int]) -> List[PK]:
+        """
+        Returns the primary keys of the objects at the given sorted
+        positions of a queryset ordered by primary key.
+
+        Each query starts after the last primary key read, and skips the
+        objects before the next position with an OFFSET, so the database
+        walks the primary key index without sending the skipped keys.
+        Positions closer than `KEYSET_WINDOW` to the first one of a query
+        are read by the same query. Objects deleted meanwhile shift the
+        positions, and those past the end are left out.
+        """
+        keys = []
+        last_pk = None
+        last_position = -1
+        index = 0
+        while index < len(positions):
+            first = positions[index]
+            end = index + 1
+            while end < len(positions) \
+                    and positions[end] - first < KEYSET_WINDOW:
+                end += 1
+
+            page = queryset
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+
+            offset = first - last_position - 1
+            pks = list(page.values_list('pk', flat=True)[
+                offset:offset + positions[end - 1] - first + 1
+            ])
+            if not pks:
+                break
+
+            keys.extend(
+                pks[position - first]
+                for position in positions[index:end]
+                if position - first < len(pks)
+            )
+            last_pk = pks[-1]
+            last_position = positions[end - 1]
+            index = end
+
+        return keys
+
+    @staticmethod
+    def allocate(counts: Dict[Any, int], size: int) -> Dict[Any, int]:
+        """
+        Splits `size` objects between groups of the given sizes,
+        proportionally. Objects left over by rounding down go to the groups
+        with the largest remainders.
+        """
+        total = sum(counts.values())
+        shares = {
+            value: size * count / total if total else 0
+            for value, count in counts.items()
+        }
+        sizes = {value: int(share) for value, share in shares.items()}
+
+        left = size - sum(sizes.values())
+        for value in sorted(
+                counts,
+                key=lambda value: shares[value] - sizes[value],
+                reverse=True
+        )[:left]:
+            sizes[value] += 1
+
+        return sizes
+
+    def get_queryset(self) -> QuerySet:
+        return self.queryset.filter(pk__in=self.get_keys())
@@ -0,0 +1,130 @@
+import datetime
+from itertools import islice
+from typing import Any, Dict, Iterator, Union
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import DateTimeField, ManyToOneRel, QuerySet
+from django.utils import timezone
+
+BOUND = Union[str, datetime.date, datetime.timedelta]
+
+
+class RangeScan(object):
+    """
+    Exports the objects of an append-only model, a history or an event log
+    for example, using range scans instead of following them one object at
+    a time.
+
+    Objects pointing at a batch of objects through a ForeignKey are read
+    with a single query, ordered by the ForeignKey column then `order_by`,
+    and streamed in chunks from a server-side cursor (on backends supporting
+    them). An index on these columns turns the query into sequential range
+    scans, one per object of the batch.
+
+    `since` and `until` restrict the scanned objects to a time window on
+    the `order_by` field; `since` is included and `until` is not. Bounds
+    are either values of the field, or `timedelta`s going back from now:
+
+        RangeScan(BookInstance, order_by='due_back', since=timedelta(30))
+
+    Objects of scanned models are leaves of the export, see
+    `gestore.policies.TraversalPolicy`.
+    """
+
+    def __init__(
+            self,
+            model,
+            order_by: str = None,
+            since: BOUND = None,
+            until: BOUND = None
+    ):
+        self.model = model
+        self.order_by = order_by
+        self.field = None
+
+        if order_by is not None:
+            self.field = model._meta.get_field(order_by)
+        elif since is not None or until is not None:
+            raise ValueError(
+                'Time windows of %s need an `order_by` field'
+                % model._meta.label
+            )
+
+        self.since = self.parse_bound(since)
+        self.until = self.parse_bound(until)
+
+    @classmethod
+    def from_rule(cls, label: str, rule: Dict[str, Any]) -> 'RangeScan':
+        """
+        Builds the scan of a `scan` traversal rule, rules are given for
+        models only.
+        """
+        try:
+            model = apps.get_model(label)
+        except (LookupError, ValueError):
+            raise ImproperlyConfigured(
+                'Range scans are set for models, "%s" is not a model' % label
+            )
+
+        try:
+            return cls(
+                model,
+                order_by=rule.get('order_by'),
+                since=rule.get('since'),
+                until=rule.get('until'),
+            )
+        except (FieldDoesNotExist, ValueError) as e:
+            raise ImproperlyConfigured(
+                'Invalid range scan for %s: %s' % (label, e)
+            )
+
+    def parse_bound(self, bound: BOUND) -> Any:
+        if bound is None or isinstance(bound, datetime.timedelta):
+            return bound
+
+        return self.field.to_python(bound)
+
+    def get_bound(self, bound: Any) -> Any:
+        if not isinstance(bound, datetime.timedelta):
+            return bound
+
+        value = timezone.now() - bound
+        if isinstance(self.field, DateTimeField):
+            return value
+
+        return value.date()
+
+    def filter(self, queryset: QuerySet, field: ManyToOneRel) -> QuerySet:
+        """
+        Restricts the given queryset of objects discovered through `field`
+        to the time window, and orders it along the scanned index.
+        """
+        if self.since is not None:
+            queryset = queryset.filter(**{
+                '%s__gte' % self.order_by: self.get_bound(self.since),
+            })
+
+        if self.until is not None:
+            queryset = queryset.filter(**{
+                '%s__lt' % self.order_by: self.get_bound(self.until),
+            })
+
+        ordering = [field.field.attname]
+        if self.order_by is not None:
+            ordering.append(self.order_by)
+
+        return queryset.order_by(*ordering, 'pk')
+
+    @staticmethod
+    def stream(queryset: QuerySet, chunk_size: int) -> Iterator[list]:
+        """
+        Yields the objects (or rows) of a queryset in chunks of `chunk_size`
+        objects, read from a single query.
+        """
+        iterator = queryset.iterator(chunk_size=chunk_size)
+
+        chunk = list(islice(iterator, chunk_size))
+        while chunk:
+            yield chunk
+            chunk = list(islice(iterator, chunk_size))
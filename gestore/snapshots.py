@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# Statements making the current transaction read from a single snapshot, per
+# backend. SQLite transactions already do, from their first read on.
+SNAPSHOT_STATEMENTS = {
+    'postgresql': 'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ',
+    'mysql': 'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ',
+    'oracle': 'SET TRANSACTION READ ONLY',
+    'sqlite': None,
+}
+
+
+class UnsupportedSnapshot(Exception):
+    pass
+
+
+@contextmanager
+def snapshot(using: str = DEFAULT_DB_ALIAS) -> Iterator[None]:
+    """
+    Runs the enclosed queries on the `using` database inside a single
+    transaction reading from one snapshot of the database:
+
+        with snapshot('replica'):
+            objects = command.generate_objects(*args)
+
+    All queries see the data as it was when the first one ran, so objects
+    written while the export is running never show up half way through.
+    Nothing is written, the transaction is rolled back on exit.
+
+    The isolation level can only be set before any query of a transaction,
+    so the snapshot can't be taken inside an ongoing transaction.
+    """
+    connection = connections[using]
+    if connection.vendor not in SNAPSHOT_STATEMENTS:
+        raise UnsupportedSnapshot(
+            'Snapshots are not supported on %s' % connection.vendor
+        )
+
+    statement = SNAPSHOT_STATEMENTS[connection.vendor]
+    if statement and connection.in_atomic_block:
+        raise UnsupportedSnapshot(
+            'Snapshots can\'t be taken inside a transaction'
+        )
+
+    with transaction.atomic(using=using):
+        if statement:
+            with connection.cursor() as cursor:
+                cursor.execute(statement)
+
+        yield
+
+        transaction.set_rollback(True, using=using)
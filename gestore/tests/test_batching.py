@@ -0,0 +1,142 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from demoapp.factories.demoapp import AuthorFactory, BookFactory
+from demoapp.models import Book
+from gestore.batching import BatchSizeController
+from gestore.encoders import GestoreEncoder
+from gestore.management.commands.exportobjects import Command
+from gestore.tests.test_closure import dump
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
+
+
+class TestBatchSizeController(TestCase):
+    def test_grow(self):
+        controller = BatchSizeController(100, target_query_ms=50)
+
+        self.assertEqual(controller.observe(Book, 100), 200)
+        self.assertEqual(controller.get_size(Book), 200)
+        self.assertEqual(len(controller.decisions), 1)
+        self.assertTrue(controller.decisions[0].startswith(
+            'demoapp.Book: batch size 100 -> 200, slowest query took'
+        ))
+
+        # Batches that were not full tell nothing about larger ones
+        self.assertEqual(controller.observe(Book, 150), 200)
+        self.assertEqual(len(controller.decisions), 1)
+
+    def test_shrink_slow_queries(self):
+        controller = BatchSizeController(100, target_query_ms=50)
+        controller.slowest_query_ms = 200
+
+        self.assertEqual(controller.observe(Book, 100), 25)
+        # Timings are reset after each batch
+        self.assertEqual(controller.slowest_query_ms, 0)
+
+    def test_shrink_memory(self):
+        controller = BatchSizeController(100, max_memory=2 ** 20)
+
+        with patch.object(
+                BatchSizeController,
+                'get_memory',
+                return_value=2 ** 21
+        ):
+            self.assertEqual(controller.observe(Book, 100), 50)
+
+        with patch.object(
+                BatchSizeController,
+                'get_memory',
+                return_value=2 ** 18
+        ):
+            self.assertEqual(controller.observe(Book, 50), 100)
+
+    def test_bounds(self):
+        controller = BatchSizeController(
+            100,
+            target_query_ms=50,
+            min_size=20,
+            max_size=150
+        )
+
+        self.assertEqual(controller.observe(Book, 100), 150)
+        controller.slowest_query_ms = 5000
+        self.assertEqual(controller.observe(Book, 150), 20)
+
+    def test_time_query(self):
+        controller = BatchSizeController(100, target_query_ms=50)
+        result = controller.time_query(
+            lambda *args: 'rows', 'SELECT 1', (), False, {}
+        )
+
+        self.assertEqual(result, 'rows')
+        self.assertGreater(controller.slowest_query_ms, 0)
+
+    def test_get_memory(self):
+        self.assertGreater(BatchSizeController.get_memory(), 0)
+
+
+class TestAdaptiveTraversal(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+        self.author = AuthorFactory.create()
+        BookFactory.create_batch(9, author=self.author)
+
+    def test_same_objects(self):
+        expected = self.command.generate_objects(self.author)
+
+        for extract in ('instances', EXTRACT_VALUES):
+            controller = BatchSizeController(
+                2,
+                target_query_ms=10 ** 6,
+                min_size=1
+            )
+            objects = BatchTraversal(
+                self.command.process_instance,
+                extract=extract,
+                batch_sizes=controller,
+            ).run(self.author)
+
+            self.assertEqual(dump(objects), dump(expected))
+            # Books came in batches of 2, 4, then the 3 left
+            self.assertEqual(controller.get_size(Book), 8)
+            self.assertEqual(
+                [
+                    decision.partition(',')[0]
+                    for decision in controller.decisions
+                    if decision.startswith('demoapp.Book')
+                ],
+                [
+                    'demoapp.Book: batch size 2 -> 4',
+                    'demoapp.Book: batch size 4 -> 8',
+                ]
+            )
+
+    @patch.object(Command, 'write_exports_file')
+    @patch.object(Command, 'check_migrations')
+    def test_command(self, mock_check, mock_write_exports_file):
+        stdout = StringIO()
+        call_command(
+            'exportobjects',
+            'demoapp.Author.%s' % self.author.pk,
+            '--strategy', 'bfs',
+            '--batch-size', '2',
+            '--target-query-ms', '1000000',
+            stdout=stdout,
+        )
+
+        _, output = mock_write_exports_file.call_args[0]
+        self.assertEqual(
+            dump(json.loads(output)['objects']),
+            dump(json.loads(json.dumps(
+                self.command.generate_objects(self.author),
+                cls=GestoreEncoder
+            )))
+        )
+        self.assertIn(
+            'Adapted demoapp.Book: batch size 2 -> 4',
+            stdout.getvalue()
+        )
@@ -0,0 +1,224 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+)
+from gestore.budgets import BUDGET_PRUNE, BudgetExceeded, TraversalBudget
+from gestore.management.commands.exportobjects import Command
+from gestore.traversal import BatchTraversal
+
+
+class TestTraversalBudget(TestCase):
+    def test_unlimited(self):
+        budget = TraversalBudget()
+        budget.start()
+
+        self.assertTrue(budget.check_objects(10 ** 9))
+        self.assertTrue(budget.check_depth(10 ** 9))
+        self.assertTrue(budget.check_fanout('demoapp.Author.book_set', 10))
+        self.assertTrue(budget.check_time())
+        self.assertEqual(budget.report, [])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            TraversalBudget(on_exceeded='ignore')
+
+    def test_abort(self):
+        budget = TraversalBudget(max_objects=2)
+
+        self.assertTrue(budget.check_objects(2))
+        with self.assertRaises(BudgetExceeded) as context:
+            budget.check_objects(3)
+
+        self.assertEqual(
+            context.exception.report,
+            ['Reached the limit of 2 objects']
+        )
+
+    def test_prune(self):
+        budget = TraversalBudget(max_depth=1, on_exceeded=BUDGET_PRUNE)
+
+        self.assertTrue(budget.check_depth(1))
+        self.assertFalse(budget.check_depth(2))
+        self.assertEqual(
+            budget.report,
+            ['Reached the depth limit of 1 levels']
+        )
+
+    def test_objects_are_reported_once(self):
+        budget = TraversalBudget(max_objects=1, on_exceeded=BUDGET_PRUNE)
+
+        self.assertFalse(budget.check_objects(2))
+        self.assertFalse(budget.check_objects(2))
+        self.assertEqual(len(budget.report), 1)
+        self.assertEqual(budget.pruned_objects, 2)
+
+    def test_fanout_per_relation(self):
+        budget = TraversalBudget(
+            max_fanout=10,
+            fanout={'demoapp.Author.book_set': 2},
+            on_exceeded=BUDGET_PRUNE,
+        )
+
+        self.assertEqual(budget.get_fanout_limit('demoapp.Book.genre'), 10)
+        self.assertTrue(budget.check_fanout('demoapp.Book.genre', 10))
+        self.assertFalse(budget.check_fanout('demoapp.Author.book_set', 3))
+
+    def test_time_limit(self):
+        budget = TraversalBudget(time_limit=5, on_exceeded=BUDGET_PRUNE)
+
+        with patch('gestore.budgets.time.monotonic', return_value=100):
+            budget.start()
+        with patch('gestore.budgets.time.monotonic', return_value=104):
+            self.assertTrue(budget.check_time())
+        with patch('gestore.budgets.time.monotonic', return_value=106):
+            self.assertFalse(budget.check_time())
+
+        # Stays timed out, and is only reported once
+        self.assertFalse(budget.check_time())
+        self.assertEqual(len(budget.report), 1)
+
+    @override_settings(GESTORE_BUDGETS={'max_objects': 10, 'max_depth': 3})
+    def test_from_settings(self):
+        budget = TraversalBudget.from_settings(max_objects=5, max_depth=None)
+
+        self.assertEqual(budget.max_objects, 5)
+        self.assertEqual(budget.max_depth, 3)
+
+
+class TestBudgetedTraversal(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+    def models(self, objects):
+        return {obj['model'] for obj in objects}
+
+    def test_max_depth(self):
+        instance = BookInstanceFactory.create()
+        budget = TraversalBudget(max_depth=1, on_exceeded=BUDGET_PRUNE)
+
+        objects = BatchTraversal(
+            self.command.process_instance,
+            budget=budget,
+        ).run(instance)
+
+        # The author is two levels away from the book instance
+        models = self.models(objects)
+        self.assertIn('demoapp.book', models)
+        self.assertNotIn('demoapp.author', models)
+        self.assertEqual(
+            budget.report,
+            ['Reached the depth limit of 1 levels']
+        )
+
+    def test_max_depth_abort(self):
+        instance = BookInstanceFactory.create()
+
+        with self.assertRaises(BudgetExceeded):
+            BatchTraversal(
+                self.command.process_instance,
+                budget=TraversalBudget(max_depth=1),
+            ).run(instance)
+
+    def test_max_fanout(self):
+        author = AuthorFactory.create()
+        BookFactory.create_batch(3, author=author)
+        budget = TraversalBudget(
+            fanout={'demoapp.Author.book_set': 2},
+            on_exceeded=BUDGET_PRUNE,
+        )
+
+        objects = BatchTraversal(
+            self.command.process_instance,
+            budget=budget,
+        ).run(author)
+
+        self.assertNotIn('demoapp.book', self.models(objects))
+        self.assertEqual(
+            budget.report,
+            ['Relation demoapp.Author.book_set points at 3 objects '
+             '(limit is 2)']
+        )
+
+    def test_max_depth_dfs(self):
+        instance = BookInstanceFactory.create()
+        self.command.budget = TraversalBudget(
+            max_depth=1,
+            on_exceeded=BUDGET_PRUNE,
+        )
+
+        models = self.models(self.command.generate_objects(instance))
+
+        self.assertIn('demoapp.book', models)
+        self.assertNotIn('demoapp.author', models)
+        self.assertEqual(
+            self.command.budget.report,
+            ['Reached the depth limit of 1 levels']
+        )
+
+        self.command.budget = TraversalBudget(max_depth=0)
+        with self.assertRaises(BudgetExceeded):
+            self.command.generate_objects(instance)
+
+    def test_max_fanout_dfs(self):
+        author = AuthorFactory.create()
+        BookFactory.create_batch(3, author=author)
+        self.command.budget = TraversalBudget(
+            fanout={'demoapp.Author.book_set': 2},
+            on_exceeded=BUDGET_PRUNE,
+        )
+
+        objects = self.command.generate_objects(author)
+
+        self.assertNotIn('demoapp.book', self.models(objects))
+        self.assertEqual(
+            self.command.budget.report,
+            ['Relation demoapp.Author.book_set points at 3 objects '
+             '(limit is 2)']
+        )
+
+        self.command.budget = TraversalBudget(max_fanout=2)
+        with self.assertRaises(BudgetExceeded):
+            self.command.generate_objects(author)
+
+    def test_max_objects(self):
+        author = AuthorFactory.create()
+        BookFactory.create_batch(3, author=author)
+
+        for generate_objects in (
+                self.command.generate_objects,
+                self.command.generate_objects_batched,
+        ):
+            self.command.budget = TraversalBudget(
+                max_objects=3,
+                on_exceeded=BUDGET_PRUNE,
+            )
+            objects = generate_objects(author)
+
+            self.assertEqual(len(objects), 3)
+            self.assertGreater(self.command.budget.pruned_objects, 0)
+
+    @patch('gestore.management.commands.exportobjects.get_pip_packages')
+    @patch.object(Command, 'write_exports_file')
+    @patch.object(Command, 'check')
+    def test_handle_abort(self, mock_check, mock_write, mock_packages):
+        instance = BookInstanceFactory.create()
+        out = StringIO()
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'exportobjects',
+                'demoapp.BookInstance.%s' % instance.pk,
+                '--max-objects', '1',
+                stdout=out,
+                stderr=StringIO(),
+            )
+
+        mock_write.assert_not_called()
+        self.assertIn('Reached the limit of 1 objects', out.getvalue())
@@ -0,0 +1,136 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+    GenreFactory,
+)
+from demoapp.models import Author, Book, BookInstance
+from gestore.budgets import TraversalBudget
+from gestore.closure import (
+    ClosureQuery,
+    ClosureTraversal,
+    UnsupportedClosure,
+)
+from gestore.encoders import GestoreEncoder
+from gestore.graph import RelationGraph
+from gestore.management.commands.exportobjects import Command
+from gestore.tests.test_traversal import exported_keys
+from gestore.traversal import EXTRACT_VALUES
+
+
+def dump(items):
+    return sorted(
+        json.dumps(item, sort_keys=True, cls=GestoreEncoder)
+        for item in items
+    )
+
+
+class TestClosureQuery(TestCase):
+    def get_query(self, *instances, root_models=()):
+        root_models = set(root_models).union(
+            type(instance).__name__ for instance in instances
+        )
+        graph = RelationGraph()
+        graph.prune([type(instance) for instance in instances], root_models)
+
+        return ClosureQuery(graph, root_models)
+
+    def test_execute(self):
+        instance = BookInstanceFactory.create()
+        other_instance = BookInstanceFactory.create(book=instance.book)
+        other_book = BookFactory.create(author=instance.book.author)
+
+        keys = self.get_query(instance).execute([instance])
+
+        self.assertEqual(keys[BookInstance], [instance.pk])
+        self.assertNotIn(other_instance.pk, keys[BookInstance])
+        self.assertEqual(
+            sorted(keys[Book]),
+            sorted([instance.book.pk, other_book.pk])
+        )
+        self.assertEqual(keys[Author], [instance.book.author.pk])
+
+    def test_root_models(self):
+        instance = BookInstanceFactory.create()
+
+        keys = self.get_query(
+            instance,
+            root_models=['Author']
+        ).execute([instance])
+
+        self.assertNotIn(Author, keys)
+        self.assertEqual(keys[Book], [instance.book.pk])
+
+    def test_single_statement(self):
+        genres = GenreFactory.create_batch(3)
+        author = AuthorFactory.create()
+        BookFactory.create_batch(5, author=author, genre=genres)
+
+        query = self.get_query(author)
+        with CaptureQueriesContext(connection) as context:
+            query.execute([author])
+
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('WITH RECURSIVE', context.captured_queries[0]['sql'])
+
+    def test_unsupported_vendor(self):
+        AuthorFactory.create()
+
+        with patch('gestore.closure.SUPPORTED_VENDORS', ()):
+            with self.assertRaises(UnsupportedClosure):
+                self.get_query(Author.objects.get())
+
+
+class TestClosureTraversal(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+    def test_same_objects_as_dfs(self):
+        genres = GenreFactory.create_batch(2)
+        instance = BookInstanceFactory.create(
+            book=BookFactory.create(genre=genres)
+        )
+        BookInstanceFactory.create(book=instance.book)
+        BookFactory.create(author=instance.book.author, genre=genres[:1])
+
+        expected = self.command.generate_objects(instance)
+
+        for extract in ('instances', EXTRACT_VALUES):
+            objects = ClosureTraversal(
+                self.command.process_instance,
+                extract=extract,
+            ).run(instance)
+
+            self.assertEqual(exported_keys(objects), exported_keys(expected))
+            self.assertEqual(dump(objects), dump(expected))
+
+    def test_budgets_are_unsupported(self):
+        author = AuthorFactory.create()
+
+        with self.assertRaises(UnsupportedClosure):
+            ClosureTraversal(
+                self.command.process_instance,
+                budget=TraversalBudget(max_objects=10),
+            ).run(author)
+
+    def test_command_falls_back_to_bfs(self):
+        author = AuthorFactory.create()
+        BookFactory.create_batch(2, author=author)
+        self.command.strategy = 'cte'
+
+        with patch('gestore.closure.SUPPORTED_VENDORS', ()):
+            objects = self.command.generate_objects_batched(author)
+
+        self.assertIn('Falling back to bfs', self.command.stdout.getvalue())
+        self.assertEqual(
+            exported_keys(objects),
+            exported_keys(self.command.generate_objects(author))
+        )
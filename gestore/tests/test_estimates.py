@@ -0,0 +1,190 @@
+from collections import Counter
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+    GenreFactory,
+)
+from demoapp.models import Author
+from gestore.budgets import BUDGET_PRUNE, TraversalBudget
+from gestore.estimates import format_bytes
+from gestore.management.commands.exportobjects import Command
+
+
+class TestExportEstimate(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+        genres = GenreFactory.create_batch(2)
+        self.authors = AuthorFactory.create_batch(2)
+        for author in self.authors:
+            for book in BookFactory.create_batch(
+                    3, author=author, genre=genres
+            ):
+                BookInstanceFactory.create_batch(2, book=book)
+
+    def get_estimated_counts(self, estimate):
+        return {
+            model._meta.label_lower: round(count)
+            for model, count in estimate.counts.items()
+            if round(count)
+        }
+
+    def test_estimate_matches_export(self):
+        objects = self.command.generate_objects(self.authors[0])
+        estimate = self.command.estimate_objects(self.authors[0])
+
+        self.assertEqual(
+            self.get_estimated_counts(estimate),
+            dict(Counter(obj['model'] for obj in objects))
+        )
+        self.assertEqual(round(estimate.total_objects), len(objects))
+        self.assertGreater(estimate.total_bytes, 0)
+
+        self.assertEqual(
+            estimate.get_hottest_relations(1),
+            [('demoapp.Book.bookinstance_set', 12)]
+        )
+
+    def test_no_rows_fetched(self):
+        with CaptureQueriesContext(connection) as context:
+            estimate = self.command.estimate_objects(
+                Author.objects.filter(pk=self.authors[0].pk)
+            )
+            estimate.describe()
+
+        for query in context.captured_queries:
+            self.assertTrue(
+                any(
+                    aggregate in query['sql']
+                    for aggregate in (
+                        'COUNT(',
+                        'AVG(',
+                        'SELECT (1) AS',
+                        'SAVEPOINT',
+                    )
+                ),
+                query['sql']
+            )
+
+    def test_root_models(self):
+        estimate = self.command.estimate_objects(
+            self.authors[0],
+            root_models={'Book'}
+        )
+
+        self.assertEqual(
+            self.get_estimated_counts(estimate),
+            {'demoapp.author': 1}
+        )
+
+    @override_settings(GESTORE_TRAVERSAL={
+        'demoapp.Author.book_set': {'limit': 1},
+        'demoapp.Book.genre': 'reference',
+        'demoapp.Book.bookinstance_set': 'skip',
+    })
+    def test_policies(self):
+        objects = self.command.generate_objects(self.authors[0])
+        estimate = self.command.estimate_objects(self.authors[0])
+        counts = self.get_estimated_counts(estimate)
+
+        self.assertEqual(
+            counts,
+            dict(Counter(obj['model'] for obj in objects))
+        )
+        self.assertEqual(counts['demoapp.book'], 1)
+        self.assertNotIn('demoapp.bookinstance', counts)
+
+    def test_max_depth(self):
+        self.command.strategy = 'bfs'
+        self.command.budget = TraversalBudget(
+            max_depth=1,
+            on_exceeded=BUDGET_PRUNE,
+        )
+        objects = self.command.generate_objects(self.authors[0])
+        estimate = self.command.estimate_objects(self.authors[0])
+
+        self.assertEqual(
+            self.get_estimated_counts(estimate),
+            dict(Counter(obj['model'] for obj in objects))
+        )
+        self.assertEqual(
+            estimate.budget.report,
+            ['Reached the depth limit of 1 levels']
+        )
+
+    def test_max_fanout(self):
+        self.command.budget = TraversalBudget(
+            fanout={'demoapp.Book.bookinstance_set': 1},
+            on_exceeded=BUDGET_PRUNE,
+        )
+        objects = self.command.generate_objects(self.authors[0])
+        estimate = self.command.estimate_objects(self.authors[0])
+        counts = self.get_estimated_counts(estimate)
+
+        self.assertEqual(
+            counts,
+            dict(Counter(obj['model'] for obj in objects))
+        )
+        self.assertNotIn('demoapp.bookinstance', counts)
+        self.assertEqual(
+            estimate.budget.report,
+            ['Relation demoapp.Book.bookinstance_set points at 2 objects '
+             '(limit is 1)']
+        )
+
+        # Batches of books go over the limit of the batched traversal
+        self.command.strategy = 'bfs'
+        self.command.budget.fanout = {'demoapp.Book.bookinstance_set': 5}
+        estimate = self.command.estimate_objects(self.authors[0])
+        self.assertIn(
+            'demoapp.Book.bookinstance_set',
+            estimate.pruned_relations
+        )
+
+    def test_max_objects(self):
+        self.command.budget = TraversalBudget(max_objects=5)
+        estimate = self.command.estimate_objects(self.authors[0])
+
+        self.assertEqual(round(estimate.total_objects), 5)
+        self.assertEqual(
+            estimate.budget.report,
+            ['Reached the limit of 5 objects']
+        )
+
+    @patch.object(Command, 'write_exports_file')
+    @patch.object(Command, 'check')
+    def test_plan_option(self, mock_check, mock_write_exports_file):
+        out = StringIO()
+        call_command(
+            'exportobjects',
+            'demoapp.Author.%s' % self.authors[0].pk,
+            '--filter', 'demoapp.Book:author_id=%s' % self.authors[1].pk,
+            '--plan',
+            '--max-objects', '10',
+            stdout=out
+        )
+
+        output = out.getvalue()
+        self.assertIn('Estimated objects per model:', output)
+        # Books are root objects, those of the first author aren't exported
+        self.assertIn('demoapp.Book: ~3 objects', output)
+        self.assertIn('queries using the dfs strategy', output)
+        self.assertIn(
+            'The export would abort: Reached the limit of 10 objects',
+            output
+        )
+        self.assertFalse(mock_write_exports_file.called)
+
+    def test_format_bytes(self):
+        self.assertEqual(format_bytes(512), '512.0 bytes')
+        self.assertEqual(format_bytes(1536), '1.5 KB')
+        self.assertEqual(format_bytes(3 * 1024 ** 3), '3.0 GB')
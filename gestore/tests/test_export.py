@@ -1,12 +1,22 @@
 from collections import Counter
+import json
 from io import StringIO
 from unittest.mock import patch
 
 import django
 from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from demoapp.factories.demoapp import BookInstanceFactory
+from demoapp.factories.demoapp import (
+    BookFactory,
+    BookInstanceFactory,
+    GenreFactory,
+    LanguageFactory,
+)
+from demoapp.models import Book, Genre, Language
 from gestore.management.commands.exportobjects import Command
 
 
@@ -20,17 +30,17 @@ class TestExportObjectsCommand(TestCase):
         ]
 
     @patch('gestore.management.commands.exportobjects.get_pip_packages')
-    @patch('gestore.management.commands.exportobjects.get_obj_from_str')
+    @patch('gestore.management.commands.exportobjects.get_objs_from_str')
     @patch.object(Command, 'write_exports_file')
     @patch.object(Command, 'check')
     def test_handle(
             self,
             mock_check,
             mock_write_exports_file,
-            get_obj_from_str,
+            get_objs_from_str,
             mock_get_pip_packages
     ):
-        get_obj_from_str.return_value = self.books_instances[0]
+        get_objs_from_str.return_value = self.books_instances[:2]
         mock_write_exports_file.return_value = 'called'
         mock_get_pip_packages.return_value = {}
 
@@ -38,7 +48,7 @@ class TestExportObjectsCommand(TestCase):
         call_command('exportobjects', objs, stdout=self.out)
 
         self.assertTrue(mock_check.called)
-        self.assertTrue(get_obj_from_str.called)
+        self.assertTrue(get_objs_from_str.called)
         self.assertTrue(mock_write_exports_file.called)
         self.assertTrue(mock_get_pip_packages.called)
 
@@ -54,22 +64,22 @@ class TestExportObjectsCommand(TestCase):
         self.assertNotIn('Command output >>>', self.out.getvalue())
 
     @patch('gestore.management.commands.exportobjects.get_pip_packages')
-    @patch('gestore.management.commands.exportobjects.get_obj_from_str')
+    @patch('gestore.management.commands.exportobjects.get_objs_from_str')
     @patch.object(Command, 'check')
     def test_handle_debug(
             self,
             mock_check,
-            get_obj_from_str,
+            get_objs_from_str,
             mock_get_pip_packages
     ):
-        get_obj_from_str.return_value = self.books_instances[0]
+        get_objs_from_str.return_value = self.books_instances[:2]
         mock_get_pip_packages.return_value = {}
 
         objs = ['demoapp.book.1', 'demoapp.book.2', ]
         call_command('exportobjects', objs, debug=True, stdout=self.out)
 
         self.assertTrue(mock_check.called)
-        self.assertTrue(get_obj_from_str.called)
+        self.assertTrue(get_objs_from_str.called)
         self.assertTrue(mock_get_pip_packages.called)
 
         if django.VERSION < (3, 2, 0):
@@ -109,16 +119,19 @@ class TestExportObjectsCommand(TestCase):
                 call_command('exportobjects', objs, stdout=self.out)
 
     @patch('gestore.management.commands.exportobjects.get_model_name')
-    @patch('gestore.management.commands.exportobjects.instance_representation')
+    @patch('gestore.management.commands.exportobjects.get_object_key')
     @patch.object(Command, 'process_instance')
     def test_generate_objects_dfs(
-            self, mock_process_instance, mock_instance_rep, mock_get_model_name
+            self,
+            mock_process_instance,
+            mock_get_object_key,
+            mock_get_model_name
     ):
         """
         To be able to test DFS we need a graph structure, this mimics database
         relations to some extent.
         """
-        mock_instance_rep.side_effect = lambda x: x
+        mock_get_object_key.side_effect = lambda x: tuple(x.split('_'))
         mock_get_model_name.side_effect = lambda x: x.split('_')[0]
         mock_process_instance.side_effect = self.fake_process_instance
 
@@ -142,10 +155,13 @@ class TestExportObjectsCommand(TestCase):
         ))
 
     @patch('gestore.management.commands.exportobjects.get_model_name')
-    @patch('gestore.management.commands.exportobjects.instance_representation')
+    @patch('gestore.management.commands.exportobjects.get_object_key')
     @patch.object(Command, 'process_instance')
     def test_generate_objects_integrity(
-            self, mock_process_instance, mock_instance_rep, mock_get_model_name
+            self,
+            mock_process_instance,
+            mock_get_object_key,
+            mock_get_model_name
     ):
         """
         makes sure that:
@@ -153,7 +169,7 @@ class TestExportObjectsCommand(TestCase):
             - Unrelated objects are not included.
             - No object appears more than once.
         """
-        mock_instance_rep.side_effect = lambda x: x
+        mock_get_object_key.side_effect = lambda x: tuple(x.split('_'))
         mock_get_model_name.side_effect = lambda x: x.split('_')[0]
         mock_process_instance.side_effect = self.fake_process_instance
 
@@ -178,6 +194,178 @@ class TestExportObjectsCommand(TestCase):
             'Organization_2',
         })
 
+    def test_generate_objects_loads_keys_in_bulk(self):
+        """
+        Objects discovered by their keys are fetched once per model, and
+        objects pointed at many times are fetched once.
+        """
+        language = LanguageFactory.create()
+        instance = BookInstanceFactory.create(
+            book=BookFactory.create(language=language)
+        )
+        BookFactory.create_batch(
+            3, author=instance.book.author, language=language
+        )
+
+        with patch.object(
+                Language._default_manager,
+                'in_bulk',
+                wraps=Language._default_manager.in_bulk
+        ) as mock_in_bulk:
+            objects = self.command.generate_objects(instance)
+
+        self.assertEqual(mock_in_bulk.call_count, 1)
+        self.assertEqual(
+            [o['pk'] for o in objects if o['model'] == 'demoapp.language'],
+            [language.pk]
+        )
+        self.assertEqual(
+            len([obj for obj in objects if obj['model'] == 'demoapp.book']),
+            4
+        )
+
+    def test_many_to_many_keys(self):
+        """
+        ManyToMany relations only read their through table, related objects
+        are discovered by their keys.
+        """
+        genres = GenreFactory.create_batch(2)
+        book = BookFactory.create(genre=genres)
+
+        item, pending_items = self.command.process_instance(book)
+
+        self.assertEqual(
+            sorted(item['fields']['genre']),
+            sorted(genre.pk for genre in genres)
+        )
+        self.assertEqual(
+            {
+                pending_item for pending_item in pending_items
+                if isinstance(pending_item, tuple)
+                and pending_item[0] is Genre
+            },
+            {(Genre, genre.pk) for genre in genres}
+        )
+
+        _, pending_items = self.command.process_instance(genres[0])
+        self.assertIn((Book, book.pk), pending_items)
+
+    def test_load_key(self):
+        books = BookFactory.create_batch(3)
+        pending_keys = {Book: {books[1].pk, books[2].pk}}
+        loaded = {}
+
+        with CaptureQueriesContext(connection) as context:
+            book = Command.load_key((Book, books[0].pk), pending_keys, loaded)
+            pending_keys.setdefault(Book, set()).discard(books[1].pk)
+            other_book = Command.load_key(
+                (Book, books[1].pk),
+                pending_keys,
+                loaded
+            )
+
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(book, books[0])
+        self.assertEqual(other_book, books[1])
+        self.assertEqual(list(loaded), [(Book, books[2].pk)])
+
+    def test_load_key_does_not_exist(self):
+        self.assertIsNone(Command.load_key((Book, 0), {}, {}))
+
+    @patch('gestore.management.commands.exportobjects.get_pip_packages')
+    @patch.object(Command, 'write_exports_file')
+    def test_handle_filter(
+            self,
+            mock_write_exports_file,
+            mock_get_pip_packages
+    ):
+        mock_get_pip_packages.return_value = {}
+        book = self.books_instances[0].book
+
+        call_command(
+            'exportobjects',
+            'demoapp.Book.%s' % book.pk,
+            '--filter', 'demoapp.Language:name__startswith=',
+            stdout=self.out
+        )
+
+        _, output = mock_write_exports_file.call_args[0]
+        exports = json.loads(output)
+        self.assertEqual(
+            exports['provided_objects'],
+            [
+                'demoapp.Book.%s' % book.pk,
+                'demoapp.Language:name__startswith=',
+            ]
+        )
+        self.assertEqual(
+            sorted(
+                obj['pk'] for obj in exports['objects']
+                if obj['model'] == 'demoapp.language'
+            ),
+            sorted(Language.objects.values_list('pk', flat=True))
+        )
+
+    def test_handle_bad_filter(self):
+        for filter_rep in (
+                'demoapp.Book',
+                'demoapp.Book:something=1',
+                'demoapp.Book:id=abc',
+        ):
+            with self.assertRaises(CommandError):
+                call_command(
+                    'exportobjects',
+                    '--filter', filter_rep,
+                    stdout=self.out
+                )
+
+        with self.assertRaises(CommandError):
+            call_command('exportobjects', stdout=self.out)
+
+    def test_handle_bad_sizes(self):
+        for option in (
+                '--chunk-size',
+                '--batch-size',
+                '--workers',
+                '--threads',
+        ):
+            for value in ('0', '-5', 'abc'):
+                with self.assertRaises(CommandError):
+                    call_command(
+                        'exportobjects',
+                        'demoapp.Book.1',
+                        '--strategy', 'bfs',
+                        option, value,
+                        stdout=self.out
+                    )
+
+    def test_generate_objects_from_queryset(self):
+        books = Book.objects.filter(
+            pk__in=[instance.book.pk for instance in self.books_instances[:3]]
+        )
+
+        # The queryset is loaded using a single query
+        with patch.object(
+                QuerySet,
+                'iterator',
+                autospec=True,
+                side_effect=QuerySet.iterator
+        ) as mock_iterator:
+            objects = self.command.generate_objects(books)
+        self.assertEqual(mock_iterator.call_count, 1)
+
+        expected = self.command.generate_objects(*books)
+        self.assertEqual(
+            sorted((obj['model'], obj['pk']) for obj in objects),
+            sorted((obj['model'], obj['pk']) for obj in expected)
+        )
+
+        batched_objects = self.command.generate_objects_batched(books)
+        self.assertEqual(
+            sorted((obj['model'], obj['pk']) for obj in batched_objects),
+            sorted((obj['model'], obj['pk']) for obj in expected)
+        )
+
     @staticmethod
     def fake_process_instance(instance):
         """
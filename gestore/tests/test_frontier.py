@@ -0,0 +1,97 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+    GenreFactory,
+)
+from demoapp.models import Book
+from gestore.encoders import GestoreEncoder
+from gestore.frontier import KeyTable, use_key_table
+from gestore.management.commands.exportobjects import Command
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
+
+
+def dump(items):
+    return sorted(
+        json.dumps(item, sort_keys=True, cls=GestoreEncoder)
+        for item in items
+    )
+
+
+class TestKeyTable(TestCase):
+    def test_subquery(self):
+        books = BookFactory.create_batch(4)
+        pks = [book.pk for book in books[:3]]
+
+        with KeyTable(Book, pks) as table:
+            self.assertEqual(
+                sorted(Book.objects.filter(
+                    pk__in=table.subquery()
+                ).values_list('pk', flat=True)),
+                sorted(pks)
+            )
+
+        # Dropped on exit
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pk FROM %s' % table.quoted_name)
+
+    def test_use_key_table(self):
+        self.assertFalse(use_key_table(10, threshold=10))
+        self.assertTrue(use_key_table(11, threshold=10))
+
+        with patch.object(connection, 'vendor', 'oracle'):
+            self.assertFalse(use_key_table(11, threshold=10))
+
+
+class TestKeyTableFrontier(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+        genres = GenreFactory.create_batch(2)
+        self.author = AuthorFactory.create()
+        for book in BookFactory.create_batch(
+                6, author=self.author, genre=genres
+        ):
+            BookInstanceFactory.create_batch(2, book=book)
+
+    def run_traversal(self, **kwargs):
+        return BatchTraversal(
+            self.command.process_instance,
+            batch_size=2,
+            **kwargs
+        ).run(self.author)
+
+    def test_same_objects_as_in_lists(self):
+        for extract in ('instances', EXTRACT_VALUES):
+            expected = self.run_traversal(extract=extract)
+
+            with CaptureQueriesContext(connection) as context:
+                objects = self.run_traversal(
+                    extract=extract,
+                    key_table_threshold=3,
+                )
+
+            self.assertEqual(dump(objects), dump(expected))
+            self.assertTrue([
+                query for query in context.captured_queries
+                if 'CREATE TEMPORARY TABLE' in query['sql']
+            ])
+
+    def test_fewer_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            self.run_traversal()
+        in_list_queries = len(context.captured_queries)
+
+        with CaptureQueriesContext(connection) as context:
+            self.run_traversal(key_table_threshold=3)
+
+        self.assertLess(len(context.captured_queries), in_list_queries)
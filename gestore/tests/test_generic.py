@@ -0,0 +1,155 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.db.models import QuerySet
+from django.test import TestCase
+
+from demoapp.factories.demoapp import (
+    BookFactory,
+    BookInstanceFactory,
+    CommentFactory,
+)
+from demoapp.models import Book, BookInstance
+from gestore.closure import ClosureTraversal
+from gestore.management.commands.exportobjects import Command
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
+
+
+def exported_keys(objects):
+    return {(obj['model'], str(obj.get('pk'))) for obj in objects}
+
+
+class TestGenericRelations(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+        self.book = BookFactory.create()
+        self.instances = BookInstanceFactory.create_batch(
+            2, book=self.book
+        )
+        self.book_comments = CommentFactory.create_batch(
+            2, content_object=self.book
+        )
+        self.instance_comments = [
+            CommentFactory.create(content_object=instance)
+            for instance in self.instances
+        ]
+
+    def test_dfs(self):
+        objects = self.command.generate_objects(self.instance_comments[0])
+        keys = exported_keys(objects)
+
+        # Reached through the GenericForeignKey, other comments are root
+        # objects and aren't exported.
+        self.assertIn(
+            ('demoapp.bookinstance', str(self.instances[0].pk)),
+            keys
+        )
+        self.assertIn(('demoapp.book', str(self.book.pk)), keys)
+        self.assertEqual(
+            [key for key in keys if key[0] == 'demoapp.comment'],
+            [('demoapp.comment', str(self.instance_comments[0].pk))]
+        )
+
+        # Content types exist in every database, they are only referenced
+        self.assertNotIn(
+            'contenttypes.contenttype',
+            {model for model, _ in keys}
+        )
+
+        comment = next(
+            obj for obj in objects
+            if obj['model'] == 'demoapp.comment'
+            and obj['pk'] == self.instance_comments[0].pk
+        )
+        self.assertEqual(
+            str(comment['fields']['object_id']),
+            str(self.instances[0].pk)
+        )
+        self.assertEqual(
+            comment['fields']['content_type'],
+            self.instance_comments[0].content_type_id
+        )
+
+    def test_generic_relations(self):
+        keys = exported_keys(self.command.generate_objects(self.book))
+
+        for comment in self.book_comments:
+            self.assertIn(('demoapp.comment', str(comment.pk)), keys)
+
+        # Instances have no GenericRelation, their comments are unreachable
+        for comment in self.instance_comments:
+            self.assertNotIn(('demoapp.comment', str(comment.pk)), keys)
+
+    def test_same_objects_as_dfs(self):
+        for root in (self.book, self.instance_comments[0]):
+            expected = self.command.generate_objects(root)
+
+            for extract in ('instances', EXTRACT_VALUES):
+                objects = BatchTraversal(
+                    self.command.process_instance,
+                    extract=extract,
+                ).run(root)
+
+                self.assertEqual(len(objects), len(exported_keys(objects)))
+                self.assertEqual(
+                    exported_keys(objects),
+                    exported_keys(expected)
+                )
+
+    def test_generic_foreign_keys_are_loaded_in_bulk(self):
+        comments = [
+            CommentFactory.create(content_object=BookFactory.create())
+            for _ in range(3)
+        ]
+        comments.append(
+            CommentFactory.create(
+                content_object=BookInstanceFactory.create(
+                    book=comments[0].content_object
+                )
+            )
+        )
+
+        with patch.object(
+                QuerySet,
+                'in_bulk',
+                autospec=True,
+                side_effect=QuerySet.in_bulk
+        ) as mock_in_bulk:
+            objects = BatchTraversal(
+                self.command.process_instance,
+                root_models=['Author', 'User', 'Language', 'Genre'],
+            ).run(*comments)
+
+        keys = exported_keys(objects)
+        for comment in comments:
+            self.assertIn(
+                (
+                    comment.content_object._meta.label_lower,
+                    str(comment.content_object.pk),
+                ),
+                keys
+            )
+
+        loaded_models = [
+            call[0][0].model for call in mock_in_bulk.call_args_list
+        ]
+        self.assertEqual(loaded_models.count(Book), 1)
+        self.assertEqual(loaded_models.count(BookInstance), 1)
+
+    def test_closure(self):
+        for root in (self.book, self.instance_comments[0]):
+            expected = self.command.generate_objects(root)
+
+            for extract in ('instances', EXTRACT_VALUES):
+                # Raises UnsupportedClosure instead of falling back
+                objects = ClosureTraversal(
+                    self.command.process_instance,
+                    extract=extract,
+                ).run(root)
+
+                self.assertEqual(len(objects), len(exported_keys(objects)))
+                self.assertEqual(
+                    exported_keys(objects),
+                    exported_keys(expected)
+                )
@@ -0,0 +1,181 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+)
+from demoapp.models import (
+    Author,
+    Book,
+    BookInstance,
+    Comment,
+    EBook,
+    Genre,
+    Language,
+)
+from gestore.graph import (
+    PRUNED_EMPTY,
+    PRUNED_ROOT,
+    PRUNED_UNREACHABLE,
+    RelationGraph,
+)
+from gestore.management.commands.exportobjects import Command
+from gestore.plans import get_field_plan
+from gestore.tests.test_traversal import exported_keys
+from gestore.traversal import BatchTraversal
+
+
+class TestRelationGraph(TestCase):
+    def pruned(self, graph, model):
+        return {
+            accessor: reason
+            for accessor, _, reason in graph.pruned.get(model, [])
+        }
+
+    def test_edges(self):
+        graph = RelationGraph()
+
+        self.assertIn(Book, graph.models)
+        self.assertEqual(
+            {(accessor, target) for accessor, _, target in graph.edges[Book]},
+            {
+                ('author', Author),
+                ('language', Language),
+                ('genre', Genre),
+                ('bookinstance_set', BookInstance),
+                ('comments', Comment),
+                ('ebook', EBook),
+            }
+        )
+
+    def test_prune_root_models(self):
+        BookInstanceFactory.create()
+        graph = RelationGraph()
+        graph.prune([BookInstance], ['Author'])
+
+        # Books point at authors, but authors are not exported
+        self.assertNotIn(Author, graph.reachable)
+        self.assertIn(Book, graph.reachable)
+        self.assertEqual(
+            self.pruned(graph, Book),
+            {
+                'bookinstance_set': PRUNED_ROOT,
+                'comments': PRUNED_EMPTY,
+                'ebook': PRUNED_EMPTY,
+            }
+        )
+
+    def test_prune_empty_tables(self):
+        AuthorFactory.create()
+        graph = RelationGraph()
+        graph.prune([Author])
+
+        self.assertEqual(
+            self.pruned(graph, Author),
+            {'book_set': PRUNED_EMPTY}
+        )
+        self.assertEqual(graph.reachable, {Author})
+
+        # Pruned relations are left out of the plan only
+        plan = graph.get_plan(Author)
+        self.assertNotIn('book_set', plan.accessors)
+        self.assertEqual(plan.values, get_field_plan(Author).values)
+
+    def test_prune_unreachable_models(self):
+        AuthorFactory.create()
+        graph = RelationGraph()
+
+        checked = []
+
+        # Books are added once the reachable models are known
+        def is_empty(model):
+            checked.append(model)
+            return model is Book and checked.count(Book) == 1
+
+        with patch.object(graph, 'is_empty', side_effect=is_empty):
+            graph.prune([Author])
+
+        self.assertEqual(
+            self.pruned(graph, Author),
+            {'book_set': PRUNED_UNREACHABLE}
+        )
+
+    def test_forward_relations_are_kept(self):
+        BookFactory.create()
+        graph = RelationGraph()
+        graph.prune([Book], ['Author', 'Genre'])
+
+        plan = graph.get_plan(Book)
+        self.assertIn('author', plan.accessors)
+        self.assertIn('genre', plan.accessors)
+
+    def test_describe(self):
+        AuthorFactory.create()
+        graph = RelationGraph()
+        graph.prune([Author])
+        lines = graph.describe()
+
+        self.assertTrue(lines[0].startswith('Relation graph: '))
+        self.assertIn(
+            'Pruned relation demoapp.Author.book_set to demoapp.Book '
+            '(empty table)',
+            lines
+        )
+
+
+class TestPrunedExport(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+    def test_same_objects_as_unpruned(self):
+        instance = BookInstanceFactory.create()
+        BookInstanceFactory.create(book=instance.book)
+        BookFactory.create(author=instance.book.author)
+
+        unpruned = RelationGraph()
+        expected = BatchTraversal(
+            self.command.process_instance,
+            graph=unpruned,
+        ).run(instance)
+
+        self.assertEqual(
+            exported_keys(self.command.generate_objects(instance)),
+            exported_keys(expected)
+        )
+        self.assertEqual(
+            exported_keys(
+                BatchTraversal(self.command.process_instance).run(instance)
+            ),
+            exported_keys(expected)
+        )
+
+    def test_pruned_relations_are_not_queried(self):
+        """
+        Exporting authors without books must not look for their books, nor
+        for any other reverse relation.
+        """
+        authors = AuthorFactory.create_batch(3)
+
+        with CaptureQueriesContext(connection) as context:
+            self.command.generate_objects(*authors)
+
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'demoapp_book' in query['sql']
+            and 'LIMIT 1' not in query['sql']
+        ])
+
+    def test_debug_output(self):
+        self.command.debug = True
+        self.command.generate_objects(AuthorFactory.create())
+
+        self.assertIn(
+            'Pruned relation demoapp.Author.book_set',
+            self.command.stdout.getvalue()
+        )
@@ -0,0 +1,152 @@
+import uuid
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    LanguageFactory,
+)
+from demoapp.models import Book, BookInstance
+from gestore.index import (
+    IntKeySet,
+    PlainKeySet,
+    UUIDKeySet,
+    VisitedIndex,
+    get_key_set,
+)
+from gestore.management.commands.exportobjects import Command
+from gestore.traversal import BatchTraversal
+
+
+class TestKeySets(TestCase):
+    def test_get_key_set(self):
+        self.assertIsInstance(get_key_set(Book), IntKeySet)
+        self.assertIsInstance(get_key_set(User), IntKeySet)
+        self.assertIsInstance(get_key_set(BookInstance), UUIDKeySet)
+        self.assertIsInstance(get_key_set('NotAModel'), PlainKeySet)
+
+    def test_int_key_set_array(self):
+        key_set = IntKeySet()
+        keys = list(range(0, 10 ** 6, 997))
+
+        for key in reversed(keys):
+            self.assertTrue(key_set.add(key))
+
+        # Sparse keys are stored in a sorted array
+        self.assertEqual(key_set.storage, 'array')
+        self.assertEqual(len(key_set), len(keys))
+        self.assertEqual(list(key_set), keys)
+
+        for key in keys:
+            self.assertFalse(key_set.add(key))
+            self.assertIn(key, key_set)
+
+        self.assertNotIn(998, key_set)
+        self.assertNotIn(-1, key_set)
+
+    def test_int_key_set_bitmap(self):
+        key_set = IntKeySet()
+        keys = list(range(1, 5000))
+
+        for key in keys:
+            key_set.add(key)
+        key_set.compact()
+
+        # Dense keys are stored in a bitmap
+        self.assertEqual(key_set.storage, 'bitmap')
+        self.assertEqual(list(key_set), keys)
+        self.assertIn(4999, key_set)
+        self.assertNotIn(5000, key_set)
+        self.assertNotIn(0, key_set)
+        self.assertLess(key_set.nbytes(), 1000)
+
+        # Far away keys switch the storage back to an array
+        for key in range(10 ** 9, 10 ** 9 + 2000):
+            key_set.add(key)
+        key_set.compact()
+
+        self.assertEqual(key_set.storage, 'array')
+        self.assertEqual(len(key_set), 6999)
+        self.assertIn(1, key_set)
+        self.assertIn(10 ** 9 + 1999, key_set)
+
+    def test_uuid_key_set(self):
+        key_set = UUIDKeySet()
+        keys = [uuid.uuid4() for _ in range(3000)]
+
+        for key in keys:
+            self.assertTrue(key_set.add(key))
+        key_set.compact()
+
+        self.assertEqual(len(key_set), len(keys))
+        self.assertEqual(set(key_set), set(keys))
+        # 16 bytes per key, plus the bytearray overhead
+        self.assertLess(key_set.nbytes(), len(keys) * 16 + 1024)
+
+        for key in keys:
+            self.assertIn(key, key_set)
+            self.assertFalse(key_set.add(str(key)))
+
+        self.assertNotIn(uuid.uuid4(), key_set)
+
+
+class TestVisitedIndex(TestCase):
+    def test_add(self):
+        index = VisitedIndex()
+
+        self.assertTrue(index.add((Book, 1)))
+        self.assertFalse(index.add((Book, 1)))
+        self.assertTrue(index.add((User, 1)))
+
+        self.assertIn((Book, 1), index)
+        self.assertNotIn((Book, 2), index)
+        self.assertNotIn((BookInstance, uuid.uuid4()), index)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(set(index.models()), {Book, User})
+        self.assertEqual(list(index.keys(Book)), [1])
+
+    def test_export_hits(self):
+        language = LanguageFactory.create()
+        author = AuthorFactory.create()
+        BookFactory.create_batch(3, author=author, language=language)
+        command = Command(stdout=StringIO())
+
+        with patch.object(Command, 'write_summary') as mock_write_summary:
+            command.generate_objects(author)
+
+        traversal = BatchTraversal(command.process_instance)
+        traversal.run(author)
+
+        # The language of the books is discovered by each of them
+        _, visited = mock_write_summary.call_args[0]
+        for index in (visited, traversal.visited):
+            self.assertEqual(index.stats()['demoapp.Language']['hits'], 2)
+
+    def test_seen(self):
+        index = VisitedIndex()
+        index.add((Book, 1))
+
+        # Only objects dropped for being seen before are hits
+        self.assertIn((Book, 1), index)
+        self.assertEqual(index.stats()['demoapp.Book']['hits'], 0)
+
+        self.assertTrue(index.seen((Book, 1)))
+        self.assertFalse(index.seen((Book, 2)))
+        self.assertEqual(index.stats()['demoapp.Book']['hits'], 1)
+
+    def test_stats(self):
+        index = VisitedIndex()
+        index.add((Book, 1))
+        index.add((Book, 2))
+        index.add((Book, 1))
+
+        stats = index.stats()['demoapp.Book']
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['storage'], 'array')
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertGreater(stats['bytes'], 0)
@@ -0,0 +1,116 @@
+from io import StringIO
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from demoapp.factories.demoapp import (
+    BookInstanceFactory,
+    EBookFactory,
+    GenreFactory,
+)
+from demoapp.models import Book, EBook
+from gestore.closure import ClosureTraversal
+from gestore.management.commands.exportobjects import Command
+from gestore.plans import get_field_plan
+from gestore.tests.test_closure import dump
+from gestore.tests.test_traversal import exported_keys
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
+
+
+def parent_queries(context):
+    """
+    Queries fetching books or ebooks by their primary key, instead of getting
+    both out of a single joined query.
+    """
+    return [
+        query['sql'] for query in context.captured_queries
+        if 'WHERE "demoapp_book"."id" ' in query['sql']
+        or 'WHERE "demoapp_ebook"."book_ptr_id" ' in query['sql']
+    ]
+
+
+class TestMultiTableInheritance(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+        self.ebook = EBookFactory.create(genre=GenreFactory.create_batch(2))
+        BookInstanceFactory.create_batch(2, book=self.ebook)
+
+    def test_plan(self):
+        plan = get_field_plan(EBook)
+
+        self.assertEqual(
+            [name for name, _ in plan.values],
+            ['file_format', 'size']
+        )
+        self.assertEqual(
+            [name for name, _ in plan.foreign_keys],
+            ['publisher']
+        )
+        self.assertEqual(
+            [name for name, _ in plan.parent_links],
+            ['book_ptr']
+        )
+        self.assertEqual(plan.pk_field, EBook._meta.pk)
+        self.assertEqual(plan.many_to_many, [])
+        self.assertNotIn('bookinstance_set', plan.accessors)
+
+        # Books are built from the ebook rows
+        self.assertTrue(
+            set(get_field_plan(Book).columns).issubset(plan.columns)
+        )
+        self.assertEqual(
+            [name for name, _ in get_field_plan(Book).child_links],
+            ['ebook']
+        )
+
+    def test_records(self):
+        objects = self.command.generate_objects(self.ebook)
+        ebook, = [obj for obj in objects if obj['model'] == 'demoapp.ebook']
+        book, = [obj for obj in objects if obj['model'] == 'demoapp.book']
+
+        self.assertEqual(ebook['pk'], self.ebook.pk)
+        self.assertEqual(
+            set(ebook['fields']),
+            {'file_format', 'size', 'publisher'}
+        )
+        self.assertEqual(book['pk'], self.ebook.pk)
+        self.assertEqual(book['fields']['title'], self.ebook.title)
+        self.assertEqual(len(book['fields']['genre']), 2)
+
+    def test_parents_are_not_fetched(self):
+        with CaptureQueriesContext(connection) as context:
+            expected = self.command.generate_objects(self.ebook)
+        self.assertEqual(parent_queries(context), [])
+
+        for extract, count in (('instances', 0), (EXTRACT_VALUES, 1)):
+            with CaptureQueriesContext(connection) as context:
+                objects = BatchTraversal(
+                    self.command.process_instance,
+                    extract=extract,
+                ).run(self.ebook)
+
+            # Only the row of the given ebook is fetched, when extracting
+            # values.
+            self.assertEqual(len(parent_queries(context)), count)
+            self.assertEqual(dump(objects), dump(expected))
+
+    def test_children_are_discovered(self):
+        instance = self.ebook.bookinstance_set.first()
+        expected = self.command.generate_objects(instance)
+
+        self.assertIn(
+            ('demoapp.ebook', str(self.ebook.pk)),
+            exported_keys(expected)
+        )
+        self.assertEqual(len(expected), len(exported_keys(expected)))
+
+        for extract in ('instances', EXTRACT_VALUES):
+            for traversal in (BatchTraversal, ClosureTraversal):
+                objects = traversal(
+                    self.command.process_instance,
+                    extract=extract,
+                ).run(instance)
+
+                self.assertEqual(dump(objects), dump(expected))
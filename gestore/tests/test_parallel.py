@@ -0,0 +1,216 @@
+import json
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+    EBookFactory,
+    GenreFactory,
+)
+from demoapp.factories.django import UserFactory
+from demoapp.models import Author, Book
+from gestore.budgets import BUDGET_PRUNE, BudgetExceeded, TraversalBudget
+from gestore.encoders import GestoreEncoder
+from gestore.management.commands.exportobjects import Command
+from gestore.parallel import ParallelTraversal, WorkerTraversal
+from gestore.tests.test_traversal import exported_keys
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
+
+
+class SerialPool(object):
+    """
+    Runs the tasks in this process, test data is not visible from other
+    processes or connections.
+    """
+    instances = []
+
+    def __init__(self, processes, initializer, initargs):
+        self.processes = processes
+        self.tasks = []
+        self.closed = False
+        initializer(*initargs)
+        SerialPool.instances.append(self)
+
+    def imap(self, func, tasks):
+        for task in tasks:
+            self.tasks.append(task)
+            yield func(task)
+
+    def close(self):
+        self.closed = True
+
+    def join(self):
+        pass
+
+
+class IsolatedPool(SerialPool):
+    """
+    Sets up a new worker for each task, as if every task ran in a process of
+    its own, so workers share nothing but what the coordinator gives them.
+    """
+
+    def __init__(self, processes, initializer, initargs):
+        super(IsolatedPool, self).__init__(processes, initializer, initargs)
+        self.initializer = initializer
+        self.initargs = initargs
+
+    def imap(self, func, tasks):
+        for task in tasks:
+            self.initializer(*self.initargs)
+            self.tasks.append(task)
+            yield func(task)
+
+
+def dump(items):
+    return [
+        json.dumps(item, sort_keys=True, cls=GestoreEncoder)
+        for item in items
+    ]
+
+
+class TestParallelTraversal(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+        SerialPool.instances = []
+
+    def run_parallel(self, *args, **kwargs):
+        traversal = ParallelTraversal(
+            self.command.process_instance,
+            workers=4,
+            pool_class=SerialPool,
+            **kwargs
+        )
+        return traversal, traversal.run(*args)
+
+    def test_same_objects_as_serial(self):
+        genres = GenreFactory.create_batch(2)
+        instance = BookInstanceFactory.create(
+            book=BookFactory.create(genre=genres)
+        )
+        BookInstanceFactory.create(book=instance.book)
+        BookFactory.create_batch(
+            3, author=instance.book.author, genre=genres[:1]
+        )
+
+        expected = self.command.generate_objects(instance)
+
+        for extract in ('instances', EXTRACT_VALUES):
+            _, objects = self.run_parallel(instance, extract=extract)
+
+            self.assertEqual(len(objects), len(exported_keys(objects)))
+            self.assertEqual(exported_keys(objects), exported_keys(expected))
+            self.assertEqual(sorted(dump(objects)), sorted(dump(expected)))
+
+        pool = SerialPool.instances[-1]
+        self.assertEqual(pool.processes, 4)
+        self.assertTrue(pool.closed)
+
+    def test_tasks_are_partitioned_by_pk_range(self):
+        author = AuthorFactory.create()
+        books = BookFactory.create_batch(5, author=author)
+
+        self.run_parallel(author, batch_size=2)
+
+        book_tasks = [
+            pks for label, pks in SerialPool.instances[0].tasks
+            if label == Book._meta.label
+        ]
+        self.assertEqual(
+            book_tasks,
+            [
+                [books[0].pk, books[1].pk],
+                [books[2].pk, books[3].pk],
+                [books[4].pk],
+            ]
+        )
+
+    def test_deterministic_merge(self):
+        author = AuthorFactory.create()
+        BookFactory.create_batch(5, author=author)
+
+        _, objects = self.run_parallel(author, batch_size=2)
+        _, other_objects = self.run_parallel(author, batch_size=2)
+
+        self.assertEqual(dump(objects), dump(other_objects))
+
+    def test_worker_reports_keys(self):
+        author = AuthorFactory.create()
+        book = BookFactory.create(author=author)
+
+        worker = WorkerTraversal(
+            self.command.process_instance,
+            root_models={'Author'},
+        )
+        objects, keys = worker.process_task(Book._meta.label, [book.pk])
+
+        self.assertEqual([obj['pk'] for obj in objects], [book.pk])
+        self.assertIn((Author._meta.label, author.pk), keys)
+
+    @override_settings(GESTORE_TRAVERSAL={
+        'demoapp.BookInstance': {'policy': 'scan'},
+    })
+    def test_scanned_leaves_are_deduplicated(self):
+        author = AuthorFactory.create()
+        borrower = UserFactory.create()
+        # Instances are discovered through both their book and their
+        # borrower, published the ebook, by tasks of different workers
+        books = BookFactory.create_batch(3, author=author)
+        books.append(EBookFactory.create(author=author, publisher=borrower))
+        for book in books:
+            BookInstanceFactory.create_batch(
+                3,
+                book=book,
+                borrower=borrower
+            )
+
+        expected = self.command.generate_objects(author)
+
+        for extract in ('instances', EXTRACT_VALUES):
+            traversal = ParallelTraversal(
+                self.command.process_instance,
+                workers=2,
+                batch_size=1,
+                extract=extract,
+                pool_class=IsolatedPool,
+            )
+            objects = traversal.run(author)
+
+            self.assertEqual(len(objects), len(exported_keys(objects)))
+            self.assertEqual(sorted(dump(objects)), sorted(dump(expected)))
+
+    def test_fanout_budget(self):
+        author = AuthorFactory.create()
+        BookFactory.create_batch(3, author=author)
+
+        expected = BatchTraversal(
+            self.command.process_instance,
+            budget=TraversalBudget(max_fanout=2, on_exceeded=BUDGET_PRUNE),
+        ).run(author)
+
+        budget = TraversalBudget(max_fanout=2, on_exceeded=BUDGET_PRUNE)
+        _, objects = self.run_parallel(author, budget=budget)
+
+        self.assertEqual(sorted(dump(objects)), sorted(dump(expected)))
+        self.assertNotIn(
+            'demoapp.book',
+            {obj['model'] for obj in objects}
+        )
+        self.assertEqual(len(budget.report), 1)
+
+        with self.assertRaises(BudgetExceeded):
+            self.run_parallel(author, budget=TraversalBudget(max_fanout=2))
+
+    def test_workers_require_bfs(self):
+        author = AuthorFactory.create()
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'exportobjects',
+                'demoapp.Author.%s' % author.pk,
+                '--workers', '2',
+                stdout=StringIO(),
+            )
@@ -0,0 +1,113 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from demoapp.factories.demoapp import AuthorFactory, BookFactory
+from demoapp.models import Author, Book, BookInstance, Genre, Profile
+from gestore.management.commands.exportobjects import Command
+from gestore.plans import FieldPlan, clear_field_plans, get_field_plan
+from gestore.traversal import BatchTraversal
+
+
+def names(fields):
+    return {name for name, _ in fields}
+
+
+class TestFieldPlan(TestCase):
+    def setUp(self):
+        clear_field_plans()
+
+    def test_forward_relations(self):
+        plan = FieldPlan(Book)
+
+        self.assertEqual(names(plan.foreign_keys), {'author', 'language'})
+        self.assertEqual(names(plan.many_to_many), {'genre'})
+        self.assertEqual(
+            names(plan.values),
+            {'title', 'summary', 'isbn'}
+        )
+        self.assertEqual(plan.pk_field, Book._meta.pk)
+
+    def test_reverse_relations(self):
+        self.assertEqual(
+            names(FieldPlan(Author).one_to_many),
+            {'book_set'}
+        )
+        self.assertEqual(
+            names(FieldPlan(Genre).many_to_many),
+            {'book_set'}
+        )
+        self.assertEqual(names(FieldPlan(User).one_to_one), {'profile'})
+        self.assertEqual(names(FieldPlan(Profile).foreign_keys), {'user'})
+
+    def test_uuid_primary_key(self):
+        plan = FieldPlan(BookInstance)
+
+        self.assertEqual(plan.pk_field, BookInstance._meta.pk)
+        self.assertNotIn('id', names(plan.values))
+
+    def test_accessors(self):
+        accessors = FieldPlan(Book).accessors
+
+        self.assertIn('author', accessors)
+        self.assertIn('genre', accessors)
+        self.assertIn('bookinstance_set', accessors)
+        self.assertNotIn('title', accessors)
+
+    def test_get_field_plan_is_cached(self):
+        book = BookFactory.create()
+
+        plan = get_field_plan(Book)
+        self.assertIs(get_field_plan(Book), plan)
+        self.assertIs(get_field_plan(book), plan)
+
+        clear_field_plans()
+        self.assertIsNot(get_field_plan(Book), plan)
+
+    def test_process_instance_builds_plan_once(self):
+        books = BookFactory.create_batch(3)
+        command = Command(stdout=StringIO())
+
+        with patch(
+                'gestore.plans.FieldPlan',
+                wraps=FieldPlan
+        ) as mock_field_plan:
+            for book in books:
+                data, _ = command.process_instance(book)
+                self.assertEqual(data['pk'], book.pk)
+                self.assertEqual(data['fields']['title'], book.title)
+                self.assertEqual(
+                    data['fields']['genre'],
+                    [genre.id for genre in book.genre.all()]
+                )
+
+        self.assertEqual(mock_field_plan.call_count, 1)
+        self.assertEqual(command.errors, [])
+
+    def test_label(self):
+        self.assertEqual(get_field_plan(Book).label, 'demoapp.book')
+        self.assertEqual(get_field_plan(User).label, 'auth.user')
+
+    def test_process_instance_without_content_types(self):
+        # Authors have no generic relations, which need content types
+        authors = AuthorFactory.create_batch(2)
+        command = Command(stdout=StringIO())
+
+        with patch(
+                'django.contrib.contenttypes.models.ContentType.objects'
+                '.get_for_model'
+        ) as mock_get_for_model:
+            for author in authors:
+                data, _ = command.process_instance(author)
+                self.assertEqual(data['model'], 'demoapp.author')
+
+            plan = get_field_plan(Author)
+            for _, data, _ in BatchTraversal.process_rows(
+                    plan,
+                    Author.objects.values_list(*plan.columns)
+            ):
+                self.assertEqual(data['model'], 'demoapp.author')
+
+        self.assertFalse(mock_get_for_model.called)
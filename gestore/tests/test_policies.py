@@ -0,0 +1,174 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+)
+from demoapp.models import Author, Book
+from gestore.management.commands.exportobjects import Command
+from gestore.plans import get_field_plan
+from gestore.policies import FOLLOW, REFERENCE, SKIP, TraversalPolicy
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
+
+
+class TestTraversalPolicy(TestCase):
+    def test_unknown_policy(self):
+        with self.assertRaises(ImproperlyConfigured):
+            TraversalPolicy({'demoapp.Book.author': 'ignore'})
+
+    def test_get_rule(self):
+        policy = TraversalPolicy({
+            'demoapp.Author': 'skip',
+            'demoapp.Language': 'reference',
+            'demoapp.Book.author': {'policy': 'reference'},
+            'demoapp.Author.book_set': {'limit': 2},
+        })
+        author = Book._meta.get_field('author')
+        language = Book._meta.get_field('language')
+        genre = Book._meta.get_field('genre')
+
+        # Relation rules take precedence over model rules
+        self.assertEqual(
+            policy.get_rule(Book, 'author', author),
+            (REFERENCE, None)
+        )
+        self.assertEqual(
+            policy.get_rule(Book, 'language', language),
+            (REFERENCE, None)
+        )
+        self.assertEqual(
+            policy.get_rule(Book, 'genre', genre),
+            (FOLLOW, None)
+        )
+        self.assertEqual(
+            policy.get_rule(
+                Author,
+                'book_set',
+                Author._meta.get_field('book'),
+            ),
+            (FOLLOW, 2)
+        )
+
+    def test_apply(self):
+        policy = TraversalPolicy({
+            'demoapp.Book.author': REFERENCE,
+            'demoapp.Book.bookinstance_set': REFERENCE,
+            'demoapp.Book.language': SKIP,
+        })
+        plan = policy.apply(get_field_plan(Book))
+
+        self.assertIn('author', plan.accessors)
+        self.assertEqual(plan.references, {Book._meta.get_field('author')})
+
+        # Reverse relations have nothing to reference
+        self.assertNotIn('bookinstance_set', plan.accessors)
+        self.assertNotIn('language', plan.accessors)
+
+        # The cached plan is left untouched
+        self.assertIn('language', get_field_plan(Book).accessors)
+        self.assertEqual(get_field_plan(Book).references, set())
+
+    def test_apply_without_rules(self):
+        plan = get_field_plan(Book)
+        self.assertIs(TraversalPolicy().apply(plan), plan)
+
+
+class TestPolicyExport(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+    def export(self, *args):
+        """
+        Exports the given objects with all traversals, which must agree.
+        """
+        expected = self.command.generate_objects(*args)
+        keys = sorted((obj['model'], obj['pk']) for obj in expected)
+
+        for extract in ('instances', EXTRACT_VALUES):
+            objects = BatchTraversal(
+                self.command.process_instance,
+                batch_size=1,
+                chunk_size=1,
+                extract=extract,
+            ).run(*args)
+
+            self.assertEqual(
+                sorted((obj['model'], obj['pk']) for obj in objects),
+                keys
+            )
+
+        return expected
+
+    @override_settings(GESTORE_TRAVERSAL={
+        'demoapp.Book.author': 'reference',
+    })
+    def test_reference(self):
+        instance = BookInstanceFactory.create()
+        objects = self.export(instance)
+
+        books = [obj for obj in objects if obj['model'] == 'demoapp.book']
+        self.assertEqual(len(books), 1)
+        self.assertEqual(
+            books[0]['fields']['author'],
+            instance.book.author_id
+        )
+        self.assertNotIn(
+            'demoapp.author',
+            {obj['model'] for obj in objects}
+        )
+
+    @override_settings(GESTORE_TRAVERSAL={
+        'demoapp.Book.bookinstance_set': 'skip',
+    })
+    def test_skip(self):
+        instance = BookInstanceFactory.create()
+        other_instance = BookInstanceFactory.create(book=instance.book)
+
+        with patch(
+                'gestore.processors.process_one_to_many_relation',
+                wraps=lambda *args, **kwargs: []
+        ) as mock_one_to_many:
+            self.command.process_instance(instance.book)
+
+        self.assertNotIn(
+            'bookinstance_set',
+            [
+                field.get_accessor_name()
+                for (_, field), _ in mock_one_to_many.call_args_list
+            ]
+        )
+
+        objects = self.export(instance)
+        self.assertNotIn(
+            ('demoapp.bookinstance', other_instance.pk),
+            {(obj['model'], obj['pk']) for obj in objects}
+        )
+
+    @override_settings(GESTORE_TRAVERSAL={
+        'demoapp.Author.book_set': {'limit': 2},
+    })
+    def test_limit(self):
+        authors = AuthorFactory.create_batch(2)
+        for author in authors:
+            BookFactory.create_batch(3, author=author)
+
+        objects = self.export(*authors)
+        books = sorted(
+            obj['pk'] for obj in objects if obj['model'] == 'demoapp.book'
+        )
+
+        self.assertEqual(
+            books,
+            sorted(
+                pk
+                for author in authors
+                for pk in author.book_set.order_by(
+                    'pk'
+                ).values_list('pk', flat=True)[:2]
+            )
+        )
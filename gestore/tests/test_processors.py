@@ -1,22 +1,49 @@
+from io import StringIO
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from demoapp.factories.demoapp import BookFactory, GenreFactory
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+    GenreFactory,
+)
 from demoapp.factories.django import UserFactory
 from demoapp.models import Author, Book, Genre, Profile
 from gestore import processors
+from gestore.closure import ClosureTraversal, UnsupportedClosure
+from gestore.management.commands.exportobjects import Command
+from gestore.plans import clear_field_plans, get_field_plan
+from gestore.tests.test_closure import dump
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
 
 
 class TestProcessors(TestCase):
     def test_process_foreign_key(self):
         book = BookFactory.create()
-        value, item = processors.process_foreign_key(book, Book.author.field)
+        book = Book.objects.get(pk=book.pk)
+
+        with CaptureQueriesContext(connection) as context:
+            value, item = processors.process_foreign_key(
+                book, Book.author.field
+            )
 
         # Value returned must equal the ID of the object in the instance
-        self.assertEqual(value, book.author.id)
+        self.assertEqual(value, book.author_id)
+
+        # Item returned must be the key of the object pointed at, read from
+        # the column without fetching the object
+        self.assertEqual(item, (Author, book.author_id))
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_process_foreign_key_null(self):
+        book = BookFactory.create(author=None)
+        value, item = processors.process_foreign_key(book, Book.author.field)
 
-        # Item returned must equal the field itself
-        self.assertEqual(item, book.author)
+        self.assertIsNone(value)
+        self.assertIsNone(item)
 
     def test_process_one_to_many_relation(self):
         book = BookFactory.create()
@@ -36,6 +63,97 @@ class TestProcessors(TestCase):
         self.assertEqual(len(to_process), 1)
         self.assertEqual(to_process[0], book)
 
+    def test_process_one_to_many_relation_chunked(self):
+        author = AuthorFactory.create()
+        books = BookFactory.create_batch(5, author=author)
+
+        with CaptureQueriesContext(connection) as context:
+            to_process = list(processors.process_one_to_many_relation(
+                author, author._meta.get_field('book'), chunk_size=2
+            ))
+
+        # 3 chunks: [2, 2, 1] objects
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertEqual(to_process, sorted(books, key=lambda b: b.pk))
+
+    def test_iter_keyset(self):
+        books = BookFactory.create_batch(4)
+
+        with CaptureQueriesContext(connection) as context:
+            chunks = list(processors.iter_keyset(Book.objects.all(), 2))
+
+        self.assertEqual(
+            [[book.pk for book in chunk] for chunk in chunks],
+            [[books[0].pk, books[1].pk], [books[2].pk, books[3].pk]]
+        )
+
+        # Default `title, author` ordering is replaced by the primary key
+        sql = context.captured_queries[0]['sql']
+        self.assertNotIn('"title" ASC', sql)
+        self.assertNotIn('JOIN', sql)
+        self.assertIn('ORDER BY "demoapp_book"."id" ASC', sql)
+
+        # The last chunk is full, so one more query is needed to make sure
+        # there's nothing left
+        self.assertEqual(len(context.captured_queries), 3)
+
+    def test_iter_keyset_values(self):
+        books = BookFactory.create_batch(3)
+
+        chunks = list(processors.iter_keyset(
+            Book.objects.values_list('id', 'title'),
+            2,
+            get_pk=lambda row: row[0]
+        ))
+
+        self.assertEqual(chunks, [
+            [(books[0].pk, books[0].title), (books[1].pk, books[1].title)],
+            [(books[2].pk, books[2].title)],
+        ])
+
+    def test_process_foreign_key_batch(self):
+        author = AuthorFactory.create()
+        books = BookFactory.create_batch(2, author=author) + [
+            BookFactory.create(),
+            BookFactory.create(author=None),
+        ]
+
+        with CaptureQueriesContext(connection) as context:
+            keys = processors.process_foreign_key_batch(
+                books, Book.author.field
+            )
+
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(
+            sorted(keys, key=lambda key: key[1]),
+            [(Author, author.pk), (Author, books[2].author_id)]
+        )
+
+    def test_iter_keyset_empty(self):
+        chunks = processors.iter_keyset(Book.objects.all(), 2)
+        self.assertEqual(list(chunks), [])
+
+    def test_iter_keyset_bad_chunk_size(self):
+        for chunk_size in (0, -5):
+            with self.assertRaises(ValueError):
+                list(processors.iter_keyset(Book.objects.all(), chunk_size))
+
+    def test_stream_one_to_many_relation(self):
+        authors = AuthorFactory.create_batch(2)
+        books = BookFactory.create_batch(2, author=authors[0]) \
+            + BookFactory.create_batch(3, author=authors[1])
+        BookFactory.create()
+
+        chunks = list(processors.stream_one_to_many_relation(
+            authors, Author._meta.get_field('book'), chunk_size=4
+        ))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 1])
+        self.assertEqual(
+            [book for chunk in chunks for book in chunk],
+            sorted(books, key=lambda b: b.pk)
+        )
+
     def test_process_one_to_one_relation_exists(self):
         user = UserFactory.create()
         profile = user.profile
@@ -52,48 +170,169 @@ class TestProcessors(TestCase):
         # The object must equal the one it's connected to
         self.assertEqual(items[0], user)
 
-    def test_process_many_to_many_relation(self):
-        book1 = BookFactory.create()
+    def test_process_many_to_many_batch(self):
+        genres = GenreFactory.create_batch(2)
+        books = [
+            BookFactory.create(genre=genres),
+            BookFactory.create(genre=genres[:1]),
+        ]
+
+        with CaptureQueriesContext(connection) as context:
+            data, keys = processors.process_many_to_many_batch(
+                books, Book.genre.field
+            )
 
-        self.assertEqual(Book.objects.count(), 1)
-        self.assertEqual(Genre.objects.count(), 1)
+        # Pairs are read from the through table only
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn('"demoapp_genre"', context.captured_queries[0]['sql'])
 
-        genre = Genre.objects.first()
-        data, to_process = processors.process_many_to_many_relation(
-            book1, Book.genre.field
+        self.assertEqual(data, {
+            books[0].pk: [genres[0].pk, genres[1].pk],
+            books[1].pk: [genres[0].pk],
+        })
+        self.assertEqual(
+            sorted(keys, key=lambda k: k[1]),
+            [(Genre, genres[0].pk), (Genre, genres[1].pk)]
         )
 
-        # data and to_process are list
-        self.assertEqual(type(data), list)
-        self.assertEqual(type(to_process), list)
+    def test_process_many_to_many_batch_other_end(self):
+        genres = GenreFactory.create_batch(2)
+        books = [
+            BookFactory.create(genre=genres[:1]),
+            BookFactory.create(genre=genres[:1]),
+        ]
 
-        # Must have one item with book id
-        self.assertEqual(len(data), 1)
-        self.assertEqual(data[0], book1.id)
+        data, keys = processors.process_many_to_many_batch(
+            genres, Genre._meta.get_field('book')
+        )
+
+        self.assertEqual(data, {
+            genres[0].pk: [books[0].pk, books[1].pk],
+            genres[1].pk: [],
+        })
+        self.assertEqual(
+            sorted(keys, key=lambda k: k[1]),
+            [(Book, books[0].pk), (Book, books[1].pk)]
+        )
 
-        # Must get one item to process, and it's Genre on the other end
-        self.assertEqual(len(to_process), 1)
-        self.assertEqual(to_process[0], genre)
 
-    def test_process_many_to_many_relation_other_end(self):
-        genre = GenreFactory.create()
-        books = {
-            BookFactory.create(genre=[genre]),
-            BookFactory.create(genre=[genre])
-        }
+class CountingProcessor(processors.ForeignKeyProcessor):
+    def __init__(self):
+        self.batches = []
+
+    def process_batch(self, model, pks, field, **kwargs):
+        self.batches.append((model, field.name, len(pks)))
+        return super(CountingProcessor, self).process_batch(
+            model, pks, field, **kwargs
+        )
 
-        self.assertEqual(Book.objects.count(), len(books))
-        self.assertEqual(Genre.objects.count(), 1)
 
-        data, to_process = processors.process_many_to_many_relation(
-            genre, Genre._meta.get_field('book')
+class TestBatchProcessors(TestCase):
+    def setUp(self):
+        self.author = AuthorFactory.create()
+        self.genres = GenreFactory.create_batch(2)
+        self.books = BookFactory.create_batch(
+            3,
+            author=self.author,
+            genre=self.genres
         )
+        self.pks = [book.pk for book in self.books]
+
+    def register(self, processor):
+        processors.register_processor(processor)
+        clear_field_plans()
+
+        self.addCleanup(clear_field_plans)
+        self.addCleanup(processors.unregister_processor, processor)
 
-        # No data shall be returned on the other end
-        self.assertIsNone(data)
+    def test_get_processor(self):
+        self.assertIsInstance(
+            processors.get_processor(Book._meta.get_field('author')),
+            processors.ForeignKeyProcessor
+        )
+        # OneToOneFields are ForeignKeys
+        self.assertIsInstance(
+            processors.get_processor(Profile._meta.get_field('user')),
+            processors.ForeignKeyProcessor
+        )
+        self.assertIsNone(
+            processors.get_processor(Book._meta.get_field('title'))
+        )
+
+    def test_builtin_processors_from_keys(self):
+        field = Book._meta.get_field('author')
+        values, keys = processors.get_processor(field).process_batch(
+            Book, self.pks, field
+        )
+        self.assertEqual(values, {pk: self.author.pk for pk in self.pks})
+        self.assertEqual(keys, [(Author, self.author.pk)])
+
+        field = Book._meta.get_field('genre')
+        values, keys = processors.get_processor(field).process_batch(
+            Book, self.pks, field
+        )
+        self.assertEqual(values, {
+            pk: [genre.pk for genre in self.genres] for pk in self.pks
+        })
 
-        # Must return all books using this genre to be processed
-        self.assertEqual(len(to_process), len(books))
-        for obj in to_process:
-            if obj not in books:
-                raise AssertionError('obj with %s not in list' % obj.id)
+        field = Author._meta.get_field('book')
+        with CaptureQueriesContext(connection) as context:
+            values, keys = processors.get_processor(field).process_batch(
+                Author, [self.author.pk], field
+            )
+
+        self.assertIsNone(values)
+        self.assertEqual(
+            sorted(keys, key=lambda k: k[1]),
+            [(Book, pk) for pk in sorted(self.pks)]
+        )
+        self.assertEqual(len(context.captured_queries), 2)
+
+    def test_custom_processor(self):
+        for book in self.books:
+            BookInstanceFactory.create(book=book)
+
+        processor = CountingProcessor()
+        self.register(processor)
+
+        plan = get_field_plan(Book)
+        self.assertIn(('author', Book.author.field), plan.custom)
+        self.assertNotIn(('author', Book.author.field), plan.foreign_keys)
+
+        command = Command(stdout=StringIO())
+        expected = command.generate_objects(self.author)
+
+        for extract in ('instances', EXTRACT_VALUES):
+            processor.batches = []
+            objects = BatchTraversal(
+                command.process_instance,
+                extract=extract,
+            ).run(self.author)
+
+            self.assertEqual(dump(objects), dump(expected))
+            # Once per batch, not per object
+            self.assertIn((Book, 'author', 3), processor.batches)
+            self.assertIn((Book, 'language', 3), processor.batches)
+
+    def test_custom_processor_closure(self):
+        self.register(CountingProcessor())
+
+        with self.assertRaises(UnsupportedClosure):
+            ClosureTraversal(
+                Command(stdout=StringIO()).process_instance
+            ).run(self.author)
+
+    def test_unregister_processor(self):
+        processor = CountingProcessor()
+        processors.register_processor(processor)
+        processors.unregister_processor(processor)
+
+        self.assertIs(
+            processors.get_processor(Book.author.field),
+            processors.get_processor(Book.language.field)
+        )
+        self.assertIsNot(
+            processors.get_processor(Book.author.field),
+            processor
+        )
+        self.assertFalse(processors.has_custom_processor(Book.author.field))
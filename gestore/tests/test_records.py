@@ -0,0 +1,141 @@
+import json
+import pickle
+import tracemalloc
+from io import StringIO
+
+from django.test import SimpleTestCase, TestCase
+
+from demoapp.factories.demoapp import BookFactory
+from gestore.encoders import GestoreEncoder
+from gestore.management.commands.exportobjects import Command
+from gestore.plans import get_field_plan
+from gestore.records import ExportRecord, get_layout
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
+
+NAMES = (
+    'title',
+    'summary',
+    'isbn',
+    'author',
+    'language',
+    'genre',
+    'published',
+    'pages',
+)
+
+
+class TestExportRecord(SimpleTestCase):
+    def setUp(self):
+        self.layout = get_layout('demoapp.book', NAMES)
+
+    def test_reads_like_a_dict(self):
+        record = ExportRecord(self.layout)
+        record['fields']['title'] = 'Dune'
+        record['fields']['genre'] = [1, 2]
+
+        self.assertEqual(record['model'], 'demoapp.book')
+        self.assertIsNone(record.get('pk'))
+        self.assertNotIn('pk', record)
+        self.assertEqual(set(record['fields']), {'title', 'genre'})
+        self.assertNotIn('isbn', record['fields'])
+
+        record['pk'] = 1
+        self.assertEqual(record.to_dict(), {
+            'model': 'demoapp.book',
+            'pk': 1,
+            'fields': {'title': 'Dune', 'genre': [1, 2]},
+        })
+        self.assertEqual(record, record.to_dict())
+
+    def test_unknown_field(self):
+        record = ExportRecord(self.layout)
+        record['fields']['extra'] = 1
+
+        self.assertEqual(dict(record['fields']), {'extra': 1})
+        # Other records keep the shared layout
+        self.assertIs(ExportRecord(self.layout).layout, self.layout)
+
+    def test_shared_layouts(self):
+        self.assertIs(get_layout('demoapp.book', NAMES), self.layout)
+
+        record = ExportRecord.from_values(self.layout, list(NAMES), pk=1)
+        copy = pickle.loads(pickle.dumps(record))
+
+        self.assertEqual(copy, record)
+        self.assertIs(copy.layout, self.layout)
+
+    def test_pickle_partial_record(self):
+        record = ExportRecord(self.layout)
+        record['fields']['title'] = 'Dune'
+
+        copy = pickle.loads(pickle.dumps(record))
+
+        self.assertNotIn('pk', copy)
+        self.assertEqual(dict(copy['fields']), {'title': 'Dune'})
+        self.assertEqual(
+            json.loads(json.dumps(copy, cls=GestoreEncoder)),
+            {'model': 'demoapp.book', 'fields': {'title': 'Dune'}}
+        )
+
+    def test_json(self):
+        record = ExportRecord(self.layout, pk=1)
+        record['fields']['title'] = 'Dune'
+
+        self.assertEqual(
+            json.loads(json.dumps([record], cls=GestoreEncoder)),
+            [{'model': 'demoapp.book', 'pk': 1, 'fields': {'title': 'Dune'}}]
+        )
+
+    def test_memory_per_row(self):
+        """
+        Records must take less than half the memory per row of
+        the dictionaries they replace, their values aside.
+        """
+        rows = 10000
+        values = list(range(len(NAMES)))
+
+        def measure(build):
+            tracemalloc.start()
+            try:
+                items = [build(pk) for pk in range(rows)]
+                size, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            self.assertEqual(len(items), rows)
+            return size / rows
+
+        dict_bytes = measure(lambda pk: {
+            'model': 'demoapp.book',
+            'pk': pk,
+            'fields': dict(zip(NAMES, values)),
+        })
+        record_bytes = measure(lambda pk: ExportRecord.from_values(
+            self.layout,
+            list(values),
+            pk=pk
+        ))
+
+        self.assertLess(record_bytes, dict_bytes / 2)
+
+
+class TestExportedRecords(TestCase):
+    def test_same_records(self):
+        book = BookFactory.create()
+        command = Command(stdout=StringIO())
+
+        expected = command.generate_objects(book)
+        objects = BatchTraversal(
+            command.process_instance,
+            extract=EXTRACT_VALUES,
+        ).run(book)
+
+        for obj in objects + expected:
+            self.assertIsInstance(obj, ExportRecord)
+
+        record, = [obj for obj in objects if obj['model'] == 'demoapp.book']
+        self.assertIs(record.layout, get_field_plan(book).layout)
+        self.assertEqual(
+            sorted(objects, key=repr),
+            sorted(expected, key=repr)
+        )
@@ -0,0 +1,170 @@
+import json
+from collections import Counter
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+    LanguageFactory,
+)
+from demoapp.models import Book
+from gestore.management.commands.exportobjects import Command
+from gestore.sampling import (
+    SAMPLE_STRATIFIED,
+    SAMPLE_STRIDE,
+    Sample,
+)
+
+
+class TestSample(TestCase):
+    def setUp(self):
+        languages = LanguageFactory.create_batch(2)
+        self.books = BookFactory.create_batch(8, language=languages[0])
+        self.books += BookFactory.create_batch(4, language=languages[1])
+        self.pks = sorted(book.pk for book in self.books)
+
+    def test_size(self):
+        sample = Sample(Book.objects.all(), size=5)
+        keys = sample.get_keys()
+
+        self.assertEqual(len(keys), 5)
+        self.assertEqual(keys, sorted(set(keys)))
+        self.assertTrue(set(keys).issubset(self.pks))
+
+        self.assertEqual(
+            len(Sample(Book.objects.all(), size=50).get_keys()),
+            12
+        )
+
+    def test_percent(self):
+        self.assertEqual(
+            len(Sample(Book.objects.all(), percent=25).get_keys()),
+            3
+        )
+        # Rounded up, a sample is never empty
+        self.assertEqual(
+            len(Sample(Book.objects.all(), percent=1).get_keys()),
+            1
+        )
+
+    def test_seed(self):
+        self.assertEqual(
+            Sample(Book.objects.all(), size=4, seed=1).get_keys(),
+            Sample(Book.objects.all(), size=4, seed=1).get_keys()
+        )
+
+    def test_stride(self):
+        sample = Sample(Book.objects.all(), size=4, method=SAMPLE_STRIDE)
+
+        self.assertEqual(sample.get_keys(), self.pks[::3])
+
+    def test_stratified(self):
+        sample = Sample(
+            Book.objects.all(),
+            size=6,
+            method=SAMPLE_STRATIFIED,
+            stratify_by='language',
+        )
+
+        self.assertEqual(
+            Counter(
+                Book.objects.filter(
+                    pk__in=sample.get_keys()
+                ).values_list('language', flat=True)
+            ),
+            {self.books[0].language_id: 4, self.books[-1].language_id: 2}
+        )
+
+    @patch('gestore.sampling.KEYSET_WINDOW', 3)
+    def test_get_keys_at(self):
+        queryset = Book.objects.order_by('pk')
+        with CaptureQueriesContext(connection) as context:
+            keys = Sample.get_keys_at(queryset, [0, 2, 7, 11])
+
+        self.assertEqual(
+            keys,
+            [self.pks[0], self.pks[2], self.pks[7], self.pks[11]]
+        )
+        # Positions 0 and 2 are read together, the others one by one
+        self.assertEqual(len(context.captured_queries), 3)
+
+        # Positions past the end are left out
+        self.assertEqual(
+            Sample.get_keys_at(queryset, [10, 12]),
+            [self.pks[10]]
+        )
+
+    def test_allocate(self):
+        self.assertEqual(
+            Sample.allocate({'a': 5, 'b': 3, 'c': 2}, 5),
+            {'a': 3, 'b': 1, 'c': 1}
+        )
+        self.assertEqual(Sample.allocate({'a': 0}, 0), {'a': 0})
+
+    def test_from_str(self):
+        sample = Sample.from_str('demoapp.Book:10%')
+        self.assertEqual(sample.queryset.model, Book)
+        self.assertEqual(sample.percent, 10)
+
+        self.assertEqual(Sample.from_str('demoapp.Book:3').size, 3)
+
+        for sample_rep in (
+                'demoapp.Book',
+                'demoapp.Book:0',
+                'demoapp.Book:150%',
+                'demoapp.Unknown:3',
+        ):
+            with self.assertRaises((LookupError, ValueError)):
+                Sample.from_str(sample_rep)
+
+        with self.assertRaises(ValueError):
+            Sample.from_str('demoapp.Book:3', method=SAMPLE_STRATIFIED)
+
+
+@patch.object(Command, 'write_exports_file')
+@patch.object(Command, 'check_migrations')
+class TestSampleOption(TestCase):
+    def setUp(self):
+        self.author = AuthorFactory.create()
+        for book in BookFactory.create_batch(6, author=self.author):
+            BookInstanceFactory.create_batch(3, book=book)
+
+    def export(self, *args):
+        call_command('exportobjects', *args, stdout=StringIO())
+
+    def get_exported_objects(self, mock_write_exports_file):
+        _, output = mock_write_exports_file.call_args[0]
+        return json.loads(output)['objects']
+
+    def test_sample(self, mock_check, mock_write_exports_file):
+        for strategy in ('dfs', 'bfs'):
+            self.export(
+                '--sample', 'demoapp.Book:50%',
+                '--seed', '1',
+                '--max-children', '2',
+                '--strategy', strategy,
+            )
+            counts = Counter(
+                obj['model'] for obj in
+                self.get_exported_objects(mock_write_exports_file)
+            )
+
+            # Books are root objects, the author they share is exported once
+            self.assertEqual(counts['demoapp.book'], 3)
+            self.assertEqual(counts['demoapp.author'], 1)
+            self.assertEqual(counts['demoapp.bookinstance'], 6)
+
+    def test_bad_sample(self, mock_check, mock_write_exports_file):
+        with self.assertRaises(CommandError):
+            self.export(
+                '--sample', 'demoapp.Book:3',
+                '--sample-method', 'stratified',
+                '--stratify-by', 'unknown',
+            )
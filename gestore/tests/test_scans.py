@@ -0,0 +1,154 @@
+import datetime
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from demoapp.factories.demoapp import BookFactory, BookInstanceFactory
+from demoapp.models import BookInstance
+from gestore.closure import ClosureTraversal, UnsupportedClosure
+from gestore.management.commands.exportobjects import Command
+from gestore.policies import TraversalPolicy
+from gestore.scans import RangeScan
+from gestore.tests.test_closure import dump
+from gestore.tests.test_traversal import exported_keys
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal
+
+SCANNED_INSTANCES = {
+    'demoapp.BookInstance': {
+        'policy': 'scan',
+        'order_by': 'due_back',
+        'since': '2020-01-01',
+        'until': '2021-01-01',
+    },
+}
+
+
+@override_settings(GESTORE_TRAVERSAL=SCANNED_INSTANCES)
+class TestRangeScan(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+        self.books = BookFactory.create_batch(2)
+
+        self.instances = []
+        self.old_instances = []
+        for book in self.books:
+            for month in (3, 1, 2):
+                self.instances.append(BookInstanceFactory.create(
+                    book=book,
+                    due_back=datetime.date(2020, month, 1),
+                ))
+
+            self.old_instances.append(BookInstanceFactory.create(
+                book=book,
+                due_back=datetime.date(2019, 12, 31),
+            ))
+
+    def test_time_window(self):
+        keys = exported_keys(self.command.generate_objects(*self.books))
+
+        for instance in self.instances:
+            self.assertIn(('demoapp.bookinstance', str(instance.pk)), keys)
+        for instance in self.old_instances:
+            self.assertNotIn(
+                ('demoapp.bookinstance', str(instance.pk)),
+                keys
+            )
+
+    def test_leaves(self):
+        objects = self.command.generate_objects(*self.books)
+        instance = next(
+            obj for obj in objects if obj['model'] == 'demoapp.bookinstance'
+        )
+
+        # Borrowers are referenced only
+        self.assertIsNotNone(instance['fields']['borrower'])
+        self.assertNotIn('auth.user', {obj['model'] for obj in objects})
+
+    def test_same_objects_as_dfs(self):
+        expected = self.command.generate_objects(*self.books)
+
+        for extract in ('instances', EXTRACT_VALUES):
+            objects = BatchTraversal(
+                self.command.process_instance,
+                extract=extract,
+            ).run(*self.books)
+
+            self.assertEqual(dump(objects), dump(expected))
+
+    def test_single_ordered_query(self):
+        with CaptureQueriesContext(connection) as context:
+            BatchTraversal(
+                self.command.process_instance,
+                extract=EXTRACT_VALUES,
+            ).run(*self.books)
+
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if 'FROM "demoapp_bookinstance"' in query['sql']
+            and 'LIMIT 1' not in query['sql']
+        ]
+        self.assertEqual(len(queries), 1)
+        self.assertIn(
+            'ORDER BY "demoapp_bookinstance"."book_id" ASC, '
+            '"demoapp_bookinstance"."due_back" ASC',
+            queries[0]
+        )
+
+    def test_limit(self):
+        with self.settings(GESTORE_TRAVERSAL={
+                'demoapp.BookInstance': dict(
+                    SCANNED_INSTANCES['demoapp.BookInstance'],
+                    limit=2
+                ),
+        }):
+            expected = self.command.generate_objects(self.books[0])
+            objects = BatchTraversal(
+                Command(stdout=StringIO()).process_instance,
+            ).run(self.books[0])
+
+        # The first ones along the scan
+        self.assertEqual(
+            {
+                obj['fields']['due_back'] for obj in expected
+                if obj['model'] == 'demoapp.bookinstance'
+            },
+            {datetime.date(2020, 1, 1), datetime.date(2020, 2, 1)}
+        )
+        self.assertEqual(dump(objects), dump(expected))
+
+    def test_closure_is_unsupported(self):
+        with self.assertRaises(UnsupportedClosure):
+            ClosureTraversal(self.command.process_instance).run(
+                self.books[0]
+            )
+
+
+class TestRangeScanRules(TestCase):
+    def test_relative_bounds(self):
+        scan = RangeScan(
+            BookInstance,
+            order_by='due_back',
+            since=datetime.timedelta(days=30)
+        )
+
+        self.assertEqual(
+            scan.get_bound(scan.since),
+            (timezone.now() - datetime.timedelta(days=30)).date()
+        )
+
+    def test_invalid_rules(self):
+        for rule in (
+                {'demoapp.Book.bookinstance_set': {'policy': 'scan'}},
+                {'demoapp.BookInstance': {
+                    'policy': 'scan', 'order_by': 'unknown',
+                }},
+                {'demoapp.BookInstance': {
+                    'policy': 'scan', 'since': '2020-01-01',
+                }},
+        ):
+            with self.assertRaises(ImproperlyConfigured):
+                TraversalPolicy(rule)
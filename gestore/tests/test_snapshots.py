@@ -0,0 +1,124 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from demoapp.models import Author, Book, BookInstance, Genre
+from gestore.management.commands.exportobjects import Command
+from gestore.snapshots import UnsupportedSnapshot, snapshot
+
+
+class TestSnapshot(TransactionTestCase):
+    def test_statement(self):
+        with patch.dict(
+                'gestore.snapshots.SNAPSHOT_STATEMENTS',
+                {'sqlite': 'SELECT 1'}
+        ):
+            with CaptureQueriesContext(connection) as context:
+                with snapshot():
+                    self.assertTrue(connection.in_atomic_block)
+                    Author.objects.create(first_name='A', last_name='B')
+
+        # Runs first thing in the transaction
+        self.assertEqual(
+            [query['sql'] for query in context.captured_queries[:2]],
+            ['BEGIN', 'SELECT 1']
+        )
+
+        # Nothing is written
+        self.assertFalse(Author.objects.exists())
+
+    def test_unsupported(self):
+        with patch.object(connection, 'vendor', 'postgresql'):
+            with transaction.atomic():
+                with self.assertRaises(UnsupportedSnapshot):
+                    with snapshot():
+                        pass
+
+        with patch.object(connection, 'vendor', 'something'):
+            with self.assertRaises(UnsupportedSnapshot):
+                with snapshot():
+                    pass
+
+
+# The replica mirrors the default database in tests, its own connection only
+# sees committed objects
+class TestDatabaseOption(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.out = StringIO()
+
+        genre = Genre.objects.create(name='Satire')
+        self.author = Author.objects.create(
+            first_name='Jonathan',
+            last_name='Swift',
+        )
+        self.books = [
+            Book.objects.create(
+                title=title,
+                author=self.author,
+                summary='',
+                isbn=isbn,
+            )
+            for title, isbn in (
+                ('A Modest Proposal', '1'),
+                ('Gulliver\'s Travels', '2'),
+            )
+        ]
+        for book in self.books:
+            book.genre.add(genre)
+            BookInstance.objects.create(
+                book=book,
+                imprint='First',
+            )
+
+    def export(self, *args):
+        with patch.object(Command, 'write_exports_file') as mock_write:
+            call_command(
+                'exportobjects',
+                'demoapp.Author.%s' % self.author.pk,
+                '--database', 'replica',
+                *args,
+                stdout=self.out
+            )
+
+        _, output = mock_write.call_args[0]
+        return sorted(
+            (obj['model'], str(obj['pk']))
+            for obj in json.loads(output)['objects']
+        )
+
+    def test_export_from_replica(self):
+        expected = self.export()
+        self.assertEqual(len(expected), 6)
+
+        for args in (
+                ('--strategy', 'bfs'),
+                ('--strategy', 'bfs', '--extract', 'values'),
+                ('--strategy', 'cte'),
+                ('--snapshot', ),
+        ):
+            self.assertEqual(self.export(*args), expected)
+
+    def test_reads_from_replica_only(self):
+        with CaptureQueriesContext(connection) as context, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            self.export('--snapshot', '--strategy', 'bfs')
+
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'demoapp_' in query['sql']
+        ])
+        self.assertTrue([
+            query for query in replica.captured_queries
+            if 'demoapp_' in query['sql']
+        ])
+
+    def test_snapshot_requires_a_single_connection(self):
+        with self.assertRaises(CommandError):
+            self.export('--snapshot', '--strategy', 'bfs', '--workers', '2')
@@ -0,0 +1,281 @@
+import json
+import threading
+from io import StringIO
+from unittest.mock import patch
+
+from django.db import connection
+from django.db.models.signals import post_init
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from demoapp.factories.demoapp import (
+    AuthorFactory,
+    BookFactory,
+    BookInstanceFactory,
+    GenreFactory,
+)
+from demoapp.models import Book
+from gestore.batching import BatchSizeController
+from gestore.encoders import GestoreEncoder
+from gestore.management.commands.exportobjects import Command
+from gestore.processors import ManyToManyProcessor
+from gestore.traversal import EXTRACT_VALUES, BatchTraversal, chunks
+
+
+def exported_keys(objects):
+    return {(obj['model'], str(obj.get('pk'))) for obj in objects}
+
+
+class TestBatchTraversal(TestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+
+    def export_author(self, author):
+        traversal = BatchTraversal(self.command.process_instance)
+        with CaptureQueriesContext(connection) as context:
+            objects = traversal.run(author)
+
+        return objects, len(context.captured_queries)
+
+    def test_chunks(self):
+        self.assertEqual(
+            list(chunks([1, 2, 3, 4, 5], 2)),
+            [[1, 2], [3, 4], [5]]
+        )
+        self.assertEqual(list(chunks([], 2)), [])
+
+    def test_same_objects_as_dfs(self):
+        instance = BookInstanceFactory.create()
+        BookInstanceFactory.create(book=instance.book)
+
+        dfs_objects = self.command.generate_objects(instance)
+        bfs_objects = BatchTraversal(
+            self.command.process_instance
+        ).run(instance)
+
+        self.assertEqual(len(bfs_objects), len(exported_keys(bfs_objects)))
+        self.assertEqual(
+            exported_keys(bfs_objects),
+            exported_keys(dfs_objects)
+        )
+
+    def test_root_models_are_not_processed(self):
+        instance = BookInstanceFactory.create()
+        other_instance = BookInstanceFactory.create(book=instance.book)
+
+        objects = BatchTraversal(
+            self.command.process_instance,
+            root_models=['Author'],
+        ).run(instance)
+        keys = exported_keys(objects)
+
+        self.assertIn(('demoapp.bookinstance', str(instance.pk)), keys)
+        self.assertNotIn(
+            ('demoapp.bookinstance', str(other_instance.pk)),
+            keys
+        )
+        self.assertNotIn('demoapp.author', {model for model, _ in keys})
+
+    def test_queries_do_not_scale_with_objects(self):
+        """
+        Doubling the number of books an author has must not change the number
+        of queries used to export that author.
+        """
+        author = AuthorFactory.create()
+        BookFactory.create_batch(3, author=author)
+        objects, queries = self.export_author(author)
+
+        other_author = AuthorFactory.create()
+        BookFactory.create_batch(6, author=other_author)
+        other_objects, other_queries = self.export_author(other_author)
+
+        self.assertEqual(Book.objects.filter(author=other_author).count(), 6)
+        self.assertGreater(len(other_objects), len(objects))
+        self.assertEqual(queries, other_queries)
+
+    def test_many_to_many_values(self):
+        genres = GenreFactory.create_batch(2)
+        book = BookFactory.create(genre=genres)
+        BookFactory.create(genre=genres[:1], author=book.author)
+        instance = BookInstanceFactory.create(book=book)
+
+        objects = BatchTraversal(self.command.process_instance).run(instance)
+        books = {
+            obj['pk']: obj for obj in objects if obj['model'] == 'demoapp.book'
+        }
+
+        self.assertEqual(len(books), 2)
+        self.assertEqual(
+            books[book.pk]['fields']['genre'],
+            [genre.pk for genre in genres]
+        )
+
+        # Shared genres are exported once
+        exported_genres = [
+            obj['pk'] for obj in objects if obj['model'] == 'demoapp.genre'
+        ]
+        self.assertEqual(
+            sorted(exported_genres),
+            [genre.pk for genre in genres]
+        )
+
+    def test_values_extraction(self):
+        instance = BookInstanceFactory.create()
+        BookInstanceFactory.create(book=instance.book)
+        BookFactory.create(author=instance.book.author)
+
+        expected = BatchTraversal(self.command.process_instance).run(instance)
+
+        initialized = []
+
+        def count_init(sender, **kwargs):
+            initialized.append(sender)
+
+        post_init.connect(count_init)
+        try:
+            objects = BatchTraversal(
+                self.command.process_instance,
+                extract=EXTRACT_VALUES,
+            ).run(instance)
+        finally:
+            post_init.disconnect(count_init)
+
+        # No model was instantiated
+        self.assertEqual(initialized, [])
+
+        def dump(items):
+            return sorted(
+                json.dumps(item, sort_keys=True, cls=GestoreEncoder)
+                for item in items
+            )
+
+        self.assertEqual(dump(objects), dump(expected))
+
+    def test_batch_size(self):
+        author = AuthorFactory.create()
+        BookFactory.create_batch(4, author=author)
+
+        objects = BatchTraversal(
+            self.command.process_instance,
+            batch_size=1,
+        ).run(author)
+        keys = exported_keys(objects)
+
+        self.assertEqual(
+            {pk for model, pk in keys if model == 'demoapp.book'},
+            {str(pk) for pk in author.book_set.values_list('id', flat=True)}
+        )
+
+
+# Threads use their own connections, which only see committed objects
+class TestThreadedTraversal(TransactionTestCase):
+    def setUp(self):
+        self.command = Command(stdout=StringIO())
+        self.author = AuthorFactory.create()
+        genres = GenreFactory.create_batch(2)
+        for book in BookFactory.create_batch(
+                3,
+                author=self.author,
+                genre=genres
+        ):
+            BookInstanceFactory.create(book=book)
+
+    def dump(self, objects):
+        return sorted(
+            json.dumps(obj, sort_keys=True, cls=GestoreEncoder)
+            for obj in objects
+        )
+
+    def test_same_objects(self):
+        for extract in ('instances', EXTRACT_VALUES):
+            expected = BatchTraversal(
+                self.command.process_instance,
+                extract=extract,
+            ).run(self.author)
+
+            traversal = BatchTraversal(
+                self.command.process_instance,
+                extract=extract,
+                threads=3,
+            )
+            objects = traversal.run(self.author)
+
+            # Merged in the same order
+            self.assertEqual(
+                [obj.get('pk') for obj in objects],
+                [obj.get('pk') for obj in expected]
+            )
+            self.assertEqual(self.dump(objects), self.dump(expected))
+            self.assertIsNone(traversal.executor)
+            self.assertEqual(traversal.thread_connections, [])
+
+    def test_relations_fetched_by_threads(self):
+        fetched_by = set()
+        process_batch = ManyToManyProcessor.process_batch
+
+        def record_thread(processor, *args, **kwargs):
+            fetched_by.add(threading.get_ident())
+            return process_batch(processor, *args, **kwargs)
+
+        with patch.object(ManyToManyProcessor, 'process_batch', record_thread):
+            BatchTraversal(
+                self.command.process_instance,
+                extract=EXTRACT_VALUES,
+                threads=2,
+            ).run(self.author)
+
+        # Batches fetching a single relation don't need the pool
+        self.assertTrue(fetched_by - {threading.get_ident()})
+
+    def test_streams_and_loads_use_threads(self):
+        used_by = {}
+
+        def record_thread(name):
+            function = getattr(BatchTraversal, name)
+
+            def wrapper(traversal, *args, **kwargs):
+                used_by.setdefault(name, set()).add(threading.get_ident())
+                return function(traversal, *args, **kwargs)
+
+            return patch.object(BatchTraversal, name, wrapper)
+
+        expected = BatchTraversal(self.command.process_instance).run(
+            self.author
+        )
+        with record_thread('open_stream'), record_thread('load'):
+            objects = BatchTraversal(
+                self.command.process_instance,
+                threads=4,
+            ).run(self.author)
+
+        self.assertEqual(self.dump(objects), self.dump(expected))
+        # Books are streamed from the author, languages loaded by their keys
+        self.assertTrue(used_by['open_stream'] - {threading.get_ident()})
+        self.assertTrue(used_by['load'] - {threading.get_ident()})
+
+    def test_queries_timed_by_threads(self):
+        timed_by = set()
+        time_query = BatchSizeController.time_query
+
+        def record_thread(controller, *args, **kwargs):
+            timed_by.add(threading.get_ident())
+            return time_query(controller, *args, **kwargs)
+
+        with patch.object(BatchSizeController, 'time_query', record_thread):
+            BatchTraversal(
+                self.command.process_instance,
+                extract=EXTRACT_VALUES,
+                threads=2,
+                batch_sizes=BatchSizeController(
+                    100,
+                    target_query_ms=10 ** 6
+                ),
+            ).run(self.author)
+
+        self.assertIn(threading.get_ident(), timed_by)
+        self.assertTrue(timed_by - {threading.get_ident()})
+
+    def test_no_key_tables(self):
+        traversal = BatchTraversal(self.command.process_instance, threads=2)
+
+        self.assertIsNone(traversal.key_table_threshold)
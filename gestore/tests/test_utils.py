@@ -55,6 +55,45 @@ class TestUtils(TestCase):
         ):
             utils.get_obj_from_str(representation)
 
+    def test_get_objs_from_str(self):
+        users = UserFactory.create_batch(3)
+        representations = [
+            'auth.User.%s' % user.id for user in reversed(users)
+        ]
+
+        # Objects of the same model are fetched at once, in the given order
+        with self.assertNumQueries(1):
+            fetched_objects = utils.get_objs_from_str(representations)
+        self.assertEqual(fetched_objects, list(reversed(users)))
+
+        with self.assertRaises(User.DoesNotExist):
+            utils.get_objs_from_str(
+                representations + ['auth.User.99999999999']
+            )
+
+    def test_get_queryset_from_str(self):
+        users = UserFactory.create_batch(3)
+
+        queryset = utils.get_queryset_from_str(
+            'auth.User:id__gte=%s,is_active=1' % users[1].id
+        )
+        self.assertEqual(list(queryset.order_by('id')), users[1:])
+
+        with self.assertRaises(ValueError):
+            utils.get_queryset_from_str('auth.User:id')
+
+        with self.assertRaises(LookupError):
+            utils.get_queryset_from_str('auth.Something:id=1')
+
+    def test_get_object_key(self):
+        user = UserFactory()
+
+        self.assertEqual(utils.get_object_key(user), (User, user.id))
+        self.assertEqual(utils.get_object_key((User, 1)), (User, 1))
+
+    def test_object_key_model_name(self):
+        self.assertEqual(utils.get_model_name((User, 1)), 'User')
+
 
 class TestGetStrFromModel(TestCase):
     def setUp(self) -> None:
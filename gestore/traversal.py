@@ -0,0 +1,1001 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+from operator import attrgetter, itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import (
+    ManyToOneRel,
+    Model,
+    prefetch_related_objects,
+)
+
+from gestore.batching import BatchSizeController
+from gestore.budgets import TraversalBudget
+from gestore.frontier import (
+    KEY_TABLE_SIZE,
+    KEY_TABLE_THRESHOLD,
+    KeyTable,
+    use_key_table,
+)
+from gestore.graph import RelationGraph
+from gestore.index import VisitedIndex
+from gestore.plans import FieldPlan, get_field_plan
+from gestore.processors import (
+    DEFAULT_CHUNK_SIZE,
+    get_generic_relation_queryset,
+    get_one_to_many_queryset,
+    get_processor,
+    process_parent_link,
+    scan_one_to_many_relation,
+    stream_generic_relation,
+    stream_one_to_many_relation,
+)
+from gestore.records import MISSING, ExportRecord
+from gestore.scans import RangeScan
+from gestore.typing import OBJECT_KEY, PK
+from gestore.utils import get_model_name, get_object_key
+
+DEFAULT_BATCH_SIZE = 500
+
+EXTRACT_INSTANCES = 'instances'
+EXTRACT_VALUES = 'values'
+
+
+def chunks(items: list, size: int) -> Iterable[list]:
+    """
+    Splits a list into consecutive chunks of at most `size` elements.
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class RowChunk(list):
+    """
+    Rows of objects of the same model, fetched using the columns of the
+    model's field plan.
+    """
+
+    def __init__(self, model, rows: Iterable[tuple]):
+        super(RowChunk, self).__init__(rows)
+        self.model = model
+
+
+class BatchTraversal(object):
+    """
+    A level synchronous Breadth First Search implementation of the objects
+    export.
+
+    Unlike the Depth First Search in `exportobjects`, objects are not
+    processed one at a time. Every discovered object is placed in a frontier
+    grouped by its model, and the whole frontier is processed level by level.
+    Before processing a batch of objects of the same model, all of their
+    relations are loaded using a single `__in` query per relation. This way
+    the number of queries scales with the depth of the graph and the number
+    of relations instead of the number of objects.
+
+    The objects of reverse ForeignKey relations are streamed in chunks of
+    `chunk_size` objects ordered by primary key, which bounds the size of
+    each query result. The discovered objects still all join the next level
+    of the frontier, so memory grows with the fan-out of a relation unless a
+    budget limits it.
+
+    Objects are either extracted from model instances using
+    `process_instance`, or directly from `values_list` rows of the model's
+    columns when `extract` is `values`. The latter skips instantiating
+    models altogether.
+
+    The rules deciding which objects are exported are the same ones used by
+    `Command.generate_objects`, so both traversals produce the same set of
+    objects, unless the `budget` prunes some of them. Relations that can't
+    discover new objects are skipped altogether, check
+    `gestore.graph.RelationGraph` for more info.
+
+    Using more than one of `threads`, the relations of each batch read by
+    processors are fetched concurrently by a pool of threads, each with its
+    own database connection, which hides the round trips of distant
+    databases. Streamed relations are counted and their first chunk read on
+    the pool as well, and the objects of the next models of a level are
+    loaded ahead while a batch is processed. Results are merged in the order
+    of the relations, so the export is the same whatever the number of
+    threads. Key tables are
+    temporary tables, only visible to the connection creating them, so they
+    are not used along with threads.
+
+    Given a `batch_sizes` controller, the batch size of each model adapts to
+    the latency of the queries of its batches and to the memory used by the
+    process, check `gestore.batching.BatchSizeController`. Key tables are
+    not used either then, so every batch follows the controller.
+    """
+
+    def __init__(
+            self,
+            process_instance: Callable,
+            root_models: Iterable[str] = None,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            extract: str = EXTRACT_INSTANCES,
+            budget: TraversalBudget = None,
+            graph: RelationGraph = None,
+            key_table_threshold: int = KEY_TABLE_THRESHOLD,
+            using: str = DEFAULT_DB_ALIAS,
+            writer: Callable = print,
+            debug: bool = False,
+            threads: int = 1,
+            batch_sizes: BatchSizeController = None,
+    ):
+        self.process_instance = process_instance
+        self.root_models = set(root_models or [])
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.extract = extract
+        self.budget = budget or TraversalBudget()
+        self.graph = graph
+        self.key_table_threshold = key_table_threshold
+        self.using = using
+        self.writer = writer
+        self.debug = debug
+        self.threads = threads
+        self.batch_sizes = batch_sizes
+
+        if threads > 1 or batch_sizes is not None:
+            self.key_table_threshold = None
+
+        self.executor = None
+        self.thread_connections = []
+        self._lock = threading.Lock()
+
+        self.visited = VisitedIndex()
+        self.depth = 0
+
+    @property
+    def use_values(self) -> bool:
+        return self.extract == EXTRACT_VALUES
+
+    def run(self, *args: Model) -> list:
+        """
+        Processes the given objects and all the objects related to them.
+
+        :return: Simply all discovered objects' data.
+        """
+        if self.threads > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.threads)
+
+        try:
+            if self.batch_sizes is None:
+                return self.traverse(*args)
+
+            with connections[self.using].execute_wrapper(
+                    self.batch_sizes.time_query
+            ):
+                return self.traverse(*args)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+                self.close_thread_connections()
+
+    def traverse(self, *args: Model) -> list:
+        objects = []
+
+        self.root_models = set(
+            get_model_name(instance) for instance in args
+        ).union(self.root_models)
+
+        self.build_graph(*args)
+
+        frontier = {}
+        for instance in args:
+            self.visited.add(get_object_key(instance))
+            frontier.setdefault(type(instance), {})[instance.pk] = \
+                None if self.use_values else instance
+
+        self.budget.start()
+        while frontier and self.budget.check_depth(self.depth):
+            if self.debug:
+                self.writer(
+                    'Processing level %d (%d objects)...' % (
+                        self.depth,
+                        sum(len(pending) for pending in frontier.values()),
+                    )
+                )
+
+            frontier = self.process_level(frontier, objects)
+            self.depth += 1
+
+        return objects
+
+    def build_graph(self, *args: Model) -> None:
+        """
+        Builds the relation graph pruned for the given objects, unless one
+        was provided.
+        """
+        if self.graph is not None:
+            return
+
+        self.graph = RelationGraph(using=self.using)
+        self.graph.prune(
+            [type(instance) for instance in args],
+            self.root_models
+        )
+
+        if self.debug:
+            for line in self.graph.describe():
+                self.writer(line)
+
+    def get_plan(self, model) -> FieldPlan:
+        if self.graph is None:
+            return get_field_plan(model)
+
+        return self.graph.get_plan(model)
+
+    def process_level(
+            self,
+            frontier: Dict[type, Dict[PK, Any]],
+            objects: list
+    ) -> Dict[type, Dict[PK, Any]]:
+        """
+        Processes all the objects of a level, adding their data to `objects`.
+        Returns the frontier of the next level.
+        """
+        next_frontier = {}
+
+        for model, batch, keys in self.iter_level(frontier):
+            if not self.budget.check_time():
+                return {}
+
+            processed = self.process_batch(model, batch, keys=keys)
+            for item, pending_items in processed:
+                if item:
+                    objects.append(item)
+
+                self.enqueue(next_frontier, pending_items)
+
+            if self.batch_sizes is not None:
+                self.batch_sizes.observe(model, len(batch))
+
+        return next_frontier
+
+    def iter_level(
+            self,
+            frontier: Dict[type, Dict[PK, Any]]
+    ) -> Iterator[Tuple[type, list, Any]]:
+        """
+        Yields the batches of all the models of a level, see `iter_batches`.
+
+        Using threads, the objects of up to `threads` models are loaded on
+        the pool ahead of the batch being processed. Adaptive batches are
+        loaded one at a time, their sizes depend on the previous batches.
+        """
+        if self.executor is None or self.batch_sizes is not None:
+            for model, pending in frontier.items():
+                for batch, keys in self.iter_batches(model, pending):
+                    yield model, batch, keys
+
+            return
+
+        # Threads don't use key tables, batches are split the same way
+        # `iter_batches` splits them then.
+        loads = deque()
+        for model, pending in frontier.items():
+            loads.append((
+                model,
+                self.executor.submit(self.in_thread, self.load, model, pending)
+            ))
+            if len(loads) >= self.threads:
+                model, load = loads.popleft()
+                for batch in chunks(load.result(), self.batch_size):
+                    yield model, batch, None
+
+        for model, load in loads:
+            for batch in chunks(load.result(), self.batch_size):
+                yield model, batch, None
+
+    def iter_batches(
+            self,
+            model,
+            pending: Dict[PK, Any]
+    ) -> Iterator[Tuple[list, Any]]:
+        """
+        Yields the instances (or rows) of the given frontier entries in
+        batches, along with the subquery selecting their keys if any.
+
+        Small frontiers are split in batches of `batch_size` objects, queried
+        using lists of keys. Larger ones are loaded into key tables instead,
+        each batch being the objects of a whole key table. Relations of such
+        batches are queried joining the key table, check
+        `gestore.frontier.KeyTable`.
+
+        Sizes of adaptive batches are read before loading each batch, so
+        every batch uses the latest size decided by the controller.
+        """
+        if self.batch_sizes is not None:
+            pks = list(pending)
+            start = 0
+            while start < len(pks):
+                size = self.batch_sizes.get_size(model)
+                yield self.load(
+                    model,
+                    {pk: pending[pk] for pk in pks[start:start + size]},
+                    batch_size=size
+                ), None
+                start += size
+
+            return
+
+        if not use_key_table(
+                len(pending),
+                self.key_table_threshold,
+                using=self.using
+        ):
+            for batch in chunks(self.load(model, pending), self.batch_size):
+                yield batch, None
+
+            return
+
+        for pks in chunks(list(pending), KEY_TABLE_SIZE):
+            with KeyTable(model, pks, using=self.using) as table:
+                keys = table.subquery()
+                yield self.load(
+                    model,
+                    {pk: pending[pk] for pk in pks},
+                    keys=keys
+                ), keys
+
+    def load(
+            self,
+            model,
+            pending: Dict[PK, Any],
+            keys: Any = None,
+            batch_size: int = None
+    ) -> list:
+        """
+        Returns the instances (or rows) of the given frontier entries.
+        Entries that were discovered only by their keys are fetched using a
+        single query per batch of `batch_size` keys (defaults to the
+        traversal's), or a single query if `keys` selects them.
+        """
+        missing = [pk for pk, instance in pending.items() if instance is None]
+        loaded = {}
+
+        if keys is not None and missing:
+            batches = [keys]
+        else:
+            batches = chunks(missing, batch_size or self.batch_size)
+
+        for batch in batches:
+            manager = model._default_manager.db_manager(self.using)
+            if self.use_values:
+                columns = get_field_plan(model).columns
+                loaded.update(
+                    (row[0], row)
+                    for row in manager.filter(
+                        pk__in=batch
+                    ).order_by().values_list(*columns)
+                )
+            elif batch is keys:
+                loaded.update(
+                    (obj.pk, obj) for obj in manager.filter(pk__in=keys)
+                )
+            else:
+                loaded.update(manager.in_bulk(batch))
+
+        return [
+            instance if instance is not None else loaded[pk]
+            for pk, instance in pending.items()
+            if instance is not None or pk in loaded
+        ]
+
+    def process_batch(
+            self,
+            model,
+            batch: list,
+            keys: Any = None
+    ) -> Iterable[
+        Tuple[ExportRecord, Iterable[Union[Model, tuple, OBJECT_KEY]]]
+    ]:
+        """
+        Processes a batch of objects of the same model, and loads their
+        relations using a single query per relation.
+
+        ForeignKeys are handed over as keys read from their columns, so
+        objects pointed at by many others (a shared language or author) are
+        fetched only once.
+
+        Reverse ForeignKey and OneToOne relations have no fan-out limit, so
+        the objects pointing at the batch are streamed in chunks instead, and
+        handed over as pending items chunk by chunk. Only the size of each
+        query result is bounded, the pending items all join the frontier. If
+        the budget limits the fan-out of a relation, its objects are counted
+        before streaming them.
+        Objects of scanned models are read with range scans, and processed
+        chunk by chunk right away, see `process_leaves`.
+
+        ManyToMany relations only read the IDs of the related objects from the
+        through table. The related objects are handed over as keys and will be
+        loaded if they weren't visited.
+
+        GenericForeignKeys are handed over as keys too, read from their
+        content type and object ID columns, while GenericRelations are
+        streamed like reverse ForeignKeys.
+
+        ManyToMany relations, GenericForeignKeys, ForeignKeys of rows and
+        custom relations go through their registered processors, check
+        `gestore.processors.BatchProcessor`.
+
+        Parents of multi-table inheritance children are built from the
+        batch itself, its rows or instances hold the parent columns too.
+        Children of a parent are only streamed when they weren't discovered
+        before, they share the primary key of their parent.
+
+        Any other relation is prefetched and processed by `process_instance`.
+
+        If given, `keys` replaces the primary keys of the batch in the queries
+        of these relations.
+
+        Relations referenced by the traversal policy are exported without
+        discovering the objects they point at, and limited relations drop
+        the objects over the limit of each object while streaming.
+        """
+        plan = self.get_plan(model)
+        get_value = plan.get_row_value if self.use_values else getattr
+
+        streamed = [
+            (accessor, field)
+            for accessor, field in plan.one_to_many + plan.one_to_one
+            if isinstance(field, ManyToOneRel)
+        ]
+        many_to_many = [field for _, field in plan.many_to_many]
+        custom = [field for _, field in plan.custom]
+        generic = [
+            field
+            for _, field in plan.generic_foreign_keys + plan.generic_relations
+        ]
+        inheritance = [
+            field for _, field in plan.parent_links + plan.child_links
+        ]
+
+        # The values of ForeignKeys and GenericForeignKeys are read from the
+        # batch, these only discover objects
+        discovering = plan.generic_foreign_keys
+        if self.use_values:
+            items = self.process_rows(plan, batch)
+            discovering = plan.foreign_keys + discovering
+
+        # Opened first, so threads read them along with the fetched relations
+        streams = self.open_streams(
+            model,
+            plan,
+            batch,
+            streamed,
+            get_value=get_value,
+            keys=keys
+        )
+
+        fetched = plan.many_to_many + plan.custom + [
+            (name, field) for name, field in discovering
+            if field not in plan.references
+        ]
+        results = self.fetch_relations(
+            model,
+            batch,
+            [field for _, field in fetched],
+            get_value=get_value,
+            keys=keys
+        )
+
+        values = {}
+        discovered = []
+        for (name, field), (data, related_keys) in zip(fetched, results):
+            if field not in plan.references:
+                discovered.extend(related_keys)
+
+            if data is not None and (name, field) not in discovering:
+                values[name] = data
+
+        if not self.use_values:
+            # Prefetching uses lists of keys, keep them short
+            items = (
+                item
+                for instances in chunks(batch, self.batch_size)
+                for item in self.process_instances(
+                    plan.exclude(
+                        [f for _, f in streamed]
+                        + many_to_many
+                        + custom
+                        + generic
+                        + inheritance
+                    ),
+                    instances
+                )
+            )
+
+        for pk, item, pending_items in items:
+            if item:
+                for name, data in values.items():
+                    item['fields'][name] = data[pk]
+
+            yield item, pending_items
+
+        yield None, discovered
+
+        for _, field in plan.parent_links:
+            if field in plan.references:
+                continue
+
+            if self.use_values:
+                yield None, RowChunk(field.related_model, [
+                    plan.get_parent_row(row, field) for row in batch
+                ])
+            else:
+                yield None, [
+                    process_parent_link(instance, field) for instance in batch
+                ]
+
+        for _, field in plan.child_links:
+            child = field.related_model
+            parents = [
+                obj for obj in batch
+                if (child, get_value(obj, 'pk')) not in self.visited
+            ]
+            if not parents:
+                continue
+
+            columns = None
+            if self.use_values:
+                columns = get_field_plan(child).columns
+
+            for chunk in stream_one_to_many_relation(
+                    parents,
+                    field,
+                    chunk_size=self.chunk_size,
+                    get_value=get_value,
+                    columns=columns,
+                    keys=keys if len(parents) == len(batch) else None,
+                    using=self.using,
+            ):
+                if self.use_values:
+                    chunk = RowChunk(child, chunk)
+
+                yield None, chunk
+
+        for accessor, field in streamed:
+            relation = '%s.%s' % (model._meta.label, accessor)
+            count, chunks_stream = streams[accessor]()
+            if count is not None \
+                    and not self.budget.check_fanout(relation, count):
+                continue
+
+            get_parent = attrgetter(field.field.attname)
+            if self.use_values:
+                get_parent = itemgetter(
+                    get_field_plan(field.related_model).column_index[
+                        field.field.attname
+                    ]
+                )
+
+            # Objects discovered so far per object of the batch
+            counts = {}
+            limit = plan.limits.get(field)
+            scan = plan.scans.get(field)
+
+            for chunk in chunks_stream:
+                if limit is not None:
+                    chunk = self.limit_chunk(chunk, get_parent, counts, limit)
+
+                if scan is not None:
+                    yield from self.process_leaves(field.related_model, chunk)
+                    continue
+
+                if self.use_values:
+                    chunk = RowChunk(field.related_model, chunk)
+
+                yield None, chunk
+
+        for accessor, field in plan.generic_relations:
+            relation = '%s.%s' % (model._meta.label, accessor)
+            count, chunks_stream = streams[accessor]()
+            if count is not None \
+                    and not self.budget.check_fanout(relation, count):
+                continue
+
+            for chunk in chunks_stream:
+                if self.use_values:
+                    chunk = RowChunk(field.related_model, chunk)
+
+                yield None, chunk
+
+    def open_streams(
+            self,
+            model,
+            plan: FieldPlan,
+            batch: list,
+            streamed: list,
+            get_value: Callable = getattr,
+            keys: Any = None
+    ) -> Dict[str, Callable[[], Tuple[Optional[int], Iterator[list]]]]:
+        """
+        Returns a function per streamed relation and GenericRelation of a
+        batch, keyed by accessor, returning what `open_stream` does. Using
+        threads, the streams are all opened on the pool right away, otherwise
+        each one is opened once its function is called.
+        """
+        streams = []
+        for accessor, field in streamed:
+            relation = '%s.%s' % (model._meta.label, accessor)
+            scan = plan.scans.get(field)
+            columns = None
+            if self.use_values:
+                columns = get_field_plan(field.related_model).columns
+
+            count = partial(
+                self.count_one_to_many,
+                batch,
+                field,
+                scan=scan,
+                get_value=get_value,
+                keys=keys,
+            )
+            if scan is not None:
+                stream = partial(scan_one_to_many_relation, scan=scan)
+            else:
+                stream = stream_one_to_many_relation
+
+            streams.append((accessor, relation, count, partial(
+                stream,
+                batch,
+                field,
+                chunk_size=self.chunk_size,
+                get_value=get_value,
+                columns=columns,
+                keys=keys,
+                using=self.using,
+            )))
+
+        for accessor, field in plan.generic_relations:
+            relation = '%s.%s' % (model._meta.label, accessor)
+            columns = None
+            if self.use_values:
+                columns = get_field_plan(field.related_model).columns
+
+            streams.append((
+                accessor,
+                relation,
+                partial(
+                    self.count_generic_relation,
+                    batch,
+                    field,
+                    get_value=get_value,
+                ),
+                partial(
+                    stream_generic_relation,
+                    batch,
+                    field,
+                    chunk_size=self.chunk_size,
+                    get_value=get_value,
+                    columns=columns,
+                    using=self.using,
+                ),
+            ))
+
+        if self.executor is None:
+            return {
+                accessor: partial(self.open_stream, relation, count, stream)
+                for accessor, relation, count, stream in streams
+            }
+
+        return {
+            accessor: self.executor.submit(
+                self.in_thread,
+                self.open_stream,
+                relation,
+                count,
+                stream
+            ).result
+            for accessor, relation, count, stream in streams
+        }
+
+    def open_stream(
+            self,
+            relation: str,
+            count: Callable[[], int],
+            stream: Callable[[], Iterator[list]]
+    ) -> Tuple[Optional[int], Iterator[list]]:
+        """
+        Counts the objects of a relation if its fan-out is limited, then
+        reads the first chunk of its stream unless they are over the limit.
+        Returns the count, None if the relation isn't limited, and the
+        chunks.
+
+        The count is checked against the budget by the caller, so the
+        relations over their limit are reported in order.
+        """
+        total = None
+        limit = self.budget.get_fanout_limit(relation)
+        if limit is not None:
+            total = count()
+            if total > limit:
+                return total, iter(())
+
+        chunks_stream = stream()
+        first = next(chunks_stream, None)
+        if first is None:
+            return total, iter(())
+
+        return total, chain([first], chunks_stream)
+
+    def count_one_to_many(
+            self,
+            batch: list,
+            field: ManyToOneRel,
+            scan: RangeScan = None,
+            get_value: Callable = getattr,
+            keys: Any = None
+    ) -> int:
+        queryset = get_one_to_many_queryset(
+            batch,
+            field,
+            get_value=get_value,
+            keys=keys,
+            using=self.using,
+        )
+        if scan is not None:
+            queryset = scan.filter(queryset, field)
+
+        return queryset.count()
+
+    def count_generic_relation(
+            self,
+            batch: list,
+            field: Any,
+            get_value: Callable = getattr
+    ) -> int:
+        return sum(
+            get_generic_relation_queryset(
+                batch[start:start + self.chunk_size],
+                field,
+                get_value=get_value,
+                using=self.using,
+            ).count()
+            for start in range(0, len(batch), self.chunk_size)
+        )
+
+    def fetch_relations(
+            self,
+            model,
+            batch: list,
+            fields: list,
+            get_value: Callable = getattr,
+            keys: Any = None
+    ) -> List[Tuple[Any, List[OBJECT_KEY]]]:
+        """
+        Returns the results of the processors of the given relations for a
+        batch, in the order of the relations. These queries don't depend on
+        each other, so they run on the thread pool if there is one.
+        """
+        fetch = partial(
+            self.fetch_relation,
+            model,
+            [get_value(obj, 'pk') for obj in batch],
+            batch,
+            get_value=get_value,
+            keys=keys,
+        )
+        if self.executor is None or len(fields) < 2:
+            return [fetch(field) for field in fields]
+
+        return list(self.executor.map(partial(self.in_thread, fetch), fields))
+
+    def fetch_relation(
+            self,
+            model,
+            pks: List[PK],
+            batch: list,
+            field: Any,
+            get_value: Callable = getattr,
+            keys: Any = None
+    ) -> Tuple[Any, List[OBJECT_KEY]]:
+        return get_processor(field).process_batch(
+            model,
+            pks,
+            field,
+            objects=batch,
+            get_value=get_value,
+            keys=keys,
+            using=self.using,
+        )
+
+    def in_thread(self, function: Callable, *args: Any) -> Any:
+        """
+        Runs a function in a thread of the pool. The connection of the
+        thread, opened on first use, is kept track of so it's closed once
+        the traversal is over. Its queries are timed for the batch size
+        controller, like the ones of the thread running the traversal.
+        """
+        self.track_connection()
+        if self.batch_sizes is None:
+            return function(*args)
+
+        with connections[self.using].execute_wrapper(
+                self.batch_sizes.time_query
+        ):
+            return function(*args)
+
+    def track_connection(self) -> None:
+        connection = connections[self.using]
+        with self._lock:
+            if any(
+                    connection is tracked
+                    for tracked in self.thread_connections
+            ):
+                return
+
+            # Closed by the thread running the traversal
+            connection.inc_thread_sharing()
+            self.thread_connections.append(connection)
+
+    def close_thread_connections(self) -> None:
+        for connection in self.thread_connections:
+            connection.close()
+            connection.dec_thread_sharing()
+
+        self.thread_connections = []
+
+    def process_leaves(
+            self,
+            model,
+            chunk: list
+    ) -> Iterable[
+        Tuple[ExportRecord, Iterable[Union[Model, tuple, OBJECT_KEY]]]
+    ]:
+        """
+        Processes a chunk of objects of a scanned model as soon as it's
+        read, instead of adding them to the next frontier. Scanned models are
+        leaves, so processing them only reads the values of their ManyToMany
+        fields, and the objects are never held by the frontier.
+
+        Objects are checked against the visited objects and the budget the
+        same way `enqueue` does.
+        """
+        get_pk = itemgetter(0) if self.use_values else attrgetter('pk')
+
+        leaves = []
+        for obj in chunk:
+            key = (model, get_pk(obj))
+            if model.__name__ in self.root_models or self.visited.seen(key):
+                continue
+
+            if self.budget.check_objects(len(self.visited) + 1):
+                self.visited.add(key)
+                leaves.append(obj)
+
+        if leaves:
+            yield from self.process_batch(model, leaves)
+
+    @staticmethod
+    def limit_chunk(
+            chunk: list,
+            get_parent: Callable,
+            counts: Dict[Any, int],
+            limit: int
+    ) -> list:
+        """
+        Drops the objects of a streamed chunk pointing at an object that
+        already discovered `limit` objects. Chunks are ordered by primary
+        key, so each object keeps the first ones, as `process_instance` does.
+        """
+        limited = []
+        for obj in chunk:
+            parent = get_parent(obj)
+            count = counts.get(parent, 0)
+            if count < limit:
+                counts[parent] = count + 1
+                limited.append(obj)
+
+        return limited
+
+    def process_instances(
+            self,
+            plan: FieldPlan,
+            batch: List[Model]
+    ) -> Iterable[Tuple[PK, ExportRecord, Iterable[Union[Model, OBJECT_KEY]]]]:
+        """
+        Processes instances one by one using `process_instance`, limited to
+        the fields of the given plan. Relations that are left in the plan are
+        prefetched first, so processing the instances triggers no more
+        queries.
+        """
+        for accessor, _ in plan.one_to_many + plan.one_to_one:
+            try:
+                prefetch_related_objects(batch, accessor)
+            except (AttributeError, ValueError):
+                # Not something Django can prefetch, the relation will be
+                # lazily loaded by `process_instance` instead.
+                pass
+
+        for instance in batch:
+            item, pending_items = self.process_instance(instance, plan=plan)
+            yield instance.pk, item, pending_items
+
+    @staticmethod
+    def process_rows(
+            plan: FieldPlan,
+            batch: List[tuple]
+    ) -> Iterable[Tuple[PK, ExportRecord, list]]:
+        """
+        Builds the export records of objects straight from their rows.
+        Discovered relations are handled by the caller for the whole batch.
+        """
+        # Positions of the values in the records and in the rows
+        positions = [
+            (plan.layout.index[name], plan.column_index[field.attname])
+            for name, field in plan.values + plan.foreign_keys
+            if field.concrete
+        ]
+        size = len(plan.layout.names)
+
+        for row in batch:
+            values = [MISSING] * size
+            for position, index in positions:
+                values[position] = row[index]
+
+            yield row[0], ExportRecord.from_values(
+                plan.layout,
+                values,
+                pk=row[0] if plan.pk_field else MISSING
+            ), []
+
+    def enqueue(
+            self,
+            frontier: Dict[type, Dict[PK, Any]],
+            pending_items: Iterable[Union[Model, tuple, OBJECT_KEY]]
+    ) -> None:
+        """
+        Adds the discovered objects to the given frontier, unless they were
+        discovered before or are objects of a root model.
+
+        Pending items are either instances, or keys of objects that were not
+        fetched yet. Rows fetched when extracting values are handed over as a
+        `RowChunk` instead.
+        """
+        if isinstance(pending_items, RowChunk):
+            pending_items = [
+                (pending_items.model, row) for row in pending_items
+            ]
+
+        for pending_item in pending_items:
+            if pending_item is None:
+                continue
+
+            if isinstance(pending_item, Model):
+                model, pk = type(pending_item), pending_item.pk
+            elif isinstance(pending_item[1], tuple):
+                # A row, its primary key is the first column
+                model, pending_item = pending_item
+                pk = pending_item[0]
+            else:
+                model, pk = pending_item
+                pending_item = None
+
+            if model.__name__ in self.root_models:
+                continue
+
+            if self.visited.seen((model, pk)):
+                continue
+
+            if self.budget.check_objects(len(self.visited) + 1):
+                self.visited.add((model, pk))
+                frontier.setdefault(model, {})[pk] = pending_item
@@ -1,6 +1,10 @@
-from typing import TypeVar
+from typing import Tuple, TypeVar
 
 
 PK = TypeVar("PK")  # Primary Key type representation
 
 IP_ADDRESS = str
+
+# A reference to an object that hasn't been fetched from the database yet;
+# its model class and primary key.
+OBJECT_KEY = Tuple[type, PK]
@@ -1,9 +1,13 @@
-from typing import Any, Callable, Dict
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
 
 import pkg_resources
 
 from django.apps import apps
-from django.db.models import Model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Model, QuerySet
+
+from gestore.typing import OBJECT_KEY
 
 
 def get_pip_packages() -> Dict[str, str]:
@@ -59,6 +63,91 @@ def get_obj_from_str(object_rep: str) -> Model:
     return Model.objects.get(id=obj_id)
 
 
+def get_key_from_str(object_rep: str) -> OBJECT_KEY:
+    """
+    Same as `get_obj_from_str`, without fetching the object.
+    """
+    app_label, model_name, obj_id = object_rep.split('.')
+    Model = apps.get_model(app_label, model_name)
+    return Model, Model._meta.pk.to_python(obj_id)
+
+
+def group_keys(keys: List[OBJECT_KEY]) -> Dict[type, List[Any]]:
+    """
+    Groups the primary keys of the given object keys by model, in order.
+    """
+    pks_by_model = OrderedDict()
+    for model, pk in keys:
+        pks_by_model.setdefault(model, []).append(pk)
+
+    return pks_by_model
+
+
+def get_objs_from_str(
+        object_reps: List[str],
+        using: str = DEFAULT_DB_ALIAS
+) -> List[Model]:
+    """
+    Same as `get_obj_from_str` for many objects, those of the same model are
+    loaded from the `using` database with a single `in_bulk` query. Objects
+    are returned in the given order.
+    """
+    keys = [get_key_from_str(object_rep) for object_rep in object_reps]
+
+    objects = {}
+    for model, pks in group_keys(keys).items():
+        manager = model._default_manager.db_manager(using)
+        for pk, obj in manager.in_bulk(pks).items():
+            objects[(model, pk)] = obj
+
+    for model, pk in keys:
+        if (model, pk) not in objects:
+            raise model.DoesNotExist(
+                '%s matching query does not exist.'
+                % model._meta.object_name
+            )
+
+    return [objects[key] for key in keys]
+
+
+def get_querysets_from_str(
+        object_reps: List[str],
+        using: str = DEFAULT_DB_ALIAS
+) -> List[QuerySet]:
+    """
+    Returns a queryset per model of the given objects representations.
+    """
+    keys = [get_key_from_str(object_rep) for object_rep in object_reps]
+
+    return [
+        model._default_manager.using(using).filter(pk__in=pks)
+        for model, pks in group_keys(keys).items()
+    ]
+
+
+def get_queryset_from_str(
+        filter_rep: str,
+        using: str = DEFAULT_DB_ALIAS
+) -> QuerySet:
+    """
+    Returns the queryset of a filter representation, formatted as
+    `app_label.model_name:lookup=value[,lookup=value...]`, e.g.
+    `demoapp.Book:author_id=1,title__startswith=A`.
+    """
+    model_rep, _, lookups_rep = filter_rep.partition(':')
+    app_label, model_name = model_rep.split('.')
+    Model = apps.get_model(app_label, model_name)
+
+    lookups = {}
+    for lookup_rep in lookups_rep.split(','):
+        lookup, separator, value = lookup_rep.partition('=')
+        if not lookup or not separator:
+            raise ValueError('Bad lookup "%s"' % lookup_rep)
+        lookups[lookup.strip()] = value
+
+    return Model._default_manager.using(using).filter(**lookups)
+
+
 def get_str_from_model(model: Model, object_id=None) -> str:
     model_path = '.'.join([model._meta.app_label, model.__name__])
 
@@ -69,8 +158,20 @@ def get_str_from_model(model: Model, object_id=None) -> str:
 
 
 def get_model_name(instance):
+    if isinstance(instance, tuple):
+        # An object key, check `gestore.typing.OBJECT_KEY`
+        model, _ = instance
+        return model.__name__
+
     return instance._meta.model.__name__
 
 
-def instance_representation(instance):
-    return get_str_from_model(instance._meta.model, object_id=instance.pk)
+def get_object_key(instance) -> OBJECT_KEY:
+    """
+    Returns the model and primary key of an instance, or the key itself if
+    it's already an object key.
+    """
+    if isinstance(instance, tuple):
+        return instance
+
+    return instance._meta.model, instance.pk